@@ -0,0 +1,97 @@
+"""menu items and button permissions
+
+Revision ID: 0002
+Revises: 0001
+Create Date: 2026-10-17 09:10:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = "0002"
+down_revision: Union[str, Sequence[str], None] = "0001"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table(
+        "menu_items",
+        sa.Column("id", sa.Integer(), nullable=False),
+        sa.Column("title", sa.String(length=50), nullable=False),
+        sa.Column("icon", sa.String(length=30), nullable=True),
+        sa.Column("route", sa.String(length=100), nullable=True),
+        sa.Column("parent_id", sa.Integer(), nullable=True),
+        sa.Column("order", sa.Integer(), nullable=False),
+        sa.Column("is_active", sa.Boolean(), nullable=False),
+        sa.Column("created_at", sa.DateTime(), nullable=False),
+        sa.Column("bit_index", sa.Integer(), nullable=False),
+        sa.Column("path", sa.String(length=255), nullable=False),
+        sa.ForeignKeyConstraint(["parent_id"], ["menu_items.id"]),
+        sa.PrimaryKeyConstraint("id"),
+        sa.UniqueConstraint("bit_index"),
+    )
+    op.create_index("ix_menu_items_id", "menu_items", ["id"])
+
+    op.create_table(
+        "user_menu_items",
+        sa.Column("id", sa.Integer(), nullable=False),
+        sa.Column("user_id", sa.Integer(), nullable=False),
+        sa.Column("menu_item_id", sa.Integer(), nullable=False),
+        sa.Column("has_permission", sa.Boolean(), nullable=False),
+        sa.ForeignKeyConstraint(["menu_item_id"], ["menu_items.id"]),
+        sa.ForeignKeyConstraint(["user_id"], ["users.id"]),
+        sa.PrimaryKeyConstraint("id"),
+        sa.UniqueConstraint(
+            "user_id", "menu_item_id", name="uq_user_menu_items_user_id_menu_item_id"
+        ),
+    )
+    op.create_index("ix_user_menu_items_id", "user_menu_items", ["id"])
+
+    op.create_table(
+        "button_permissions",
+        sa.Column("id", sa.Integer(), nullable=False),
+        sa.Column("button_id", sa.String(length=50), nullable=False),
+        sa.Column("description", sa.String(length=100), nullable=True),
+        sa.Column("menu_item_id", sa.Integer(), nullable=False),
+        sa.Column("bit_index", sa.Integer(), nullable=False),
+        sa.ForeignKeyConstraint(["menu_item_id"], ["menu_items.id"]),
+        sa.PrimaryKeyConstraint("id"),
+        sa.UniqueConstraint("bit_index"),
+        sa.UniqueConstraint("button_id"),
+    )
+    op.create_index("ix_button_permissions_id", "button_permissions", ["id"])
+
+    op.create_table(
+        "user_button_permissions",
+        sa.Column("id", sa.Integer(), nullable=False),
+        sa.Column("user_id", sa.Integer(), nullable=False),
+        sa.Column("button_id", sa.String(length=50), nullable=False),
+        sa.Column("has_permission", sa.Boolean(), nullable=False),
+        sa.ForeignKeyConstraint(["button_id"], ["button_permissions.button_id"]),
+        sa.ForeignKeyConstraint(["user_id"], ["users.id"]),
+        sa.PrimaryKeyConstraint("id"),
+        sa.UniqueConstraint(
+            "user_id",
+            "button_id",
+            name="uq_user_button_permissions_user_id_button_id",
+        ),
+    )
+    op.create_index("ix_user_button_permissions_id", "user_button_permissions", ["id"])
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index("ix_user_button_permissions_id", table_name="user_button_permissions")
+    op.drop_table("user_button_permissions")
+    op.drop_index("ix_button_permissions_id", table_name="button_permissions")
+    op.drop_table("button_permissions")
+    op.drop_index("ix_user_menu_items_id", table_name="user_menu_items")
+    op.drop_table("user_menu_items")
+    op.drop_index("ix_menu_items_id", table_name="menu_items")
+    op.drop_table("menu_items")
@@ -0,0 +1,100 @@
+"""roles and materialized effective permissions
+
+Revision ID: 0003
+Revises: 0002
+Create Date: 2026-10-17 09:20:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = "0003"
+down_revision: Union[str, Sequence[str], None] = "0002"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table(
+        "roles",
+        sa.Column("id", sa.Integer(), nullable=False),
+        sa.Column("name", sa.String(length=50), nullable=False),
+        sa.Column("description", sa.String(length=100), nullable=True),
+        sa.Column("created_at", sa.DateTime(), nullable=False),
+        sa.PrimaryKeyConstraint("id"),
+        sa.UniqueConstraint("name"),
+    )
+    op.create_index("ix_roles_id", "roles", ["id"])
+
+    op.create_table(
+        "role_menu_items",
+        sa.Column("id", sa.Integer(), nullable=False),
+        sa.Column("role_id", sa.Integer(), nullable=False),
+        sa.Column("menu_item_id", sa.Integer(), nullable=False),
+        sa.ForeignKeyConstraint(["menu_item_id"], ["menu_items.id"]),
+        sa.ForeignKeyConstraint(["role_id"], ["roles.id"]),
+        sa.PrimaryKeyConstraint("id"),
+        sa.UniqueConstraint(
+            "role_id", "menu_item_id", name="uq_role_menu_items_role_id_menu_item_id"
+        ),
+    )
+    op.create_index("ix_role_menu_items_id", "role_menu_items", ["id"])
+
+    op.create_table(
+        "role_button_permissions",
+        sa.Column("id", sa.Integer(), nullable=False),
+        sa.Column("role_id", sa.Integer(), nullable=False),
+        sa.Column("button_id", sa.String(length=50), nullable=False),
+        sa.ForeignKeyConstraint(["button_id"], ["button_permissions.button_id"]),
+        sa.ForeignKeyConstraint(["role_id"], ["roles.id"]),
+        sa.PrimaryKeyConstraint("id"),
+        sa.UniqueConstraint(
+            "role_id",
+            "button_id",
+            name="uq_role_button_permissions_role_id_button_id",
+        ),
+    )
+    op.create_index("ix_role_button_permissions_id", "role_button_permissions", ["id"])
+
+    op.create_table(
+        "user_roles",
+        sa.Column("id", sa.Integer(), nullable=False),
+        sa.Column("user_id", sa.Integer(), nullable=False),
+        sa.Column("role_id", sa.Integer(), nullable=False),
+        sa.ForeignKeyConstraint(["role_id"], ["roles.id"]),
+        sa.ForeignKeyConstraint(["user_id"], ["users.id"]),
+        sa.PrimaryKeyConstraint("id"),
+        sa.UniqueConstraint("user_id", "role_id", name="uq_user_roles_user_id_role_id"),
+    )
+    op.create_index("ix_user_roles_id", "user_roles", ["id"])
+    op.create_index("ix_user_roles_role_id", "user_roles", ["role_id"])
+
+    op.create_table(
+        "user_effective_permissions",
+        sa.Column("user_id", sa.Integer(), nullable=False),
+        sa.Column("menu_bitmap", sa.LargeBinary(), nullable=False),
+        sa.Column("button_bitmap", sa.LargeBinary(), nullable=False),
+        sa.Column("version", sa.Integer(), nullable=False),
+        sa.Column("updated_at", sa.DateTime(), nullable=False),
+        sa.ForeignKeyConstraint(["user_id"], ["users.id"]),
+        sa.PrimaryKeyConstraint("user_id"),
+    )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_table("user_effective_permissions")
+    op.drop_index("ix_user_roles_role_id", table_name="user_roles")
+    op.drop_index("ix_user_roles_id", table_name="user_roles")
+    op.drop_table("user_roles")
+    op.drop_index("ix_role_button_permissions_id", table_name="role_button_permissions")
+    op.drop_table("role_button_permissions")
+    op.drop_index("ix_role_menu_items_id", table_name="role_menu_items")
+    op.drop_table("role_menu_items")
+    op.drop_index("ix_roles_id", table_name="roles")
+    op.drop_table("roles")
@@ -0,0 +1,428 @@
+"""bring databases created before the migration chain up to the models
+
+Databases created with ``Base.metadata.create_all`` before 0001 have the
+original users, expenses and menu tables but none of the columns and tables
+added since. Stamp them at 0003 (``alembic stamp 0003``) and upgrade: this
+revision creates the missing tables, adds and backfills ``bit_index`` and
+``path``, removes duplicate user grants ahead of their unique constraints,
+materializes the effective permissions of users that have none and fills the
+expense rollups the summaries read. On databases built by 0001-0003 every step finds its work
+already done.
+
+The tables are spelled out as they stood at this revision and the backfills
+only use the lightweight tables below, so the revision keeps producing the same
+schema however the models change later, and needs neither the application
+settings nor Redis. Nothing cached is touched: a legacy database has no
+permission cache entries yet.
+
+Revision ID: 0004
+Revises: 0003
+Create Date: 2026-10-17 09:30:00.000000
+
+"""
+import datetime
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = "0004"
+down_revision: Union[str, Sequence[str], None] = "0003"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+UNIQUE_GRANTS = [
+    (
+        "uq_user_menu_items_user_id_menu_item_id",
+        "user_menu_items",
+        ["user_id", "menu_item_id"],
+    ),
+    (
+        "uq_user_button_permissions_user_id_button_id",
+        "user_button_permissions",
+        ["user_id", "button_id"],
+    ),
+]
+
+users = sa.table("users", sa.column("id", sa.Integer))
+expenses = sa.table(
+    "expenses",
+    sa.column("id", sa.Integer),
+    sa.column("description", sa.String),
+    sa.column("amount", sa.Float),
+    sa.column("date", sa.DateTime),
+    sa.column("owner_id", sa.Integer),
+)
+expense_daily_rollups = sa.table(
+    "expense_daily_rollups",
+    sa.column("owner_id", sa.Integer),
+    sa.column("day", sa.Date),
+    sa.column("description", sa.String),
+    sa.column("total", sa.Float),
+    sa.column("count", sa.Integer),
+)
+menu_items = sa.table(
+    "menu_items",
+    sa.column("id", sa.Integer),
+    sa.column("parent_id", sa.Integer),
+    sa.column("bit_index", sa.Integer),
+    sa.column("path", sa.String),
+)
+button_permissions = sa.table(
+    "button_permissions",
+    sa.column("button_id", sa.String),
+    sa.column("bit_index", sa.Integer),
+)
+user_menu_items = sa.table(
+    "user_menu_items",
+    sa.column("user_id", sa.Integer),
+    sa.column("menu_item_id", sa.Integer),
+    sa.column("has_permission", sa.Boolean),
+)
+user_button_permissions = sa.table(
+    "user_button_permissions",
+    sa.column("user_id", sa.Integer),
+    sa.column("button_id", sa.String),
+    sa.column("has_permission", sa.Boolean),
+)
+role_menu_items = sa.table(
+    "role_menu_items",
+    sa.column("role_id", sa.Integer),
+    sa.column("menu_item_id", sa.Integer),
+)
+role_button_permissions = sa.table(
+    "role_button_permissions",
+    sa.column("role_id", sa.Integer),
+    sa.column("button_id", sa.String),
+)
+user_roles = sa.table(
+    "user_roles",
+    sa.column("user_id", sa.Integer),
+    sa.column("role_id", sa.Integer),
+)
+user_effective_permissions = sa.table(
+    "user_effective_permissions",
+    sa.column("user_id", sa.Integer),
+    sa.column("menu_bitmap", sa.LargeBinary),
+    sa.column("button_bitmap", sa.LargeBinary),
+    sa.column("version", sa.Integer),
+    sa.column("updated_at", sa.DateTime),
+)
+
+
+def _columns(bind, table: str) -> set:
+    return {column["name"] for column in sa.inspect(bind).get_columns(table)}
+
+
+def _create_missing_tables(bind) -> set:
+    """Create the tables added by 0001 and 0003; returns the names created."""
+    existing = set(sa.inspect(bind).get_table_names())
+    created = set()
+
+    if "expense_daily_rollups" not in existing:
+        op.create_table(
+            "expense_daily_rollups",
+            sa.Column("owner_id", sa.Integer(), nullable=False),
+            sa.Column("day", sa.Date(), nullable=False),
+            sa.Column("description", sa.String(), nullable=False),
+            sa.Column("total", sa.Float(), nullable=False),
+            sa.Column("count", sa.Integer(), nullable=False),
+            sa.ForeignKeyConstraint(["owner_id"], ["users.id"]),
+            sa.PrimaryKeyConstraint("owner_id", "day", "description"),
+        )
+        created.add("expense_daily_rollups")
+
+    if "roles" not in existing:
+        op.create_table(
+            "roles",
+            sa.Column("id", sa.Integer(), nullable=False),
+            sa.Column("name", sa.String(length=50), nullable=False),
+            sa.Column("description", sa.String(length=100), nullable=True),
+            sa.Column("created_at", sa.DateTime(), nullable=False),
+            sa.PrimaryKeyConstraint("id"),
+            sa.UniqueConstraint("name"),
+        )
+        op.create_index("ix_roles_id", "roles", ["id"])
+        created.add("roles")
+
+    if "role_menu_items" not in existing:
+        op.create_table(
+            "role_menu_items",
+            sa.Column("id", sa.Integer(), nullable=False),
+            sa.Column("role_id", sa.Integer(), nullable=False),
+            sa.Column("menu_item_id", sa.Integer(), nullable=False),
+            sa.ForeignKeyConstraint(["menu_item_id"], ["menu_items.id"]),
+            sa.ForeignKeyConstraint(["role_id"], ["roles.id"]),
+            sa.PrimaryKeyConstraint("id"),
+            sa.UniqueConstraint(
+                "role_id",
+                "menu_item_id",
+                name="uq_role_menu_items_role_id_menu_item_id",
+            ),
+        )
+        op.create_index("ix_role_menu_items_id", "role_menu_items", ["id"])
+        created.add("role_menu_items")
+
+    if "role_button_permissions" not in existing:
+        op.create_table(
+            "role_button_permissions",
+            sa.Column("id", sa.Integer(), nullable=False),
+            sa.Column("role_id", sa.Integer(), nullable=False),
+            sa.Column("button_id", sa.String(length=50), nullable=False),
+            sa.ForeignKeyConstraint(
+                ["button_id"], ["button_permissions.button_id"]
+            ),
+            sa.ForeignKeyConstraint(["role_id"], ["roles.id"]),
+            sa.PrimaryKeyConstraint("id"),
+            sa.UniqueConstraint(
+                "role_id",
+                "button_id",
+                name="uq_role_button_permissions_role_id_button_id",
+            ),
+        )
+        op.create_index(
+            "ix_role_button_permissions_id", "role_button_permissions", ["id"]
+        )
+        created.add("role_button_permissions")
+
+    if "user_roles" not in existing:
+        op.create_table(
+            "user_roles",
+            sa.Column("id", sa.Integer(), nullable=False),
+            sa.Column("user_id", sa.Integer(), nullable=False),
+            sa.Column("role_id", sa.Integer(), nullable=False),
+            sa.ForeignKeyConstraint(["role_id"], ["roles.id"]),
+            sa.ForeignKeyConstraint(["user_id"], ["users.id"]),
+            sa.PrimaryKeyConstraint("id"),
+            sa.UniqueConstraint(
+                "user_id", "role_id", name="uq_user_roles_user_id_role_id"
+            ),
+        )
+        op.create_index("ix_user_roles_id", "user_roles", ["id"])
+        op.create_index("ix_user_roles_role_id", "user_roles", ["role_id"])
+        created.add("user_roles")
+
+    if "user_effective_permissions" not in existing:
+        op.create_table(
+            "user_effective_permissions",
+            sa.Column("user_id", sa.Integer(), nullable=False),
+            sa.Column("menu_bitmap", sa.LargeBinary(), nullable=False),
+            sa.Column("button_bitmap", sa.LargeBinary(), nullable=False),
+            sa.Column("version", sa.Integer(), nullable=False),
+            sa.Column("updated_at", sa.DateTime(), nullable=False),
+            sa.ForeignKeyConstraint(["user_id"], ["users.id"]),
+            sa.PrimaryKeyConstraint("user_id"),
+        )
+        created.add("user_effective_permissions")
+
+    return created
+
+
+def _add_bit_index(bind, table: str, table_args=()) -> None:
+    """Number existing rows 0..n-1 in id order, as the insert hook would have.
+
+    ``table_args`` restates the table's unnamed unique constraints, which
+    SQLite batch mode would otherwise drop when it recreates the table.
+    """
+    if "bit_index" in _columns(bind, table):
+        return
+    with op.batch_alter_table(table, table_args=table_args) as batch_op:
+        batch_op.add_column(sa.Column("bit_index", sa.Integer(), nullable=True))
+    op.execute(
+        f"UPDATE {table} SET bit_index = "
+        f"(SELECT COUNT(*) FROM {table} AS earlier WHERE earlier.id < {table}.id)"
+    )
+    with op.batch_alter_table(table, table_args=table_args) as batch_op:
+        batch_op.alter_column("bit_index", existing_type=sa.Integer(), nullable=False)
+        batch_op.create_unique_constraint(f"uq_{table}_bit_index", ["bit_index"])
+
+
+def _add_unique_grant(bind, name: str, table: str, columns) -> None:
+    existing = {
+        tuple(constraint["column_names"])
+        for constraint in sa.inspect(bind).get_unique_constraints(table)
+    }
+    if tuple(columns) in existing:
+        return
+    key = ", ".join(columns)
+    # Keep the most recent grant of each key
+    op.execute(
+        f"DELETE FROM {table} WHERE id NOT IN "
+        f"(SELECT keep.id FROM (SELECT MAX(id) AS id FROM {table} GROUP BY {key}) AS keep)"
+    )
+    with op.batch_alter_table(table) as batch_op:
+        batch_op.create_unique_constraint(name, columns)
+
+
+def _backfill_menu_paths(bind) -> None:
+    """Materialized path of every menu item: its ancestors' ids, root first."""
+    parents = dict(
+        bind.execute(sa.select(menu_items.c.id, menu_items.c.parent_id)).all()
+    )
+    paths = {}
+
+    def path_of(menu_id):
+        if menu_id not in paths:
+            parent_id = parents[menu_id]
+            paths[menu_id] = (
+                "/" if parent_id is None else f"{path_of(parent_id)}{parent_id}/"
+            )
+        return paths[menu_id]
+
+    for menu_id in parents:
+        path_of(menu_id)
+    if paths:
+        bind.execute(
+            menu_items.update()
+            .where(menu_items.c.id == sa.bindparam("menu_id"))
+            .values(path=sa.bindparam("menu_path")),
+            [
+                {"menu_id": menu_id, "menu_path": path}
+                for menu_id, path in paths.items()
+            ],
+        )
+
+
+def _bitmap(indexes) -> bytes:
+    """Bit i in byte i // 8 under mask 0x80 >> i % 8, as core.bitmap encodes it."""
+    indexes = list(indexes)
+    if not indexes:
+        return b""
+    bits = bytearray(max(indexes) // 8 + 1)
+    for index in indexes:
+        bits[index >> 3] |= 0x80 >> (index & 7)
+    return bytes(bits)
+
+
+def _backfill_effective_permissions(bind) -> None:
+    """Materialize users that have no effective permissions row yet.
+
+    The union of their roles' grants, then their own grants and denials on top.
+    """
+    user_ids = list(
+        bind.scalars(
+            sa.select(users.c.id).where(
+                ~sa.exists().where(user_effective_permissions.c.user_id == users.c.id)
+            )
+        )
+    )
+    if not user_ids:
+        return
+    bits = {
+        (user_id, kind): set() for user_id in user_ids for kind in ("menu", "button")
+    }
+    role_grants = [
+        sa.select(user_roles.c.user_id, sa.literal("menu"), menu_items.c.bit_index)
+        .join(role_menu_items, role_menu_items.c.role_id == user_roles.c.role_id)
+        .join(menu_items, menu_items.c.id == role_menu_items.c.menu_item_id),
+        sa.select(
+            user_roles.c.user_id, sa.literal("button"), button_permissions.c.bit_index
+        )
+        .join(
+            role_button_permissions,
+            role_button_permissions.c.role_id == user_roles.c.role_id,
+        )
+        .join(
+            button_permissions,
+            button_permissions.c.button_id == role_button_permissions.c.button_id,
+        ),
+    ]
+    user_grants = [
+        sa.select(
+            user_menu_items.c.user_id,
+            sa.literal("menu"),
+            menu_items.c.bit_index,
+            user_menu_items.c.has_permission,
+        ).join(menu_items, menu_items.c.id == user_menu_items.c.menu_item_id),
+        sa.select(
+            user_button_permissions.c.user_id,
+            sa.literal("button"),
+            button_permissions.c.bit_index,
+            user_button_permissions.c.has_permission,
+        ).join(
+            button_permissions,
+            button_permissions.c.button_id == user_button_permissions.c.button_id,
+        ),
+    ]
+    for stmt in role_grants:
+        for user_id, kind, bit in bind.execute(stmt):
+            if (user_id, kind) in bits:
+                bits[user_id, kind].add(bit)
+    for stmt in user_grants:
+        for user_id, kind, bit, granted in bind.execute(stmt):
+            if (user_id, kind) not in bits:
+                continue
+            if granted:
+                bits[user_id, kind].add(bit)
+            else:
+                bits[user_id, kind].discard(bit)
+
+    now = datetime.datetime.utcnow()
+    bind.execute(
+        user_effective_permissions.insert(),
+        [
+            {
+                "user_id": user_id,
+                "menu_bitmap": _bitmap(bits[user_id, "menu"]),
+                "button_bitmap": _bitmap(bits[user_id, "button"]),
+                "version": 1,
+                "updated_at": now,
+            }
+            for user_id in user_ids
+        ],
+    )
+
+
+def _backfill_expense_rollups(bind) -> None:
+    """Totals per (owner, day, description); undated or unowned expenses have none."""
+    day = sa.func.date(expenses.c.date)
+    description = sa.func.coalesce(expenses.c.description, "")
+    bind.execute(
+        expense_daily_rollups.insert().from_select(
+            ["owner_id", "day", "description", "total", "count"],
+            sa.select(
+                expenses.c.owner_id,
+                day,
+                description,
+                sa.func.sum(expenses.c.amount),
+                sa.func.count(expenses.c.id),
+            )
+            .where(expenses.c.owner_id.is_not(None), expenses.c.date.is_not(None))
+            .group_by(expenses.c.owner_id, day, description),
+        )
+    )
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    bind = op.get_bind()
+    created = _create_missing_tables(bind)
+
+    _add_bit_index(bind, "menu_items")
+    _add_bit_index(
+        bind, "button_permissions", table_args=(sa.UniqueConstraint("button_id"),)
+    )
+    for name, table, columns in UNIQUE_GRANTS:
+        _add_unique_grant(bind, name, table, columns)
+
+    if "path" not in _columns(bind, "menu_items"):
+        with op.batch_alter_table("menu_items") as batch_op:
+            batch_op.add_column(sa.Column("path", sa.String(length=255), nullable=True))
+        _backfill_menu_paths(bind)
+        with op.batch_alter_table("menu_items") as batch_op:
+            batch_op.alter_column(
+                "path", existing_type=sa.String(length=255), nullable=False
+            )
+
+    _backfill_effective_permissions(bind)
+    # Rollup tables built by 0001 have been maintained since
+    if "expense_daily_rollups" in created:
+        _backfill_expense_rollups(bind)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    # Nothing to undo: on databases built by 0001-0003 this revision changes no
+    # schema, and legacy databases are not taken back to their pre-chain state.
@@ -0,0 +1,76 @@
+"""indexes for permission lookups, menu tree loads and expense listings
+
+Every foreign key gets an index whose leading columns it matches (see
+db.indexes.find_unindexed_foreign_keys). ``user_menu_items.user_id`` and
+``user_button_permissions(user_id, button_id)`` are already served by their
+unique constraints. On PostgreSQL the indexes are built CONCURRENTLY so the
+tables stay writable; IF NOT EXISTS lets databases brought forward by 0004
+pick up only the indexes they are missing.
+
+Revision ID: 0005
+Revises: 0004
+Create Date: 2026-10-17 09:40:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = "0005"
+down_revision: Union[str, Sequence[str], None] = "0004"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+INDEXES = [
+    ("ix_menu_items_parent_id_order", "menu_items", ["parent_id", "order"], {}),
+    ("ix_menu_items_path_order", "menu_items", ["path", "order"], {}),
+    (
+        "ix_menu_items_active_path_order",
+        "menu_items",
+        ["path", "order"],
+        {
+            "postgresql_where": sa.text("is_active"),
+            "sqlite_where": sa.text("is_active = 1"),
+        },
+    ),
+    ("ix_user_menu_items_menu_item_id", "user_menu_items", ["menu_item_id"], {}),
+    ("ix_button_permissions_menu_item_id", "button_permissions", ["menu_item_id"], {}),
+    (
+        "ix_user_button_permissions_button_id",
+        "user_button_permissions",
+        ["button_id"],
+        {},
+    ),
+    ("ix_role_menu_items_menu_item_id", "role_menu_items", ["menu_item_id"], {}),
+    (
+        "ix_role_button_permissions_button_id",
+        "role_button_permissions",
+        ["button_id"],
+        {},
+    ),
+    ("ix_expenses_owner_id_date_id", "expenses", ["owner_id", "date", "id"], {}),
+]
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    with op.get_context().autocommit_block():
+        for name, table, columns, options in INDEXES:
+            op.create_index(
+                name,
+                table,
+                columns,
+                if_not_exists=True,
+                postgresql_concurrently=True,
+                **options,
+            )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    with op.get_context().autocommit_block():
+        for name, table, _, _ in reversed(INDEXES):
+            op.drop_index(name, table_name=table, postgresql_concurrently=True)
@@ -1,9 +1,11 @@
 from fastapi import APIRouter
 
-from api.endpoints import users, login, expenses, menus
+from api.endpoints import users, login, expenses, menus, metrics, roles
 
 api_router = APIRouter()
 api_router.include_router(login.router, tags=["login"])
 api_router.include_router(users.router, prefix="/users", tags=["users"])
 api_router.include_router(expenses.router, prefix="/expenses", tags=["expenses"])
 api_router.include_router(menus.router, prefix="/menus", tags=["menus"])
+api_router.include_router(roles.router, prefix="/roles", tags=["roles"])
+api_router.include_router(metrics.router, prefix="/metrics", tags=["metrics"])
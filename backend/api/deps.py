@@ -1,35 +1,133 @@
-from fastapi import Depends, HTTPException, status
+import asyncio
+import dataclasses
+import functools
+from typing import Any, Callable, Optional
+
+from fastapi import Depends, HTTPException, Request, status
+from fastapi.routing import APIRoute
 from fastapi.security import OAuth2PasswordBearer
 from jose import jwt
 from pydantic import ValidationError
-from sqlalchemy.orm import Session
 
 from core import security
-from core.config import settings
-from crud import crud_user
-from db.session import SessionLocal
-from models.user import User
-from schemas.token import TokenPayload
+from crud import crud_menu_async, crud_user_async
+from crud.crud_user import Principal
+from db import replicas
+from db.session import (
+    AsyncSessionLocal,
+    LazyAsyncSession,
+    LazySession,
+    close_lazy_session,
+    get_async_db,
+    get_db,
+    release_lazy_session,
+)
 
 reusable_oauth2 = OAuth2PasswordBearer(tokenUrl=f"/login/access-token")
 
 
-def get_db():
-    db = SessionLocal()
+def token_user_id(request: Request) -> Optional[int]:
+    """User id of a valid bearer token on the request, without loading the user."""
+    scheme, _, token = request.headers.get("Authorization", "").partition(" ")
+    if scheme.lower() != "bearer" or not token:
+        return None
+    try:
+        sub = security.decode_access_token(token).sub
+        return int(sub) if sub else None
+    except (jwt.JWTError, ValidationError, ValueError):
+        return None
+
+
+def _read_scopes(request: Request) -> tuple:
+    user_id = token_user_id(request)
+    if user_id is None:
+        return (replicas.CATALOG_SCOPE,)
+    return (replicas.CATALOG_SCOPE, replicas.user_scope(user_id))
+
+
+async def get_read_db(request: Request):
+    """Session for read-only endpoints: a replica unless the caller wrote recently.
+
+    Like ``get_db`` the session is created on first use, so the read-your-writes
+    check is skipped entirely when the endpoint is served from cache. See
+    ``db.replicas`` for replica selection and the read-your-writes window.
+    """
+
+    def open_session():
+        primary = bool(replicas.replica_router.replicas) and replicas.wrote_recently(
+            *_read_scopes(request)
+        )
+        return replicas.replica_router.session(primary=primary)
+
+    db = LazySession(open_session)
     try:
         yield db
     finally:
-        db.close()
+        await close_lazy_session(db)
 
 
-def get_current_user(
-    db: Session = Depends(get_db), token: str = Depends(reusable_oauth2)
-) -> User:
+async def get_async_read_db(request: Request):
+    """Async variant of ``get_read_db``; the read-your-writes check is likewise
+    deferred to the session's first query (see ``ReplicaRouter.async_session``).
+    """
+    db = LazyAsyncSession(
+        lambda: replicas.replica_router.async_session(*_read_scopes(request))
+    )
     try:
-        payload = jwt.decode(
-            token, settings.SECRET_KEY, algorithms=[security.ALGORITHM]
+        yield db
+    finally:
+        await db.close()
+
+
+def _release_sessions_after(call: Callable[..., Any]) -> Callable[..., Any]:
+    if asyncio.iscoroutinefunction(call):
+
+        @functools.wraps(call)
+        async def endpoint(**values: Any) -> Any:
+            result = await call(**values)
+            for value in values.values():
+                if isinstance(value, LazyAsyncSession):
+                    await value.release()
+                elif isinstance(value, LazySession):
+                    await release_lazy_session(value)
+            return result
+
+        return endpoint
+
+    @functools.wraps(call)
+    def endpoint(**values: Any) -> Any:
+        result = call(**values)
+        for value in values.values():
+            if isinstance(value, LazySession):
+                value.release()
+        return result
+
+    return endpoint
+
+
+class SessionReleasingRoute(APIRoute):
+    """Route that returns the endpoint's database connections to the pool as
+    soon as the endpoint returns, before the response is serialized.
+
+    Read-only transactions are committed without expiring loaded objects (see
+    ``LazySession.release``); sessions with uncommitted writes are left for the
+    dependency teardown to roll back.
+    """
+
+    def get_route_handler(self) -> Callable:
+        dependant = self.dependant
+        self.dependant = dataclasses.replace(
+            dependant, call=_release_sessions_after(dependant.call)
         )
-        token_data = TokenPayload(**payload)
+        try:
+            return super().get_route_handler()
+        finally:
+            self.dependant = dependant
+
+
+async def get_current_user(token: str = Depends(reusable_oauth2)) -> Principal:
+    try:
+        token_data = security.decode_access_token(token)
     except (jwt.JWTError, ValidationError):
         raise HTTPException(
             status_code=status.HTTP_403_FORBIDDEN,
@@ -40,23 +138,48 @@ def get_current_user(
             status_code=status.HTTP_403_FORBIDDEN,
             detail="Could not validate credentials",
         )
-    user = crud_user.user.get(db, id=int(token_data.sub))
-    if not user:
+    user_id = int(token_data.sub)
+    principal = await crud_user_async.get_cached_principal(user_id)
+    if principal is None:
+        # Only a cold cache needs a database connection
+        async with AsyncSessionLocal() as db:
+            principal = await crud_user_async.load_principal(db, user_id)
+    if not principal:
         raise HTTPException(status_code=404, detail="User not found")
-    return user
+    return principal
+
+
+async def get_permission_claims(
+    token: str = Depends(reusable_oauth2),
+    current_user: Principal = Depends(get_current_user),
+) -> Optional[security.PermissionClaims]:
+    """Permission digest embedded in the token, or None unless it is current.
+
+    The digest is trusted only while its version equals the user's current
+    permission version and its superuser flag matches the principal; otherwise
+    callers fall back to the regular permission checks.
+    """
+    claims = security.PermissionClaims.from_payload(
+        security.decode_access_token(token)
+    )
+    if claims is None or claims.is_superuser != current_user.is_superuser:
+        return None
+    if await crud_menu_async.get_permission_version(current_user.id) != claims.version:
+        return None
+    return claims
 
 
 def get_current_active_user(
-    current_user: User = Depends(get_current_user),
-) -> User:
+    current_user: Principal = Depends(get_current_user),
+) -> Principal:
     if not current_user.is_active:
         raise HTTPException(status_code=400, detail="Inactive user")
     return current_user
 
 
 def get_current_active_superuser(
-    current_user: User = Depends(get_current_user),
-) -> User:
+    current_user: Principal = Depends(get_current_user),
+) -> Principal:
     if not current_user.is_superuser:
         raise HTTPException(
             status_code=400, detail="The user doesn't have enough privileges"
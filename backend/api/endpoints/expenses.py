@@ -1,49 +1,186 @@
-from typing import List, Any
+import csv
+import datetime
+import io
+import json
+from typing import Dict, Iterator, List, Any, Literal, Optional
 
-from fastapi import APIRouter, Depends, HTTPException
+from fastapi import APIRouter, Body, Depends, HTTPException, Response
+from pydantic import ValidationError
+from fastapi.responses import StreamingResponse
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import Session
 
 from api import deps
-from crud import crud_expense
-from models.user import User
-from schemas.expense import Expense, ExpenseCreate, ExpenseUpdate
+from crud import crud_expense, crud_expense_async
+from crud.crud_user import Principal
+from db.session import SessionLocal
+from schemas.expense import (
+    Expense,
+    ExpenseBulkError,
+    ExpenseBulkResult,
+    ExpenseCreate,
+    ExpenseSummaryBucket,
+    ExpenseUpdate,
+)
+
+router = APIRouter(route_class=deps.SessionReleasingRoute)
+
+NEXT_CURSOR_HEADER = "X-Next-Cursor"
 
-router = APIRouter()
 
 @router.get("/", response_model=List[Expense])
 def read_expenses(
+    response: Response,
     db: Session = Depends(deps.get_db),
     skip: int = 0,
     limit: int = 100,
-    current_user: User = Depends(deps.get_current_active_superuser),
+    cursor: Optional[str] = None,
+    current_user: Principal = Depends(deps.get_current_active_superuser),
 ) -> Any:
     """
-    Retrieve expenses.
+    Retrieve expenses, newest first.
+
+    Pass the X-Next-Cursor response header back as ``cursor`` to fetch the
+    next page; ``skip`` is still honoured when no cursor is given.
     """
-    expenses = crud_expense.get_expenses(db, skip=skip, limit=limit)
+    try:
+        expenses = crud_expense.get_expenses(
+            db, skip=skip, limit=limit, cursor=cursor
+        )
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+    next_cursor = crud_expense.next_cursor(expenses, limit)
+    if next_cursor:
+        response.headers[NEXT_CURSOR_HEADER] = next_cursor
     return expenses
 
 @router.get("/me", response_model=List[Expense])
-def read_own_expenses(
-    db: Session = Depends(deps.get_db),
+async def read_own_expenses(
+    response: Response,
+    db: AsyncSession = Depends(deps.get_async_read_db),
     skip: int = 0,
     limit: int = 100,
-    current_user: User = Depends(deps.get_current_active_user),
+    cursor: Optional[str] = None,
+    current_user: Principal = Depends(deps.get_current_active_user),
 ) -> Any:
     """
-    Retrieve own expenses.
+    Retrieve own expenses, newest first.
+
+    Pass the X-Next-Cursor response header back as ``cursor`` to fetch the
+    next page; ``skip`` is still honoured when no cursor is given.
     """
-    expenses = crud_expense.get_expenses_by_owner(
-        db, owner_id=current_user.id, skip=skip, limit=limit
-    )
+    try:
+        expenses = await crud_expense_async.get_expenses_by_owner(
+            db, owner_id=current_user.id, skip=skip, limit=limit, cursor=cursor
+        )
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+    next_cursor = crud_expense.next_cursor(expenses, limit)
+    if next_cursor:
+        response.headers[NEXT_CURSOR_HEADER] = next_cursor
     return expenses
 
+@router.get("/me/summary", response_model=List[ExpenseSummaryBucket])
+def read_own_expense_summary(
+    group_by: Literal["day", "month", "description"] = "day",
+    start: Optional[datetime.date] = None,
+    end: Optional[datetime.date] = None,
+    db: Session = Depends(deps.get_db),
+    current_user: Principal = Depends(deps.get_current_active_user),
+) -> Any:
+    """
+    Totals, counts and averages of own expenses per day, month or description.
+    """
+    return crud_expense.get_expense_summary(
+        db, owner_id=current_user.id, group_by=group_by, start=start, end=end
+    )
+
+ExportFormat = Literal["csv", "ndjson"]
+
+EXPORT_MEDIA_TYPES = {"csv": "text/csv", "ndjson": "application/x-ndjson"}
+
+
+def _isoformat(value: Optional[datetime.datetime]) -> Optional[str]:
+    # date is nullable; a missing date must not abort the stream midway
+    return value.isoformat() if value is not None else None
+
+
+def _export_chunks(owner_id: Optional[int], fmt: str) -> Iterator[str]:
+    # The stream owns its session so the pooled connection is held exactly
+    # as long as rows are being sent, independent of the request's session.
+    db = SessionLocal()
+    try:
+        if fmt == "csv":
+            buffer = io.StringIO()
+            writer = csv.writer(buffer)
+            writer.writerow(crud_expense.EXPORT_COLUMNS)
+            for batch in crud_expense.iter_expense_batches(db, owner_id=owner_id):
+                writer.writerows(
+                    (
+                        row.id,
+                        _isoformat(row.date) or "",
+                        row.description,
+                        row.amount,
+                        row.owner_id,
+                    )
+                    for row in batch
+                )
+                yield buffer.getvalue()
+                buffer.seek(0)
+                buffer.truncate()
+            yield buffer.getvalue()
+        else:
+            for batch in crud_expense.iter_expense_batches(db, owner_id=owner_id):
+                yield "".join(
+                    json.dumps(
+                        {
+                            "id": row.id,
+                            "date": _isoformat(row.date),
+                            "description": row.description,
+                            "amount": row.amount,
+                            "owner_id": row.owner_id,
+                        }
+                    )
+                    + "\n"
+                    for row in batch
+                )
+    finally:
+        db.close()
+
+
+def _export_response(owner_id: Optional[int], fmt: str) -> StreamingResponse:
+    return StreamingResponse(
+        _export_chunks(owner_id, fmt),
+        media_type=EXPORT_MEDIA_TYPES[fmt],
+        headers={"Content-Disposition": f'attachment; filename="expenses.{fmt}"'},
+    )
+
+@router.get("/export")
+def export_expenses(
+    format: ExportFormat = "csv",
+    current_user: Principal = Depends(deps.get_current_active_superuser),
+) -> Any:
+    """
+    Stream all expenses as CSV or NDJSON.
+    """
+    return _export_response(None, format)
+
+@router.get("/me/export")
+def export_own_expenses(
+    format: ExportFormat = "csv",
+    current_user: Principal = Depends(deps.get_current_active_user),
+) -> Any:
+    """
+    Stream own expenses as CSV or NDJSON.
+    """
+    return _export_response(current_user.id, format)
+
 @router.post("/", response_model=Expense)
 def create_expense(
     *,
     db: Session = Depends(deps.get_db),
     expense_in: ExpenseCreate,
-    current_user: User = Depends(deps.get_current_active_user),
+    current_user: Principal = Depends(deps.get_current_active_user),
 ) -> Any:
     """
     Create new expense.
@@ -53,13 +190,43 @@ def create_expense(
     )
     return expense
 
+@router.post("/bulk", response_model=ExpenseBulkResult)
+def create_expenses_bulk(
+    *,
+    db: Session = Depends(deps.get_db),
+    items: List[Dict[str, Any]] = Body(...),
+    current_user: Principal = Depends(deps.get_current_active_user),
+) -> Any:
+    """
+    Create many expenses at once.
+
+    Items are validated one by one; invalid items are reported by index and
+    the valid ones are still created.
+    """
+    valid: List[ExpenseCreate] = []
+    errors: List[ExpenseBulkError] = []
+    for index, item in enumerate(items):
+        try:
+            valid.append(ExpenseCreate.model_validate(item))
+        except ValidationError as exc:
+            errors.append(
+                ExpenseBulkError(
+                    index=index,
+                    errors=exc.errors(include_url=False, include_context=False),
+                )
+            )
+    created_ids = crud_expense.create_expenses_bulk(
+        db, expenses=valid, owner_id=current_user.id
+    )
+    return ExpenseBulkResult(created_ids=created_ids, errors=errors)
+
 @router.put("/{expense_id}", response_model=Expense)
 def update_expense(
     *,
     db: Session = Depends(deps.get_db),
     expense_id: int,
     expense_in: ExpenseUpdate,
-    current_user: User = Depends(deps.get_current_active_user),
+    current_user: Principal = Depends(deps.get_current_active_user),
 ) -> Any:
     """
     Update an expense.
@@ -77,7 +244,7 @@ def delete_expense(
     *,
     db: Session = Depends(deps.get_db),
     expense_id: int,
-    current_user: User = Depends(deps.get_current_active_user),
+    current_user: Principal = Depends(deps.get_current_active_user),
 ) -> Any:
     """
     Delete an expense.
@@ -1,26 +1,39 @@
+import time
+
 from fastapi import APIRouter, Depends, HTTPException, status
 from sqlalchemy.orm import Session
 from datetime import timedelta
 from fastapi.security import OAuth2PasswordRequestForm
+from starlette.concurrency import run_in_threadpool
 
-from crud import crud_user
+from crud import crud_menu, crud_user
 from schemas.token import Token
 from core import security
 from api import deps
 from core.config import settings
 
-router = APIRouter()
+router = APIRouter(route_class=deps.SessionReleasingRoute)
 
 @router.post("/login/access-token", response_model=Token)
-def login_access_token(
+async def login_access_token(
     db: Session = Depends(deps.get_db), form_data: OAuth2PasswordRequestForm = Depends()
 ):
     """
     OAuth2 compatible token login, get an access token for future requests
     """
-    user = crud_user.authenticate_user(
-        db, email=form_data.username, password=form_data.password
-    )
+    started = time.perf_counter()
+    try:
+        user = await crud_user.authenticate_user_async(
+            db, email=form_data.username, password=form_data.password
+        )
+    except security.PasswordHasherBusy:
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail="Too many login attempts, please retry shortly",
+            headers={"Retry-After": "1"},
+        )
+    finally:
+        security.login_latency.observe(time.perf_counter() - started)
     if not user:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
@@ -31,9 +44,15 @@ def login_access_token(
         raise HTTPException(status_code=400, detail="Inactive user")
     
     access_token_expires = timedelta(minutes=settings.ACCESS_TOKEN_EXPIRE_MINUTES)
+    claims = None
+    if settings.TOKEN_PERMISSION_CLAIMS:
+        permission_claims = await run_in_threadpool(
+            crud_menu.get_permission_claims, db, user.id
+        )
+        claims = permission_claims.to_claims()
     return {
         "access_token": security.create_access_token(
-            user.id, expires_delta=access_token_expires
+            user.id, expires_delta=access_token_expires, claims=claims
         ),
         "token_type": "bearer",
     } 
\ No newline at end of file
@@ -1,15 +1,18 @@
-from typing import List, Any
-from fastapi import APIRouter, Depends, HTTPException, status
+from typing import Dict, List, Any, Optional
+from fastapi import APIRouter, Depends, HTTPException, Response, status
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import Session
 
 from api import deps
-from crud import crud_menu
-from models.user import User
+from crud import crud_menu, crud_menu_async
+from core.security import PermissionClaims
+from crud.crud_user import Principal
 from schemas.menu import (
     MenuItem,
     MenuItemCreate,
     MenuItemUpdate,
     ButtonPermission,
+    ButtonPermissionCheck,
     ButtonPermissionCreate,
     UserMenuResponse,
     SetUserMenuPermissions,
@@ -17,17 +20,17 @@ from schemas.menu import (
     UserButtonPermission as UserButtonPermissionSchema,
 )
 
-router = APIRouter()
+router = APIRouter(route_class=deps.SessionReleasingRoute)
 
 
 # 菜单项管理端点
 @router.get("/", response_model=List[MenuItem])
 def read_menu_items(
-    db: Session = Depends(deps.get_db),
+    db: Session = Depends(deps.get_read_db),
     skip: int = 0,
     limit: int = 100,
     include_inactive: bool = False,
-    current_user: User = Depends(deps.get_current_active_superuser),
+    current_user: Principal = Depends(deps.get_current_active_superuser),
 ) -> Any:
     """
     获取所有菜单项（仅超级用户）
@@ -43,12 +46,15 @@ def create_menu_item(
     *,
     db: Session = Depends(deps.get_db),
     menu_item_in: MenuItemCreate,
-    current_user: User = Depends(deps.get_current_active_superuser),
+    current_user: Principal = Depends(deps.get_current_active_superuser),
 ) -> Any:
     """
     创建新菜单项（仅超级用户）
     """
-    menu_item = crud_menu.create_menu_item(db, menu_item=menu_item_in)
+    try:
+        menu_item = crud_menu.create_menu_item(db, menu_item=menu_item_in)
+    except ValueError as exc:
+        raise HTTPException(status_code=400, detail=str(exc))
     return menu_item
 
 
@@ -56,15 +62,15 @@ def create_menu_item(
 def read_menu_item(
     menu_id: int,
     db: Session = Depends(deps.get_db),
-    current_user: User = Depends(deps.get_current_active_superuser),
+    current_user: Principal = Depends(deps.get_current_active_superuser),
 ) -> Any:
     """
-    获取单个菜单项详情（仅超级用户）
+    获取单个菜单项详情及其子树（仅超级用户）
     """
-    menu_item = crud_menu.get_menu_item(db, menu_item_id=menu_id)
-    if not menu_item:
+    subtree = crud_menu.load_menu_tree(db, root_id=menu_id, include_inactive=True)
+    if not subtree:
         raise HTTPException(status_code=404, detail="Menu item not found")
-    return menu_item
+    return subtree[0]
 
 
 @router.put("/{menu_id}", response_model=MenuItem)
@@ -73,14 +79,17 @@ def update_menu_item(
     db: Session = Depends(deps.get_db),
     menu_id: int,
     menu_item_in: MenuItemUpdate,
-    current_user: User = Depends(deps.get_current_active_superuser),
+    current_user: Principal = Depends(deps.get_current_active_superuser),
 ) -> Any:
     """
     更新菜单项（仅超级用户）
     """
-    menu_item = crud_menu.update_menu_item(
-        db, menu_item_id=menu_id, menu_item_update=menu_item_in
-    )
+    try:
+        menu_item = crud_menu.update_menu_item(
+            db, menu_item_id=menu_id, menu_item_update=menu_item_in
+        )
+    except ValueError as exc:
+        raise HTTPException(status_code=400, detail=str(exc))
     if not menu_item:
         raise HTTPException(status_code=404, detail="Menu item not found")
     return menu_item
@@ -90,7 +99,7 @@ def update_menu_item(
 def delete_menu_item(
     menu_id: int,
     db: Session = Depends(deps.get_db),
-    current_user: User = Depends(deps.get_current_active_superuser),
+    current_user: Principal = Depends(deps.get_current_active_superuser),
 ) -> Any:
     """
     删除菜单项（仅超级用户）
@@ -106,7 +115,7 @@ def delete_menu_item(
 def read_button_permissions(
     db: Session = Depends(deps.get_db),
     menu_item_id: int = None,
-    current_user: User = Depends(deps.get_current_active_superuser),
+    current_user: Principal = Depends(deps.get_current_active_superuser),
 ) -> Any:
     """
     获取按钮权限（仅超级用户）
@@ -120,7 +129,7 @@ def create_button_permission(
     *,
     db: Session = Depends(deps.get_db),
     button_permission_in: ButtonPermissionCreate,
-    current_user: User = Depends(deps.get_current_active_superuser),
+    current_user: Principal = Depends(deps.get_current_active_superuser),
 ) -> Any:
     """
     创建按钮权限（仅超级用户）
@@ -133,100 +142,31 @@ def create_button_permission(
 
 # 用户菜单权限端点
 @router.get("/users/me/menus", response_model=List[UserMenuResponse])
-def read_current_user_menus(
-    db: Session = Depends(deps.get_db),
-    current_user: User = Depends(deps.get_current_active_user),
+async def read_current_user_menus(
+    db: AsyncSession = Depends(deps.get_async_read_db),
+    current_user: Principal = Depends(deps.get_current_active_user),
 ) -> Any:
     """
     获取当前用户的菜单
     """
-    accessible_menus = crud_menu.get_user_accessible_menus(db, user_id=current_user.id)
-
-    # 构建层次结构并添加按钮权限
-    def build_menu_tree(menus: List[Any]) -> List[UserMenuResponse]:
-        result = []
-        for menu in menus:
-            # 获取用户按钮权限
-            user_button_perms = crud_menu.get_user_button_permissions(
-                db, user_id=current_user.id
-            )
-            button_perms_dict = {
-                perm.button_id: perm.has_permission for perm in user_button_perms
-            }
-
-            # 获取菜单相关的按钮
-            menu_buttons = crud_menu.get_button_permissions(db, menu_item_id=menu.id)
-            buttons = [
-                UserButtonPermissionSchema(
-                    button_id=btn.button_id,
-                    has_permission=button_perms_dict.get(btn.button_id, False),
-                )
-                for btn in menu_buttons
-            ]
-
-            menu_response = UserMenuResponse(
-                id=menu.id,
-                title=menu.title,
-                icon=menu.icon,
-                route=menu.route,
-                order=menu.order,
-                children=build_menu_tree(menu.children),
-                buttons=buttons,
-            )
-            result.append(menu_response)
-
-        return result
-
-    return build_menu_tree(accessible_menus)
+    return Response(
+        content=await crud_menu_async.get_user_menu_tree_json(
+            db, user_id=current_user.id
+        ),
+        media_type="application/json",
+    )
 
 
 @router.get("/users/{user_id}/menus", response_model=List[UserMenuResponse])
 def read_user_menu_permissions(
     user_id: int,
     db: Session = Depends(deps.get_db),
-    current_user: User = Depends(deps.get_current_active_superuser),
+    current_user: Principal = Depends(deps.get_current_active_superuser),
 ) -> Any:
     """
     获取用户菜单权限（仅超级用户）
     """
-    accessible_menus = crud_menu.get_user_accessible_menus(db, user_id=user_id)
-
-    # 构建层次结构并添加按钮权限
-    def build_menu_tree(menus: List[Any]) -> List[UserMenuResponse]:
-        result = []
-        for menu in menus:
-            # 获取用户按钮权限
-            user_button_perms = crud_menu.get_user_button_permissions(
-                db, user_id=user_id
-            )
-            button_perms_dict = {
-                perm.button_id: perm.has_permission for perm in user_button_perms
-            }
-
-            # 获取菜单相关的按钮
-            menu_buttons = crud_menu.get_button_permissions(db, menu_item_id=menu.id)
-            buttons = [
-                UserButtonPermissionSchema(
-                    button_id=btn.button_id,
-                    has_permission=button_perms_dict.get(btn.button_id, False),
-                )
-                for btn in menu_buttons
-            ]
-
-            menu_response = UserMenuResponse(
-                id=menu.id,
-                title=menu.title,
-                icon=menu.icon,
-                route=menu.route,
-                order=menu.order,
-                children=build_menu_tree(menu.children),
-                buttons=buttons,
-            )
-            result.append(menu_response)
-
-        return result
-
-    return build_menu_tree(accessible_menus)
+    return crud_menu.build_user_menu_tree(db, user_id=user_id)
 
 
 @router.post("/users/{user_id}/menus")
@@ -234,17 +174,18 @@ def set_user_menu_permissions(
     user_id: int,
     permissions: SetUserMenuPermissions,
     db: Session = Depends(deps.get_db),
-    current_user: User = Depends(deps.get_current_active_superuser),
+    current_user: Principal = Depends(deps.get_current_active_superuser),
 ) -> Any:
     """
     设置用户菜单权限（仅超级用户）
     """
-    success = crud_menu.set_user_menu_permissions(
+    changes = crud_menu.set_user_menu_permissions(
         db, user_id=user_id, menu_permissions=permissions.menu_permissions
     )
-    if not success:
-        raise HTTPException(status_code=400, detail="Failed to set menu permissions")
-    return {"message": "Menu permissions updated successfully"}
+    return {
+        "message": "Menu permissions updated successfully",
+        "changes": changes._asdict(),
+    }
 
 
 # 用户按钮权限端点
@@ -252,7 +193,7 @@ def set_user_menu_permissions(
 def read_user_button_permissions(
     user_id: int,
     db: Session = Depends(deps.get_db),
-    current_user: User = Depends(deps.get_current_active_superuser),
+    current_user: Principal = Depends(deps.get_current_active_superuser),
 ) -> Any:
     """
     获取用户按钮权限（仅超级用户）
@@ -272,29 +213,54 @@ def set_user_button_permissions(
     user_id: int,
     permissions: SetUserButtonPermissions,
     db: Session = Depends(deps.get_db),
-    current_user: User = Depends(deps.get_current_active_superuser),
+    current_user: Principal = Depends(deps.get_current_active_superuser),
 ) -> Any:
     """
     设置用户按钮权限（仅超级用户）
     """
-    success = crud_menu.set_user_button_permissions(
+    changes = crud_menu.set_user_button_permissions(
         db, user_id=user_id, button_permissions=permissions.button_permissions
     )
-    if not success:
-        raise HTTPException(status_code=400, detail="Failed to set button permissions")
-    return {"message": "Button permissions updated successfully"}
+    return {
+        "message": "Button permissions updated successfully",
+        "changes": changes._asdict(),
+    }
 
 
 @router.get("/users/me/buttons/{button_id}/check")
 def check_current_user_button_permission(
     button_id: str,
     db: Session = Depends(deps.get_db),
-    current_user: User = Depends(deps.get_current_active_user),
+    current_user: Principal = Depends(deps.get_current_active_user),
+    claims: Optional[PermissionClaims] = Depends(deps.get_permission_claims),
 ) -> Any:
     """
     检查当前用户是否有特定按钮权限
     """
     has_permission = crud_menu.check_user_button_permission(
-        db, user_id=current_user.id, button_id=button_id
+        db,
+        user_id=current_user.id,
+        button_id=button_id,
+        is_superuser=current_user.is_superuser,
+        button_bitmap=claims.button_bitmap if claims else None,
     )
     return {"has_permission": has_permission}
+
+
+@router.post("/users/me/buttons/check", response_model=Dict[str, bool])
+def check_current_user_button_permissions(
+    check: ButtonPermissionCheck,
+    db: Session = Depends(deps.get_db),
+    current_user: Principal = Depends(deps.get_current_active_user),
+    claims: Optional[PermissionClaims] = Depends(deps.get_permission_claims),
+) -> Any:
+    """
+    批量检查当前用户的按钮权限，返回 button_id -> 是否有权限
+    """
+    return crud_menu.check_user_button_permissions(
+        db,
+        user_id=current_user.id,
+        button_ids=check.button_ids,
+        is_superuser=current_user.is_superuser,
+        button_bitmap=claims.button_bitmap if claims else None,
+    )
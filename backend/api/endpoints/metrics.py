@@ -0,0 +1,29 @@
+from typing import Any
+
+from fastapi import APIRouter, Depends
+
+from api import deps
+from core import cache, security
+from db.redis import redis_pool_stats
+from db.replicas import replica_router
+from db.session import db_pool_stats
+from crud.crud_user import Principal
+
+router = APIRouter()
+
+
+@router.get("/")
+def read_metrics(
+    current_user: Principal = Depends(deps.get_current_active_superuser),
+) -> Any:
+    """
+    Retrieve in-process cache and pool metrics.
+    """
+    return {
+        "token_cache": security.token_cache.stats(),
+        "login_latency": security.login_latency.percentiles(),
+        "redis": redis_pool_stats(),
+        "database": db_pool_stats(),
+        "cache": cache.stats(),
+        "replicas": replica_router.report(),
+    }
@@ -0,0 +1,171 @@
+from typing import List, Any
+from fastapi import APIRouter, Depends, HTTPException
+from sqlalchemy.orm import Session
+
+from api import deps
+from crud import crud_role, crud_user
+from crud.crud_user import Principal
+from schemas.role import (
+    Role,
+    RoleCreate,
+    RoleUpdate,
+    RolePermissions,
+    SetUserRoles,
+)
+
+router = APIRouter(route_class=deps.SessionReleasingRoute)
+
+
+# 角色管理端点
+@router.get("/", response_model=List[Role])
+def read_roles(
+    db: Session = Depends(deps.get_db),
+    skip: int = 0,
+    limit: int = 100,
+    current_user: Principal = Depends(deps.get_current_active_superuser),
+) -> Any:
+    """
+    获取所有角色（仅超级用户）
+    """
+    return crud_role.get_roles(db, skip=skip, limit=limit)
+
+
+@router.post("/", response_model=Role)
+def create_role(
+    *,
+    db: Session = Depends(deps.get_db),
+    role_in: RoleCreate,
+    current_user: Principal = Depends(deps.get_current_active_superuser),
+) -> Any:
+    """
+    创建角色（仅超级用户）
+    """
+    if crud_role.get_role_by_name(db, name=role_in.name):
+        raise HTTPException(status_code=400, detail="Role name already exists")
+    return crud_role.create_role(db, role=role_in)
+
+
+@router.get("/{role_id}", response_model=Role)
+def read_role(
+    role_id: int,
+    db: Session = Depends(deps.get_db),
+    current_user: Principal = Depends(deps.get_current_active_superuser),
+) -> Any:
+    """
+    获取单个角色详情（仅超级用户）
+    """
+    role = crud_role.get_role(db, role_id=role_id)
+    if not role:
+        raise HTTPException(status_code=404, detail="Role not found")
+    return role
+
+
+@router.put("/{role_id}", response_model=Role)
+def update_role(
+    *,
+    db: Session = Depends(deps.get_db),
+    role_id: int,
+    role_in: RoleUpdate,
+    current_user: Principal = Depends(deps.get_current_active_superuser),
+) -> Any:
+    """
+    更新角色（仅超级用户）
+    """
+    role = crud_role.update_role(db, role_id=role_id, role_update=role_in)
+    if not role:
+        raise HTTPException(status_code=404, detail="Role not found")
+    return role
+
+
+@router.delete("/{role_id}")
+def delete_role(
+    role_id: int,
+    db: Session = Depends(deps.get_db),
+    current_user: Principal = Depends(deps.get_current_active_superuser),
+) -> Any:
+    """
+    删除角色（仅超级用户），角色成员的最终权限随之重算
+    """
+    if not crud_role.delete_role(db, role_id=role_id):
+        raise HTTPException(status_code=404, detail="Role not found")
+    return {"message": "Role deleted successfully"}
+
+
+# 角色授权端点
+@router.get("/{role_id}/permissions", response_model=RolePermissions)
+def read_role_permissions(
+    role_id: int,
+    db: Session = Depends(deps.get_db),
+    current_user: Principal = Depends(deps.get_current_active_superuser),
+) -> Any:
+    """
+    获取角色的菜单与按钮授权（仅超级用户）
+    """
+    if not crud_role.get_role(db, role_id=role_id):
+        raise HTTPException(status_code=404, detail="Role not found")
+    return crud_role.get_role_permissions(db, role_id=role_id)
+
+
+@router.put("/{role_id}/permissions")
+def set_role_permissions(
+    role_id: int,
+    permissions: RolePermissions,
+    db: Session = Depends(deps.get_db),
+    current_user: Principal = Depends(deps.get_current_active_superuser),
+) -> Any:
+    """
+    设置角色的菜单与按钮授权（仅超级用户）
+    """
+    if not crud_role.get_role(db, role_id=role_id):
+        raise HTTPException(status_code=404, detail="Role not found")
+    try:
+        changes = crud_role.set_role_permissions(
+            db, role_id=role_id, permissions=permissions
+        )
+    except ValueError as exc:
+        raise HTTPException(status_code=400, detail=str(exc))
+    return {
+        "message": "Role permissions updated successfully",
+        "changes": {
+            "menus": changes.menus._asdict(),
+            "buttons": changes.buttons._asdict(),
+        },
+        "affected_users": len(changes.affected_user_ids),
+    }
+
+
+# 用户角色端点
+@router.get("/users/{user_id}", response_model=List[Role])
+def read_user_roles(
+    user_id: int,
+    db: Session = Depends(deps.get_db),
+    current_user: Principal = Depends(deps.get_current_active_superuser),
+) -> Any:
+    """
+    获取用户的角色（仅超级用户）
+    """
+    return crud_role.get_user_roles(db, user_id=user_id)
+
+
+@router.post("/users/{user_id}")
+def set_user_roles(
+    user_id: int,
+    roles: SetUserRoles,
+    db: Session = Depends(deps.get_db),
+    current_user: Principal = Depends(deps.get_current_active_superuser),
+) -> Any:
+    """
+    设置用户的角色（仅超级用户）
+    """
+    if not crud_user.user.get(db, id=user_id):
+        raise HTTPException(status_code=404, detail="User not found")
+    try:
+        changes = crud_role.set_user_roles(
+            db, user_id=user_id, role_ids=roles.role_ids
+        )
+    except ValueError as exc:
+        raise HTTPException(status_code=400, detail=str(exc))
+    return {
+        "message": "User roles updated successfully",
+        "changes": changes._asdict(),
+    }
@@ -1,18 +1,21 @@
 from typing import Any, List
 
-from fastapi import APIRouter, Depends, HTTPException
+from fastapi import APIRouter, Depends, HTTPException, status
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import Session
+from starlette.concurrency import run_in_threadpool
 
 from api import deps
-from crud import crud_user
-from models.user import User as UserModel
+from core import security
+from crud import crud_user, crud_user_async
+from crud.crud_user import Principal
 from schemas.user import UserCreate, UserUpdate, User as UserSchema
 
-router = APIRouter()
+router = APIRouter(route_class=deps.SessionReleasingRoute)
 
 
 @router.post("/", response_model=UserSchema)
-def create_user(
+async def create_user(
     *,
     db: Session = Depends(deps.get_db),
     user_in: UserCreate,
@@ -20,22 +23,29 @@ def create_user(
     """
     Create new user.
     """
-    user = crud_user.user.get_by_email(db, email=user_in.email)
+    user = await run_in_threadpool(crud_user.user.get_by_email, db, email=user_in.email)
     if user:
         raise HTTPException(
             status_code=400,
             detail="The user with this username already exists in the system.",
         )
-    user = crud_user.user.create(db, obj_in=user_in)
+    try:
+        user = await crud_user.user.create_async(db, obj_in=user_in)
+    except security.PasswordHasherBusy:
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail="Too many registrations, please retry shortly",
+            headers={"Retry-After": "1"},
+        )
     return user
 
 
 @router.get("/", response_model=List[UserSchema])
 def read_users(
-    db: Session = Depends(deps.get_db),
+    db: Session = Depends(deps.get_read_db),
     skip: int = 0,
     limit: int = 100,
-    current_user: UserModel = Depends(deps.get_current_active_superuser),
+    current_user: Principal = Depends(deps.get_current_active_superuser),
 ) -> Any:
     """
     Retrieve users.
@@ -45,21 +55,24 @@ def read_users(
 
 
 @router.get("/me", response_model=UserSchema)
-def read_user_me(
-    db: Session = Depends(deps.get_db),
-    current_user: UserModel = Depends(deps.get_current_user),
+async def read_user_me(
+    db: AsyncSession = Depends(deps.get_async_db),
+    current_user: Principal = Depends(deps.get_current_user),
 ) -> Any:
     """
     Get current user.
     """
-    return current_user
+    user = await crud_user_async.get_user(db, user_id=current_user.id)
+    if not user:
+        raise HTTPException(status_code=404, detail="User not found")
+    return user
 
 
 @router.get("/{user_id}", response_model=UserSchema)
 def read_user_by_id(
     user_id: int,
     db: Session = Depends(deps.get_db),
-    current_user: UserModel = Depends(deps.get_current_user),
+    current_user: Principal = Depends(deps.get_current_user),
 ) -> Any:
     """
     Get a specific user by id.
@@ -67,7 +80,7 @@ def read_user_by_id(
     user = crud_user.user.get(db, id=user_id)
     if not user:
         raise HTTPException(status_code=404, detail="User not found")
-    if user == current_user or crud_user.user.is_superuser(current_user):
+    if user.id == current_user.id or crud_user.user.is_superuser(current_user):
         return user
     raise HTTPException(
         status_code=403, detail="The user doesn't have enough privileges"
@@ -0,0 +1,39 @@
+"""Dense permission bitmaps.
+
+Bit ``i`` lives in byte ``i // 8`` under mask ``0x80 >> (i % 8)``, i.e. most
+significant bit first. That is the layout Redis uses for SETBIT/GETBIT, so a
+bitmap built here can be stored as a Redis string and probed with GETBIT, and
+on Postgres bytea it can be tested with ``get_byte(bits, i / 8) & (128 >> i % 8)``.
+Trailing zero bytes are dropped so equal sets always encode to equal bytes.
+"""
+
+from typing import Iterable, List
+
+
+def from_indexes(indexes: Iterable[int]) -> bytes:
+    """Encode a set of bit indexes."""
+    indexes = list(indexes)
+    if not indexes:
+        return b""
+    bits = bytearray(max(indexes) // 8 + 1)
+    for index in indexes:
+        if index < 0:
+            raise ValueError(f"negative bit index {index}")
+        bits[index >> 3] |= 0x80 >> (index & 7)
+    return bytes(bits)
+
+
+def has_bit(bitmap: bytes, index: int) -> bool:
+    byte = index >> 3
+    return byte < len(bitmap) and bool(bitmap[byte] & (0x80 >> (index & 7)))
+
+
+def to_indexes(bitmap: bytes) -> List[int]:
+    """Decode a bitmap into its sorted set bit indexes."""
+    return [
+        (byte_index << 3) + bit
+        for byte_index, byte in enumerate(bitmap)
+        if byte
+        for bit in range(8)
+        if byte & (0x80 >> bit)
+    ]
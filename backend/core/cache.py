@@ -0,0 +1,576 @@
+"""Cache-aside layer for read functions in ``crud/``.
+
+``@cached`` stores a function's result in Redis under ``cache:{namespace}:{key}``.
+Entries carry a soft expiry (``ttl``) and stay in Redis for ``stale_ttl`` more
+seconds. When an entry goes soft-expired, one caller takes a short Redis lock
+and recomputes it while the others keep serving the stale value. On a cold key
+the others wait for the lock holder's result instead of all querying Postgres
+at once. ``None`` results can be cached for ``negative_ttl`` seconds.
+
+Functions declared with ``near=True`` also keep entries in a bounded
+per-process LRU. Invalidations are published on ``CACHE_INVALIDATION_CHANNEL``
+and every worker's listener thread (started in the app lifespan) drops the
+matching near entries. The near tier is only consulted while that listener is
+subscribed; after a reconnect it starts empty, since messages may have been
+missed. Other per-process tiers (e.g. the principal cache) follow the same
+messages through ``on_invalidation``.
+
+Write paths call ``invalidate`` / ``invalidate_namespace`` after committing.
+Both also bump a generation counter (per key and per namespace); a recompute
+reads the counters before calling the wrapped function and only stores its
+result if they are unchanged, so a value read just before a write committed
+is not written back after the invalidation.
+Any Redis failure degrades to calling the wrapped function directly.
+"""
+
+import datetime
+import functools
+import json
+import logging
+import threading
+import time
+import uuid
+from collections import Counter, OrderedDict
+from typing import Any, Callable, Dict, Optional, Sequence
+
+import redis
+from sqlalchemy import DateTime, inspect as sa_inspect
+from sqlalchemy.orm import Session, make_transient_to_detached
+
+from core.config import settings
+from db.redis import get_redis
+from db.session import LazySession
+
+logger = logging.getLogger(__name__)
+
+CACHE_KEY = "cache:{namespace}:{key}"
+CACHE_INDEX_KEY = "cache:{namespace}:keys"
+CACHE_LOCK_KEY = "cache:{namespace}:lock:{key}"
+CACHE_GEN_KEY = "cache:gen:{namespace}"
+CACHE_KEY_GEN_KEY = "cache:gen:{namespace}:{key}"
+CACHE_INVALIDATION_CHANNEL = "cache:invalidate"
+# Per-key generations only need to outlive computations in flight
+CACHE_KEY_GEN_TTL_SECONDS = 3600
+
+_RELEASE_LOCK = """
+if redis.call('GET', KEYS[1]) == ARGV[1] then
+    return redis.call('DEL', KEYS[1])
+end
+return 0
+"""
+
+# KEYS: two generation counters, the entry, the index set it joins.
+# ARGV: the counters read before computing, payload, expiry, index member.
+STORE_IF_CURRENT = """
+if (redis.call('GET', KEYS[1]) or '0') ~= ARGV[1] then return 0 end
+if (redis.call('GET', KEYS[2]) or '0') ~= ARGV[2] then return 0 end
+redis.call('SET', KEYS[3], ARGV[3], 'EX', ARGV[4])
+redis.call('SADD', KEYS[4], ARGV[5])
+return 1
+"""
+
+_stats: Dict[str, Counter] = {}
+_stats_lock = threading.Lock()
+
+
+def _count(namespace: str, event: str) -> None:
+    with _stats_lock:
+        _stats.setdefault(namespace, Counter())[event] += 1
+
+
+def stats() -> Dict[str, Dict[str, int]]:
+    """Per-namespace counters.
+
+    Events: near_hit, hit, stale, miss, negative_hit, wait, error.
+    """
+    with _stats_lock:
+        return {namespace: dict(counter) for namespace, counter in _stats.items()}
+
+
+class NearCache:
+    """Bounded in-process LRU of cache envelopes.
+
+    Each namespace has an epoch that is bumped on invalidation; ``put`` is
+    ignored when the epoch moved since the caller started its Redis read, so
+    a value fetched just before an invalidation cannot be re-cached locally.
+    """
+
+    def __init__(self, max_entries: int, ttl: float) -> None:
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.active = False
+        self._entries: "OrderedDict[tuple, tuple]" = OrderedDict()
+        self._epochs: Counter = Counter()
+        self._lock = threading.Lock()
+
+    def epoch(self, namespace: str) -> int:
+        return self._epochs[namespace]
+
+    def get(self, namespace: str, key: str) -> Optional[Dict[str, Any]]:
+        if not self.active:
+            return None
+        now = time.time()
+        with self._lock:
+            item = self._entries.get((namespace, key))
+            if item is None:
+                return None
+            expires_at, envelope = item
+            if expires_at <= now:
+                del self._entries[(namespace, key)]
+                return None
+            self._entries.move_to_end((namespace, key))
+            return envelope
+
+    def put(
+        self, namespace: str, key: str, envelope: Dict[str, Any], epoch: int
+    ) -> None:
+        if not self.active:
+            return
+        expires_at = min(envelope["e"], time.time() + self.ttl)
+        with self._lock:
+            if self._epochs[namespace] != epoch:
+                return
+            self._entries[(namespace, key)] = (expires_at, envelope)
+            self._entries.move_to_end((namespace, key))
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def discard(self, namespace: str, keys: Optional[Sequence[str]] = None) -> None:
+        """Drop some keys of a namespace, or the whole namespace if keys is None."""
+        with self._lock:
+            self._epochs[namespace] += 1
+            if keys is None:
+                for entry in [e for e in self._entries if e[0] == namespace]:
+                    del self._entries[entry]
+            else:
+                for key in keys:
+                    self._entries.pop((namespace, key), None)
+
+    def clear(self) -> None:
+        with self._lock:
+            for namespace in list(self._epochs):
+                self._epochs[namespace] += 1
+            self._entries.clear()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+
+near_cache = NearCache(
+    max_entries=settings.NEAR_CACHE_MAX_ENTRIES,
+    ttl=settings.NEAR_CACHE_TTL_SECONDS,
+)
+
+
+class Codec:
+    """Converts cached values to JSON-compatible data and back.
+
+    ``load`` receives the session found in the wrapped call's arguments so
+    ORM codecs can attach the rebuilt instances to it.
+    """
+
+    def dump(self, value: Any) -> Any:
+        return value
+
+    def load(self, data: Any, db: Optional[Session]) -> Any:
+        return data
+
+
+class OrmCodec(Codec):
+    """Caches mapped instances as column dicts.
+
+    Loaded instances are merged into the caller's session with ``load=False``,
+    so they behave like freshly queried rows (relationships lazy-load) without
+    a round trip. Columns in ``exclude`` (credentials and other secrets) are
+    never written to Redis; on the rebuilt instance they are unloaded and are
+    read from the database on first access.
+    """
+
+    def __init__(
+        self, model: type, many: bool = False, exclude: Sequence[str] = ()
+    ) -> None:
+        self.model = model
+        self.many = many
+        self._columns = [
+            column.key
+            for column in sa_inspect(model).column_attrs
+            if column.key not in exclude
+        ]
+        self._datetimes = {
+            attr.key
+            for attr in sa_inspect(model).column_attrs
+            if isinstance(attr.columns[0].type, DateTime)
+        }
+
+    def _dump_one(self, obj: Any) -> Dict[str, Any]:
+        row = {}
+        for key in self._columns:
+            value = getattr(obj, key)
+            if key in self._datetimes and value is not None:
+                value = value.isoformat()
+            row[key] = value
+        return row
+
+    def _load_one(self, row: Dict[str, Any], db: Session) -> Any:
+        row = dict(row)
+        for key in self._datetimes:
+            if row.get(key) is not None:
+                row[key] = datetime.datetime.fromisoformat(row[key])
+        obj = self.model(**row)
+        make_transient_to_detached(obj)
+        return db.merge(obj, load=False)
+
+    def dump(self, value: Any) -> Any:
+        if self.many:
+            return [self._dump_one(obj) for obj in value]
+        return self._dump_one(value)
+
+    def load(self, data: Any, db: Optional[Session]) -> Any:
+        if self.many:
+            return [self._load_one(row, db) for row in data]
+        return self._load_one(data, db)
+
+
+def default_key(*args: Any, **kwargs: Any) -> str:
+    """Build a key from the call arguments, skipping sessions."""
+    parts = [repr(arg) for arg in args if not isinstance(arg, (Session, LazySession))]
+    parts += [f"{name}={value!r}" for name, value in sorted(kwargs.items())]
+    return ",".join(parts) or "-"
+
+
+def _find_session(args: Sequence[Any], kwargs: Dict[str, Any]) -> Optional[Session]:
+    for value in list(args) + list(kwargs.values()):
+        if isinstance(value, (Session, LazySession)):
+            return value
+    return None
+
+
+def _publish_invalidation(
+    pipe: redis.client.Pipeline, namespace: str, keys: Optional[Sequence[str]]
+) -> None:
+    message = {"ns": namespace, "keys": None if keys is None else list(keys)}
+    pipe.publish(CACHE_INVALIDATION_CHANNEL, json.dumps(message))
+
+
+def invalidate(namespace: str, *keys: str) -> None:
+    """Drop specific keys of a namespace in Redis and in every near cache."""
+    if not keys:
+        return
+    near_cache.discard(namespace, keys)
+    try:
+        pipe = get_redis().pipeline()
+        for key in keys:
+            gen_key = CACHE_KEY_GEN_KEY.format(namespace=namespace, key=key)
+            pipe.incr(gen_key)
+            pipe.expire(gen_key, CACHE_KEY_GEN_TTL_SECONDS)
+        pipe.delete(*[CACHE_KEY.format(namespace=namespace, key=key) for key in keys])
+        pipe.srem(CACHE_INDEX_KEY.format(namespace=namespace), *keys)
+        _publish_invalidation(pipe, namespace, keys)
+        pipe.execute()
+    except redis.RedisError:
+        logger.error("failed to invalidate %s:%s", namespace, keys, exc_info=True)
+
+
+def invalidate_namespace(namespace: str) -> None:
+    """Drop every key cached under a namespace."""
+    near_cache.discard(namespace)
+    client = get_redis()
+    try:
+        index = client.smembers(CACHE_INDEX_KEY.format(namespace=namespace))
+        keys = [key.decode() for key in index]
+        pipe = client.pipeline()
+        pipe.incr(CACHE_GEN_KEY.format(namespace=namespace))
+        if keys:
+            pipe.delete(
+                *[CACHE_KEY.format(namespace=namespace, key=key) for key in keys]
+            )
+            pipe.srem(CACHE_INDEX_KEY.format(namespace=namespace), *keys)
+        _publish_invalidation(pipe, namespace, None)
+        pipe.execute()
+    except redis.RedisError:
+        logger.error("failed to invalidate %s", namespace, exc_info=True)
+
+
+_invalidation_hooks: Dict[str, list] = {}
+
+
+def on_invalidation(
+    namespace: str, hook: Callable[[Optional[Sequence[str]]], None]
+) -> None:
+    """Also apply invalidations of ``namespace`` to another per-process cache.
+
+    ``hook(keys)`` runs for every invalidation published by any worker, with
+    ``keys`` None for the whole namespace or when messages may have been missed.
+    """
+    _invalidation_hooks.setdefault(namespace, []).append(hook)
+
+
+def _run_invalidation_hooks(namespace: str, keys: Optional[Sequence[str]]) -> None:
+    for hook in _invalidation_hooks.get(namespace, ()):
+        hook(keys)
+
+
+def _clear_local_tiers() -> None:
+    near_cache.clear()
+    for namespace in list(_invalidation_hooks):
+        _run_invalidation_hooks(namespace, None)
+
+
+def handle_invalidation_message(data: bytes | str) -> None:
+    """Apply an invalidation published by any worker to the local tiers."""
+    try:
+        message = json.loads(data)
+        namespace, keys = message["ns"], message["keys"]
+        near_cache.discard(namespace, keys)
+    except (ValueError, KeyError, TypeError):
+        logger.warning("ignoring malformed cache invalidation %r", data)
+        _clear_local_tiers()
+        return
+    _run_invalidation_hooks(namespace, keys)
+
+
+class InvalidationListener:
+    """Background thread subscribed to ``CACHE_INVALIDATION_CHANNEL``.
+
+    Enables the near cache while subscribed. On any Redis error the near cache
+    is disabled and emptied, and the thread resubscribes with backoff.
+    """
+
+    def __init__(self) -> None:
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def start(self) -> None:
+        if self._thread is not None:
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(
+            target=self._run, name="cache-invalidation", daemon=True
+        )
+        self._thread.start()
+
+    def stop(self) -> None:
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout=5)
+            self._thread = None
+        near_cache.active = False
+        near_cache.clear()
+
+    def _run(self) -> None:
+        backoff = 0.5
+        while not self._stop.is_set():
+            pubsub = None
+            try:
+                pubsub = get_redis().pubsub(ignore_subscribe_messages=True)
+                pubsub.subscribe(CACHE_INVALIDATION_CHANNEL)
+                # Anything published before this point may have been missed
+                _clear_local_tiers()
+                near_cache.active = True
+                backoff = 0.5
+                while not self._stop.is_set():
+                    message = pubsub.get_message(timeout=1.0)
+                    if message is not None and message["type"] == "message":
+                        handle_invalidation_message(message["data"])
+            except redis.RedisError as exc:
+                logger.warning("cache invalidation listener disconnected: %s", exc)
+            finally:
+                near_cache.active = False
+                _clear_local_tiers()
+                if pubsub is not None:
+                    try:
+                        pubsub.close()
+                    except redis.RedisError:
+                        pass
+            self._stop.wait(backoff)
+            backoff = min(backoff * 2, 30.0)
+
+
+invalidation_listener = InvalidationListener()
+
+
+class _CachedFunction:
+    def __init__(
+        self,
+        func: Callable,
+        namespace: str,
+        ttl: int,
+        key: Callable[..., str],
+        negative_ttl: int,
+        stale_ttl: int,
+        lock_timeout: float,
+        codec: Codec,
+        near: bool,
+    ) -> None:
+        self.func = func
+        self.namespace = namespace
+        self.ttl = ttl
+        self.key = key
+        self.negative_ttl = negative_ttl
+        self.stale_ttl = stale_ttl
+        self.lock_timeout = lock_timeout
+        self.codec = codec
+        self.near = near
+        functools.update_wrapper(self, func)
+
+    def __get__(self, instance: Any, owner: type) -> Any:
+        # Support decorating methods: bind like a plain function would
+        if instance is None:
+            return self
+        return functools.partial(self.__call__, instance)
+
+    def _redis_key(self, key: str) -> str:
+        return CACHE_KEY.format(namespace=self.namespace, key=key)
+
+    def _generations(self, client: redis.Redis, key: str) -> tuple:
+        generations = client.mget(
+            CACHE_GEN_KEY.format(namespace=self.namespace),
+            CACHE_KEY_GEN_KEY.format(namespace=self.namespace, key=key),
+        )
+        return tuple(gen or b"0" for gen in generations)
+
+    def _store(
+        self, client: redis.Redis, key: str, value: Any, generations: tuple
+    ) -> Optional[dict]:
+        """Store ``value`` unless the key was invalidated since ``generations``."""
+        if value is None:
+            if self.negative_ttl <= 0:
+                return None
+            envelope = {"e": time.time() + self.negative_ttl, "n": True}
+            expire = self.negative_ttl
+        else:
+            envelope = {"e": time.time() + self.ttl, "v": self.codec.dump(value)}
+            expire = self.ttl + self.stale_ttl
+        stored = client.eval(
+            STORE_IF_CURRENT,
+            4,
+            CACHE_GEN_KEY.format(namespace=self.namespace),
+            CACHE_KEY_GEN_KEY.format(namespace=self.namespace, key=key),
+            self._redis_key(key),
+            CACHE_INDEX_KEY.format(namespace=self.namespace),
+            *generations,
+            json.dumps(envelope),
+            expire,
+            key,
+        )
+        return envelope if stored else None
+
+    def _remember(self, key: str, envelope: Optional[dict], epoch: int) -> None:
+        if self.near and envelope is not None:
+            near_cache.put(self.namespace, key, envelope, epoch)
+
+    def _decode(self, envelope: Dict[str, Any], db: Optional[Session]) -> Any:
+        if envelope.get("n"):
+            _count(self.namespace, "negative_hit")
+            return None
+        return self.codec.load(envelope["v"], db)
+
+    def _read(self, client: redis.Redis, key: str) -> Optional[Dict[str, Any]]:
+        raw = client.get(self._redis_key(key))
+        return json.loads(raw) if raw is not None else None
+
+    def _compute(self, client, key, token, epoch, args, kwargs) -> Any:
+        lock_key = CACHE_LOCK_KEY.format(namespace=self.namespace, key=key)
+        try:
+            generations = self._generations(client, key)
+            value = self.func(*args, **kwargs)
+            self._remember(key, self._store(client, key, value, generations), epoch)
+            return value
+        finally:
+            client.eval(_RELEASE_LOCK, 1, lock_key, token)
+
+    def _try_lock(self, client: redis.Redis, key: str) -> Optional[str]:
+        token = uuid.uuid4().hex
+        lock_key = CACHE_LOCK_KEY.format(namespace=self.namespace, key=key)
+        px = int(self.lock_timeout * 1000)
+        return token if client.set(lock_key, token, nx=True, px=px) else None
+
+    def __call__(self, *args: Any, **kwargs: Any) -> Any:
+        key = self.key(*args, **kwargs)
+        db = _find_session(args, kwargs)
+        if self.near:
+            envelope = near_cache.get(self.namespace, key)
+            if envelope is not None:
+                _count(self.namespace, "near_hit")
+                return self._decode(envelope, db)
+        epoch = near_cache.epoch(self.namespace)
+        client = get_redis()
+        try:
+            envelope = self._read(client, key)
+            if envelope is not None:
+                if envelope["e"] > time.time():
+                    _count(self.namespace, "hit")
+                    self._remember(key, envelope, epoch)
+                    return self._decode(envelope, db)
+                # Soft-expired: one caller refreshes, the rest serve stale data
+                token = self._try_lock(client, key)
+                if token is None:
+                    _count(self.namespace, "stale")
+                    return self._decode(envelope, db)
+                _count(self.namespace, "miss")
+                return self._compute(client, key, token, epoch, args, kwargs)
+
+            _count(self.namespace, "miss")
+            deadline = time.monotonic() + self.lock_timeout
+            while True:
+                token = self._try_lock(client, key)
+                if token is not None:
+                    return self._compute(client, key, token, epoch, args, kwargs)
+                # Another worker is computing this key: wait for its result
+                _count(self.namespace, "wait")
+                time.sleep(0.02)
+                envelope = self._read(client, key)
+                if envelope is not None:
+                    self._remember(key, envelope, epoch)
+                    return self._decode(envelope, db)
+                if time.monotonic() > deadline:
+                    break
+        except redis.RedisError:
+            _count(self.namespace, "error")
+            logger.warning("cache %s unavailable", self.namespace, exc_info=True)
+        return self.func(*args, **kwargs)
+
+    def invalidate(self, *args: Any, **kwargs: Any) -> None:
+        """Drop the entry a call with these arguments would use."""
+        invalidate(self.namespace, self.key(*args, **kwargs))
+
+    def invalidate_all(self) -> None:
+        invalidate_namespace(self.namespace)
+
+
+def cached(
+    namespace: str,
+    ttl: int,
+    key: Callable[..., str] = default_key,
+    negative_ttl: int = 0,
+    stale_ttl: Optional[int] = None,
+    lock_timeout: Optional[float] = None,
+    codec: Optional[Codec] = None,
+    near: bool = False,
+) -> Callable[[Callable], _CachedFunction]:
+    """Cache a sync read function in Redis (see module docstring).
+
+    ``near=True`` suits small, rarely written data such as the menu catalog.
+    """
+
+    def decorator(func: Callable) -> _CachedFunction:
+        return _CachedFunction(
+            func,
+            namespace=namespace,
+            ttl=ttl,
+            key=key,
+            negative_ttl=negative_ttl,
+            stale_ttl=(
+                settings.CACHE_STALE_TTL_SECONDS if stale_ttl is None else stale_ttl
+            ),
+            lock_timeout=(
+                settings.CACHE_LOCK_TIMEOUT_SECONDS
+                if lock_timeout is None
+                else lock_timeout
+            ),
+            codec=codec or Codec(),
+            near=near,
+        )
+
+    return decorator
+
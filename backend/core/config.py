@@ -1,3 +1,5 @@
+from typing import List, Literal
+
 from pydantic_settings import BaseSettings
 from dotenv import load_dotenv
 
@@ -8,11 +10,49 @@ class Settings(BaseSettings):
     DATABASE_URL: str
     REDIS_HOST: str
     REDIS_PORT: int
+    REDIS_MAX_CONNECTIONS: int = 50
+    REDIS_POOL_TIMEOUT: float = 1.0
+    REDIS_SOCKET_CONNECT_TIMEOUT: float = 1.0
+    REDIS_SOCKET_TIMEOUT: float = 1.0
+    REDIS_HEALTH_CHECK_INTERVAL: int = 30
     SECRET_KEY: str
     ALGORITHM: str
     ACCESS_TOKEN_EXPIRE_MINUTES: int
     FIRST_SUPERUSER: str
     FIRST_SUPERUSER_PASSWORD: str
+    MENU_CACHE_TTL_SECONDS: int = 300
+    TOKEN_CACHE_MAX_ENTRIES: int = 10000
+    PRINCIPAL_CACHE_TTL_SECONDS: int = 60
+    PRINCIPAL_LOCAL_TTL_SECONDS: int = 5
+    PASSWORD_HASH_WORKERS: int = 4
+    PASSWORD_HASH_MAX_PENDING: int = 64
+    CACHE_STALE_TTL_SECONDS: int = 30
+    CACHE_LOCK_TIMEOUT_SECONDS: float = 5.0
+    USER_CACHE_TTL_SECONDS: int = 60
+    USER_NEGATIVE_CACHE_TTL_SECONDS: int = 10
+    NEAR_CACHE_MAX_ENTRIES: int = 1024
+    NEAR_CACHE_TTL_SECONDS: int = 60
+    USER_BUTTONS_CACHE_TTL_SECONDS: int = 3600
+    # Embed a permission digest (superuser flag, version, bitmaps) in access tokens
+    TOKEN_PERMISSION_CLAIMS: bool = False
+    PERMISSION_VERSION_TTL_SECONDS: int = 86400
+    # Warn when one statement shape repeats this often within a request
+    QUERY_REPEAT_WARN_THRESHOLD: int = 5
+    # Connection pool of each database engine, per worker process
+    DATABASE_POOL_SIZE: int = 5
+    DATABASE_MAX_OVERFLOW: int = 10
+    DATABASE_POOL_TIMEOUT: float = 30.0
+    # Replace connections older than this many seconds (-1 disables)
+    DATABASE_POOL_RECYCLE: int = 1800
+    # Checkout ping: "always", "idle" (after DATABASE_POOL_PING_IDLE_SECONDS in the pool) or "never"
+    DATABASE_POOL_PRE_PING: Literal["always", "idle", "never"] = "idle"
+    DATABASE_POOL_PING_IDLE_SECONDS: float = 30.0
+    # Streaming replicas of DATABASE_URL for read-only endpoints (JSON list)
+    DATABASE_REPLICA_URLS: List[str] = []
+    REPLICA_MAX_LAG_SECONDS: float = 5.0
+    REPLICA_LAG_CHECK_INTERVAL_SECONDS: float = 1.0
+    # Reads go to the primary for this long after a write to the reader's data
+    READ_YOUR_WRITES_SECONDS: int = 10
 
     class Config:
         env_file = ".env"
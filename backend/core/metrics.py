@@ -0,0 +1,54 @@
+import bisect
+import threading
+from collections import deque
+from typing import Dict, Sequence
+
+
+class LatencyRecorder:
+    """Keeps the most recent latency samples and reports percentiles over them."""
+
+    def __init__(self, max_samples: int = 2048) -> None:
+        self.count = 0
+        self._samples: "deque[float]" = deque(maxlen=max_samples)
+        self._lock = threading.Lock()
+
+    def observe(self, seconds: float) -> None:
+        with self._lock:
+            self.count += 1
+            self._samples.append(seconds)
+
+    def percentiles(self) -> Dict[str, float]:
+        with self._lock:
+            samples = sorted(self._samples)
+            count = self.count
+        if not samples:
+            return {
+                "count": count,
+                "p50_ms": 0.0,
+                "p95_ms": 0.0,
+                "p99_ms": 0.0,
+                "max_ms": 0.0,
+            }
+
+        def at(fraction: float) -> float:
+            index = min(len(samples) - 1, int(fraction * len(samples)))
+            return round(samples[index] * 1000, 3)
+
+        return {
+            "count": count,
+            "p50_ms": at(0.50),
+            "p95_ms": at(0.95),
+            "p99_ms": at(0.99),
+            "max_ms": round(samples[-1] * 1000, 3),
+        }
+
+    def histogram(self, bounds_ms: Sequence[float]) -> Dict[str, int]:
+        """Cumulative counts of the recent samples at or below each bound."""
+        with self._lock:
+            samples = sorted(self._samples)
+        buckets = {
+            f"le_{bound:g}ms": bisect.bisect_right(samples, bound / 1000)
+            for bound in bounds_ms
+        }
+        buckets["le_inf"] = len(samples)
+        return buckets
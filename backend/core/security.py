@@ -1,15 +1,27 @@
+import asyncio
+import base64
+import hashlib
+import threading
+import time
+import zlib
+from collections import OrderedDict
+from concurrent.futures import Future, ThreadPoolExecutor
 from datetime import datetime, timedelta
-from typing import Any, Union
+from typing import Any, Dict, NamedTuple, Optional, Union
 from jose import jwt
 from passlib.context import CryptContext
 from core.config import settings
+from core.metrics import LatencyRecorder
+from schemas.token import TokenPayload
 
 pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
 
 ALGORITHM = settings.ALGORITHM
 
 def create_access_token(
-    subject: Union[str, Any], expires_delta: timedelta = None
+    subject: Union[str, Any],
+    expires_delta: timedelta = None,
+    claims: Optional[Dict[str, Any]] = None,
 ) -> str:
     if expires_delta:
         expire = datetime.utcnow() + expires_delta
@@ -17,12 +29,183 @@ def create_access_token(
         expire = datetime.utcnow() + timedelta(
             minutes=settings.ACCESS_TOKEN_EXPIRE_MINUTES
         )
-    to_encode = {"exp": expire, "sub": str(subject)}
+    to_encode = {**(claims or {}), "exp": expire, "sub": str(subject)}
     encoded_jwt = jwt.encode(to_encode, settings.SECRET_KEY, algorithm=ALGORITHM)
     return encoded_jwt
 
+def encode_bitmap_claim(bits: bytes) -> str:
+    """Raw-deflate a bitmap and base64url it without padding."""
+    compressed = zlib.compress(bits, 9, wbits=-15)
+    return base64.urlsafe_b64encode(compressed).rstrip(b"=").decode()
+
+
+def decode_bitmap_claim(claim: str) -> bytes:
+    return zlib.decompress(
+        base64.urlsafe_b64decode(claim + "=" * (-len(claim) % 4)), wbits=-15
+    )
+
+
+class PermissionClaims(NamedTuple):
+    """Permission digest carried by an access token.
+
+    The digest is a snapshot taken when the token was issued. It may only be
+    trusted while ``version`` still equals the user's current permission version
+    (see ``crud_menu.PERMISSION_VERSION_KEY``); ``api.deps.get_permission_claims``
+    performs that check.
+    """
+
+    is_superuser: bool
+    version: int
+    menu_bitmap: bytes
+    button_bitmap: bytes
+
+    def to_claims(self) -> Dict[str, Any]:
+        return {
+            "su": self.is_superuser,
+            "pv": self.version,
+            "mb": encode_bitmap_claim(self.menu_bitmap),
+            "bb": encode_bitmap_claim(self.button_bitmap),
+        }
+
+    @classmethod
+    def from_payload(cls, payload: TokenPayload) -> Optional["PermissionClaims"]:
+        if payload.pv is None or payload.mb is None or payload.bb is None:
+            return None
+        return cls(
+            is_superuser=bool(payload.su),
+            version=payload.pv,
+            menu_bitmap=decode_bitmap_claim(payload.mb),
+            button_bitmap=decode_bitmap_claim(payload.bb),
+        )
+
+
+class TokenCache:
+    """Bounded LRU of verified token payloads keyed by the token's SHA-256 digest.
+
+    Entries expire at the token's own ``exp`` claim, so a cached token is never
+    accepted past the point where ``jwt.decode`` would have rejected it.
+    """
+
+    def __init__(self, maxsize: int) -> None:
+        self.maxsize = maxsize
+        self.hits = 0
+        self.misses = 0
+        self._entries: "OrderedDict[bytes, tuple[float, TokenPayload]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _key(token: str) -> bytes:
+        return hashlib.sha256(token.encode()).digest()
+
+    def get(self, token: str) -> Optional[TokenPayload]:
+        key = self._key(token)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                expires_at, payload = entry
+                if expires_at > time.time():
+                    self._entries.move_to_end(key)
+                    self.hits += 1
+                    return payload
+                del self._entries[key]
+            self.misses += 1
+            return None
+
+    def put(self, token: str, payload: TokenPayload, expires_at: float) -> None:
+        if self.maxsize <= 0:
+            return
+        key = self._key(token)
+        with self._lock:
+            self._entries[key] = (expires_at, payload)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self.hits = 0
+            self.misses = 0
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {
+                "size": len(self._entries),
+                "maxsize": self.maxsize,
+                "hits": self.hits,
+                "misses": self.misses,
+            }
+
+
+token_cache = TokenCache(settings.TOKEN_CACHE_MAX_ENTRIES)
+
+
+def decode_access_token(token: str) -> TokenPayload:
+    """Verify and decode an access token, reusing earlier verifications.
+
+    Raises ``jwt.JWTError`` or ``pydantic.ValidationError`` for invalid tokens,
+    exactly like an uncached ``jwt.decode`` followed by ``TokenPayload(**payload)``.
+    """
+    token_data = token_cache.get(token)
+    if token_data is not None:
+        return token_data
+    payload = jwt.decode(token, settings.SECRET_KEY, algorithms=[ALGORITHM])
+    token_data = TokenPayload(**payload)
+    if token_data.exp is not None:
+        token_cache.put(token, token_data, float(token_data.exp))
+    return token_data
+
+
 def verify_password(plain_password: str, hashed_password: str) -> bool:
     return pwd_context.verify(plain_password, hashed_password)
 
 def get_password_hash(password: str) -> str:
-    return pwd_context.hash(password) 
\ No newline at end of file
+    return pwd_context.hash(password)
+
+
+class PasswordHasherBusy(Exception):
+    """Raised when the password hashing pool has no free slot."""
+
+
+# bcrypt runs on its own small pool so a login burst cannot occupy the
+# threadpool shared by every sync endpoint. Admission is bounded: beyond
+# PASSWORD_HASH_WORKERS running plus PASSWORD_HASH_MAX_PENDING queued jobs,
+# callers are rejected immediately instead of queueing without limit.
+_password_executor = ThreadPoolExecutor(
+    max_workers=settings.PASSWORD_HASH_WORKERS, thread_name_prefix="password-hash"
+)
+_password_slots = threading.BoundedSemaphore(
+    settings.PASSWORD_HASH_WORKERS + settings.PASSWORD_HASH_MAX_PENDING
+)
+
+login_latency = LatencyRecorder()
+
+
+def _submit_password_job(func, *args) -> Future:
+    if not _password_slots.acquire(blocking=False):
+        raise PasswordHasherBusy()
+    try:
+        future = _password_executor.submit(func, *args)
+    except BaseException:
+        _password_slots.release()
+        raise
+    # The slot is held until bcrypt finishes, even if the caller stops waiting
+    future.add_done_callback(lambda _: _password_slots.release())
+    return future
+
+
+async def _run_password_job(func, *args):
+    return await asyncio.wrap_future(_submit_password_job(func, *args))
+
+
+async def verify_password_async(plain_password: str, hashed_password: str) -> bool:
+    return await _run_password_job(verify_password, plain_password, hashed_password)
+
+
+async def get_password_hash_async(password: str) -> str:
+    return await _run_password_job(get_password_hash, password)
+
+
+def get_password_hash_pooled(password: str) -> str:
+    """Hash on the password pool from sync code (never from the event loop)."""
+    return _submit_password_job(get_password_hash, password).result() 
\ No newline at end of file
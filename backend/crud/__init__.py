@@ -1 +1,2 @@
-from . import crud_user, crud_expense, crud_menu
+from . import crud_user, crud_expense, crud_menu, crud_role
+from . import crud_user_async, crud_expense_async, crud_menu_async
@@ -1,28 +1,334 @@
+import base64
+import datetime
+import json
+from collections import defaultdict
+from typing import Dict, Iterator, List, Optional, Sequence, Tuple
+
+from sqlalchemy import Row, Select, delete, func, insert, select, tuple_, update
+from sqlalchemy.dialects import postgresql, sqlite
 from sqlalchemy.orm import Session
-from models.expense import Expense
-from schemas.expense import ExpenseCreate, ExpenseUpdate
+from models.expense import Expense, ExpenseDailyRollup
+from schemas.expense import ExpenseCreate, ExpenseSummaryBucket, ExpenseUpdate
+
+RollupKey = Tuple[int, datetime.date, str]
+
+EXPORT_COLUMNS = ("id", "date", "description", "amount", "owner_id")
+
+
+# Newest first. Undated expenses come before every dated one, where a
+# backward scan of the ascending (owner_id, date, id) index puts them on
+# PostgreSQL; SQLite needs the explicit NULLS FIRST.
+NEWEST_FIRST = (Expense.date.desc().nulls_first(), Expense.id.desc())
+
+
+def encode_cursor(expense: Expense) -> str:
+    """Opaque cursor pointing just past ``expense`` in NEWEST_FIRST order."""
+    date = expense.date.isoformat() if expense.date is not None else None
+    raw = json.dumps([date, expense.id]).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str) -> Tuple[Optional[datetime.datetime], int]:
+    """Inverse of encode_cursor. Raises ValueError for malformed cursors."""
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        date, expense_id = json.loads(base64.urlsafe_b64decode(padded))
+        if date is not None:
+            date = datetime.datetime.fromisoformat(date)
+        return date, int(expense_id)
+    except (TypeError, ValueError) as exc:
+        raise ValueError("Invalid cursor") from exc
+
+
+def next_cursor(expenses: List[Expense], limit: int) -> Optional[str]:
+    """Cursor for the page after ``expenses``, or None when it was the last page."""
+    if limit <= 0 or len(expenses) < limit:
+        return None
+    return encode_cursor(expenses[-1])
+
+
+def expenses_page_stmt(
+    owner_id: Optional[int], skip: int, limit: int, cursor: Optional[str]
+) -> Select:
+    """One page of expenses in NEWEST_FIRST order, by cursor or by skip."""
+    stmt = select(Expense).order_by(*NEWEST_FIRST)
+    if owner_id is not None:
+        stmt = stmt.where(Expense.owner_id == owner_id)
+    if cursor:
+        date, expense_id = decode_cursor(cursor)
+        if date is None:
+            stmt = stmt.where(
+                Expense.date.is_not(None)
+                | (Expense.date.is_(None) & (Expense.id < expense_id))
+            )
+        else:
+            stmt = stmt.where(tuple_(Expense.date, Expense.id) < (date, expense_id))
+    else:
+        stmt = stmt.offset(skip)
+    return stmt.limit(limit)
+
+
+def _rollup_key(expense: Expense) -> Optional[RollupKey]:
+    """The rollup bucket of ``expense``, or None when it has no owner or date.
+
+    Such expenses are left out of the rollups, as in rebuild_expense_rollups.
+    """
+    if expense.owner_id is None or expense.date is None:
+        return None
+    return (expense.owner_id, expense.date.date(), expense.description or "")
+
+
+def apply_rollup_deltas(db: Session, deltas: Dict[RollupKey, List[float]]) -> None:
+    """Add ``{key: [amount, count]}`` deltas to the daily rollups.
+
+    Runs inside the caller's transaction: one multi-row upsert where the
+    dialect supports it, then one delete for buckets that dropped to zero.
+    """
+    rows = [
+        {
+            "owner_id": owner_id,
+            "day": day,
+            "description": description,
+            "total": amount,
+            "count": int(count),
+        }
+        for (owner_id, day, description), (amount, count) in deltas.items()
+        if count or amount
+    ]
+    if not rows:
+        return
+
+    dialect = db.get_bind().dialect.name
+    if dialect in ("postgresql", "sqlite"):
+        upsert = postgresql.insert if dialect == "postgresql" else sqlite.insert
+        stmt = upsert(ExpenseDailyRollup).values(rows)
+        stmt = stmt.on_conflict_do_update(
+            index_elements=["owner_id", "day", "description"],
+            set_={
+                "total": ExpenseDailyRollup.total + stmt.excluded.total,
+                "count": ExpenseDailyRollup.count + stmt.excluded.count,
+            },
+        )
+        db.execute(stmt)
+    else:
+        for row in rows:
+            key = (
+                (ExpenseDailyRollup.owner_id == row["owner_id"])
+                & (ExpenseDailyRollup.day == row["day"])
+                & (ExpenseDailyRollup.description == row["description"])
+            )
+            result = db.execute(
+                update(ExpenseDailyRollup)
+                .where(key)
+                .values(
+                    total=ExpenseDailyRollup.total + row["total"],
+                    count=ExpenseDailyRollup.count + row["count"],
+                )
+            )
+            if result.rowcount == 0:
+                db.execute(insert(ExpenseDailyRollup).values(row))
+
+    owner_ids = {row["owner_id"] for row in rows}
+    db.execute(
+        delete(ExpenseDailyRollup).where(
+            ExpenseDailyRollup.owner_id.in_(owner_ids),
+            ExpenseDailyRollup.count <= 0,
+        )
+    )
+
+
+def _apply_rollup_delta(
+    db: Session, key: Optional[RollupKey], amount: float, count: int
+):
+    if key is not None:
+        apply_rollup_deltas(db, {key: [amount, count]})
+
+
+def rebuild_expense_rollups(db: Session, owner_id: Optional[int] = None) -> None:
+    """Recompute rollups from the expenses table, e.g. after a backfill.
+
+    Expenses without an owner or a date have no bucket and are left out.
+    """
+    day = func.date(Expense.date)
+    description = func.coalesce(Expense.description, "")
+    source = (
+        select(
+            Expense.owner_id,
+            day,
+            description,
+            func.sum(Expense.amount),
+            func.count(Expense.id),
+        )
+        .where(Expense.owner_id.is_not(None), Expense.date.is_not(None))
+        .group_by(Expense.owner_id, day, description)
+    )
+    cleanup = delete(ExpenseDailyRollup)
+    if owner_id is not None:
+        source = source.where(Expense.owner_id == owner_id)
+        cleanup = cleanup.where(ExpenseDailyRollup.owner_id == owner_id)
+    db.execute(cleanup)
+    db.execute(
+        insert(ExpenseDailyRollup).from_select(
+            ["owner_id", "day", "description", "total", "count"], source
+        )
+    )
+    db.commit()
+
+
+def get_expense_summary(
+    db: Session,
+    owner_id: int,
+    group_by: str,
+    start: Optional[datetime.date] = None,
+    end: Optional[datetime.date] = None,
+) -> List[ExpenseSummaryBucket]:
+    """Totals, counts and averages per day, month or description.
+
+    Reads only the rollup table; ``start`` and ``end`` are inclusive days.
+    """
+    return fold_expense_summary(
+        db.execute(expense_summary_stmt(owner_id, group_by, start, end)), group_by
+    )
+
+
+def expense_summary_stmt(
+    owner_id: int,
+    group_by: str,
+    start: Optional[datetime.date],
+    end: Optional[datetime.date],
+) -> Select:
+    column = (
+        ExpenseDailyRollup.description
+        if group_by == "description"
+        else ExpenseDailyRollup.day
+    )
+    stmt = (
+        select(
+            column,
+            func.sum(ExpenseDailyRollup.total),
+            func.sum(ExpenseDailyRollup.count),
+        )
+        .where(ExpenseDailyRollup.owner_id == owner_id)
+        .group_by(column)
+        .order_by(column)
+    )
+    if start is not None:
+        stmt = stmt.where(ExpenseDailyRollup.day >= start)
+    if end is not None:
+        stmt = stmt.where(ExpenseDailyRollup.day <= end)
+    return stmt
+
+
+def fold_expense_summary(rows, group_by: str) -> List[ExpenseSummaryBucket]:
+    """Turn (day|description, total, count) rows into summary buckets."""
+    buckets: Dict[Optional[str], List[float]] = defaultdict(lambda: [0.0, 0])
+    for key, total, count in rows:
+        if group_by == "month":
+            key = key.strftime("%Y-%m")
+        elif group_by == "day":
+            key = key.isoformat()
+        else:
+            key = key or None
+        buckets[key][0] += total
+        buckets[key][1] += count
+
+    return [
+        ExpenseSummaryBucket(key=key, total=total, count=count, average=total / count)
+        for key, (total, count) in buckets.items()
+    ]
+
+
+def create_expenses_bulk(
+    db: Session,
+    expenses: Sequence[ExpenseCreate],
+    owner_id: int,
+    chunk_size: int = 1000,
+) -> List[int]:
+    """Insert many expenses in one transaction and return their ids in input order.
+
+    Each chunk is a single multi-row INSERT ... RETURNING, and the rollups for
+    the whole chunk are applied with one upsert.
+    """
+    created_ids: List[int] = []
+    now = datetime.datetime.utcnow()
+    stmt = insert(Expense).returning(Expense.id, sort_by_parameter_order=True)
+    for start in range(0, len(expenses), chunk_size):
+        rows = [
+            {**expense.model_dump(), "owner_id": owner_id, "date": now}
+            for expense in expenses[start : start + chunk_size]
+        ]
+        created_ids.extend(db.execute(stmt, rows).scalars())
+
+        deltas: Dict[RollupKey, List[float]] = defaultdict(lambda: [0.0, 0])
+        for row in rows:
+            delta = deltas[(owner_id, now.date(), row["description"] or "")]
+            delta[0] += row["amount"]
+            delta[1] += 1
+        apply_rollup_deltas(db, deltas)
+    db.commit()
+    return created_ids
+
 
 def create_expense(db: Session, expense: ExpenseCreate, owner_id: int):
     db_expense = Expense(**expense.dict(), owner_id=owner_id)
     db.add(db_expense)
+    db.flush()
+    _apply_rollup_delta(db, _rollup_key(db_expense), db_expense.amount, 1)
     db.commit()
     db.refresh(db_expense)
     return db_expense
 
-def get_expenses(db: Session, skip: int = 0, limit: int = 100):
-    return db.query(Expense).offset(skip).limit(limit).all()
+def get_expenses(
+    db: Session, skip: int = 0, limit: int = 100, cursor: Optional[str] = None
+):
+    return db.scalars(expenses_page_stmt(None, skip, limit, cursor)).all()
+
+def iter_expense_batches(
+    db: Session, owner_id: Optional[int] = None, batch_size: int = 1000
+) -> Iterator[Sequence[Row]]:
+    """Stream expense rows (EXPORT_COLUMNS) newest first, ``batch_size`` at a time.
+
+    Uses a server-side cursor and plain rows instead of ORM objects, so memory
+    stays flat however many rows are exported.
+    """
+    stmt = select(*(getattr(Expense, column) for column in EXPORT_COLUMNS)).order_by(
+        *NEWEST_FIRST
+    )
+    if owner_id is not None:
+        stmt = stmt.where(Expense.owner_id == owner_id)
+    result = db.execute(stmt.execution_options(yield_per=batch_size))
+    try:
+        yield from result.partitions()
+    finally:
+        result.close()
 
 def get_expense(db: Session, expense_id: int):
     return db.query(Expense).filter(Expense.id == expense_id).first()
 
-def get_expenses_by_owner(db: Session, owner_id: int, skip: int = 0, limit: int = 100):
-    return db.query(Expense).filter(Expense.owner_id == owner_id).offset(skip).limit(limit).all()
+def get_expenses_by_owner(
+    db: Session,
+    owner_id: int,
+    skip: int = 0,
+    limit: int = 100,
+    cursor: Optional[str] = None,
+):
+    return db.scalars(expenses_page_stmt(owner_id, skip, limit, cursor)).all()
 
 def update_expense(db: Session, db_expense: Expense, expense_in: ExpenseUpdate):
+    old_key, old_amount = _rollup_key(db_expense), db_expense.amount
     update_data = expense_in.dict(exclude_unset=True)
     for key, value in update_data.items():
         setattr(db_expense, key, value)
     db.add(db_expense)
+    new_key = _rollup_key(db_expense)
+    deltas: Dict[RollupKey, List[float]] = defaultdict(lambda: [0.0, 0])
+    if old_key is not None:
+        deltas[old_key][0] -= old_amount
+        deltas[old_key][1] -= 1
+    if new_key is not None:
+        deltas[new_key][0] += db_expense.amount
+        deltas[new_key][1] += 1
+    apply_rollup_deltas(db, deltas)
     db.commit()
     db.refresh(db_expense)
     return db_expense
@@ -30,6 +336,7 @@ def update_expense(db: Session, db_expense: Expense, expense_in: ExpenseUpdate):
 def delete_expense(db: Session, expense_id: int):
     db_expense = db.query(Expense).filter(Expense.id == expense_id).first()
     if db_expense:
+        _apply_rollup_delta(db, _rollup_key(db_expense), -db_expense.amount, -1)
         db.delete(db_expense)
         db.commit()
     return db_expense 
\ No newline at end of file
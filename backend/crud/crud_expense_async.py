@@ -0,0 +1,46 @@
+import datetime
+from typing import List, Optional
+
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from crud.crud_expense import (
+    expense_summary_stmt,
+    expenses_page_stmt,
+    fold_expense_summary,
+)
+from models.expense import Expense
+from schemas.expense import ExpenseSummaryBucket
+
+
+async def get_expense(db: AsyncSession, expense_id: int) -> Optional[Expense]:
+    return await db.scalar(select(Expense).where(Expense.id == expense_id))
+
+
+async def get_expenses(
+    db: AsyncSession, skip: int = 0, limit: int = 100, cursor: Optional[str] = None
+) -> List[Expense]:
+    result = await db.scalars(expenses_page_stmt(None, skip, limit, cursor))
+    return list(result.all())
+
+
+async def get_expenses_by_owner(
+    db: AsyncSession,
+    owner_id: int,
+    skip: int = 0,
+    limit: int = 100,
+    cursor: Optional[str] = None,
+) -> List[Expense]:
+    result = await db.scalars(expenses_page_stmt(owner_id, skip, limit, cursor))
+    return list(result.all())
+
+
+async def get_expense_summary(
+    db: AsyncSession,
+    owner_id: int,
+    group_by: str,
+    start: Optional[datetime.date] = None,
+    end: Optional[datetime.date] = None,
+) -> List[ExpenseSummaryBucket]:
+    result = await db.execute(expense_summary_stmt(owner_id, group_by, start, end))
+    return fold_expense_summary(result, group_by)
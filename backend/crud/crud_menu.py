@@ -1,22 +1,74 @@
-from sqlalchemy.orm import Session
-from sqlalchemy import and_
-from typing import List, Optional
+import logging
+
+import redis
+from pydantic import TypeAdapter
+from sqlalchemy.orm import Session, aliased
+from sqlalchemy.orm.attributes import set_committed_value
+from sqlalchemy import (
+    Select,
+    String,
+    and_,
+    case,
+    cast,
+    delete,
+    false,
+    func,
+    insert,
+    literal,
+    or_,
+    select,
+    true,
+    union_all,
+    update,
+)
+from sqlalchemy.dialects import postgresql, sqlite
+from collections import defaultdict
+from typing import (
+    Dict,
+    Iterable,
+    List,
+    NamedTuple,
+    Optional,
+    Sequence,
+    Set,
+    Tuple,
+)
+from core import bitmap, cache, security
+from core.config import settings
+from db import replicas
+from db.redis import get_redis
 from models.menu import MenuItem, UserMenuItem, ButtonPermission, UserButtonPermission
+from models.role import (
+    RoleButtonPermission,
+    RoleMenuItem,
+    UserEffectivePermission,
+    UserRole,
+)
+from models.user import User
 from schemas.menu import (
     MenuItemCreate,
     MenuItemUpdate,
     ButtonPermissionCreate,
     UserMenuPermission,
+    UserMenuResponse,
     UserButtonPermission as UserButtonPermissionSchema,
 )
 
+logger = logging.getLogger(__name__)
+
 
 # MenuItem CRUD
 def create_menu_item(db: Session, menu_item: MenuItemCreate) -> MenuItem:
     db_menu_item = MenuItem(**menu_item.model_dump())
     db.add(db_menu_item)
-    db.commit()
+    try:
+        # 父级不存在时，物化路径维护会抛出 ValueError
+        db.commit()
+    except ValueError:
+        db.rollback()
+        raise
     db.refresh(db_menu_item)
+    invalidate_menu_catalog()
     return db_menu_item
 
 
@@ -27,12 +79,121 @@ def get_menu_item(db: Session, menu_item_id: int) -> Optional[MenuItem]:
 def get_menu_items(
     db: Session, skip: int = 0, limit: int = 100, include_inactive: bool = False
 ) -> List[MenuItem]:
-    query = db.query(MenuItem)
+    """按 (path, order) 排序的一页菜单项，children 已填充，序列化时不再懒加载
+
+    分页在数据库中完成；第二条查询只取本页节点的子孙节点用于组装 children，
+    因此开销取决于本页覆盖的子树而不是整个目录。
+    """
+    stmt = select(MenuItem)
     if not include_inactive:
-        query = query.filter(MenuItem.is_active == True)
-    return query.offset(skip).limit(limit).all()
+        stmt = stmt.where(MenuItem.is_active == True)
+    page = list(
+        db.scalars(
+            stmt.order_by(MenuItem.path, MenuItem.order, MenuItem.id)
+            .offset(skip)
+            .limit(limit)
+        )
+    )
+    # 只保留最外层的前缀，被其他页内节点包含的子树不必重复匹配
+    prefixes = sorted(f"{node.path}{node.id}/" for node in page)
+    outermost: List[str] = []
+    for prefix in prefixes:
+        if not outermost or not prefix.startswith(outermost[-1]):
+            outermost.append(prefix)
+    descendants = (
+        list(
+            db.scalars(
+                stmt.where(
+                    or_(*(MenuItem.path.startswith(prefix) for prefix in outermost))
+                )
+            )
+        )
+        if outermost
+        else []
+    )
+    _assemble_menu_tree(
+        sorted(
+            {node.id: node for node in page + descendants}.values(),
+            key=lambda node: (node.path, node.order, node.id),
+        )
+    )
+    return page
 
 
+def load_menu_tree(
+    db: Session, root_id: Optional[int] = None, include_inactive: bool = False
+) -> List[MenuItem]:
+    """一次查询加载整个菜单目录或以 root_id 为根的子树
+
+    借助物化路径按 (path, order) 取出全部节点，在内存中填充 children/parent
+    关系；返回按 (path, order) 排序的全部节点。父节点被过滤掉的节点不会挂到树上。
+    """
+    stmt = select(MenuItem)
+    if root_id is not None:
+        root = aliased(MenuItem)
+        stmt = stmt.join(root, root.id == root_id).where(
+            or_(
+                MenuItem.id == root.id,
+                MenuItem.path.startswith(
+                    root.path.concat(cast(root.id, String)).concat("/")
+                ),
+            )
+        )
+    if not include_inactive:
+        stmt = stmt.where(MenuItem.is_active == True)
+    nodes = list(db.scalars(stmt.order_by(MenuItem.path, MenuItem.order)))
+    _assemble_menu_tree(nodes)
+    return nodes
+
+
+def _assemble_menu_tree(nodes: List[MenuItem]) -> None:
+    """在内存中为按 (path, order) 排序的节点填充 children/parent 关系"""
+    by_id = {node.id: node for node in nodes}
+    children_by_parent = defaultdict(list)
+    for node in nodes:
+        children_by_parent[node.parent_id].append(node)
+    for node in nodes:
+        set_committed_value(node, "children", children_by_parent.get(node.id, []))
+        if node.parent_id in by_id:
+            set_committed_value(node, "parent", by_id[node.parent_id])
+
+
+def rebuild_menu_paths(db: Session) -> int:
+    """由 parent_id 重新计算全部菜单项的物化路径（用于上线时回填），返回菜单项数"""
+    parents = dict(db.execute(select(MenuItem.id, MenuItem.parent_id)).all())
+    paths: Dict[int, str] = {}
+
+    def path_of(menu_id: int) -> str:
+        if menu_id not in paths:
+            parent_id = parents[menu_id]
+            paths[menu_id] = (
+                "/" if parent_id is None else f"{path_of(parent_id)}{parent_id}/"
+            )
+        return paths[menu_id]
+
+    for menu_id in parents:
+        path_of(menu_id)
+    if paths:
+        db.execute(
+            update(MenuItem),
+            [{"id": menu_id, "path": path} for menu_id, path in paths.items()],
+        )
+    db.commit()
+    invalidate_menu_catalog()
+    return len(paths)
+
+
+MENU_ROOTS_NAMESPACE = "menu:roots"
+BUTTON_PERMISSIONS_NAMESPACE = "menu:buttons"
+
+
+@cache.cached(
+    MENU_ROOTS_NAMESPACE,
+    ttl=settings.MENU_CACHE_TTL_SECONDS,
+    key=lambda db, include_inactive=False: str(bool(include_inactive)),
+    codec=cache.OrmCodec(MenuItem, many=True),
+    near=True,
+)
 def get_root_menu_items(db: Session, include_inactive: bool = False) -> List[MenuItem]:
     """获取根菜单项（没有父级的菜单项）"""
     query = db.query(MenuItem).filter(MenuItem.parent_id.is_(None))
@@ -52,8 +213,14 @@ def update_menu_item(
     for key, value in update_data.items():
         setattr(db_menu_item, key, value)
 
-    db.commit()
+    try:
+        # 移动到自身子树下或父级不存在时，物化路径维护会抛出 ValueError
+        db.commit()
+    except ValueError:
+        db.rollback()
+        raise
     db.refresh(db_menu_item)
+    invalidate_menu_catalog()
     return db_menu_item
 
 
@@ -62,8 +229,21 @@ def delete_menu_item(db: Session, menu_item_id: int) -> bool:
     if not db_menu_item:
         return False
 
+    # 重算持有该菜单位的用户，避免位置被新菜单复用后误授权
+    user_ids = _users_with_bit(
+        db, UserEffectivePermission.menu_bitmap, db_menu_item.bit_index
+    )
+    # 先删除指向该菜单的角色与用户授权：外键没有级联删除，残留的授权行也会
+    # 挂到之后复用该ID的菜单上
+    db.execute(delete(RoleMenuItem).where(RoleMenuItem.menu_item_id == menu_item_id))
+    db.execute(delete(UserMenuItem).where(UserMenuItem.menu_item_id == menu_item_id))
+    db.expire(db_menu_item, ["user_menu_items"])
     db.delete(db_menu_item)
+    db.flush()
+    effective = materialize_effective_permissions(db, user_ids)
     db.commit()
+    invalidate_menu_catalog()
+    refresh_permission_caches(effective)
     return True
 
 
@@ -75,9 +255,17 @@ def create_button_permission(
     db.add(db_button_permission)
     db.commit()
     db.refresh(db_button_permission)
+    invalidate_menu_catalog()
     return db_button_permission
 
 
+@cache.cached(
+    BUTTON_PERMISSIONS_NAMESPACE,
+    ttl=settings.MENU_CACHE_TTL_SECONDS,
+    key=lambda db, menu_item_id=None: str(menu_item_id or ""),
+    codec=cache.OrmCodec(ButtonPermission, many=True),
+    near=True,
+)
 def get_button_permissions(
     db: Session, menu_item_id: Optional[int] = None
 ) -> List[ButtonPermission]:
@@ -96,24 +284,81 @@ def get_button_permission(db: Session, button_id: str) -> Optional[ButtonPermiss
 
 
 # User Menu Permissions
-def set_user_menu_permissions(
-    db: Session, user_id: int, menu_permissions: List[UserMenuPermission]
-) -> bool:
-    """设置用户菜单权限"""
-    # 删除现有权限
-    db.query(UserMenuItem).filter(UserMenuItem.user_id == user_id).delete()
+class PermissionChanges(NamedTuple):
+    """按差异写入权限后的变更集，元素为 menu_item_id 或 button_id"""
+
+    added: List
+    removed: List
+    updated: List
+
+    @property
+    def changed(self) -> bool:
+        return bool(self.added or self.removed or self.updated)
+
+
+def apply_permission_diff(
+    db: Session, model, key_column: str, user_id: int, desired: Dict
+) -> PermissionChanges:
+    """将用户的权限行同步为 desired（键 -> has_permission）
+
+    先读出现有权限计算差异，再分别用一条批量语句完成删除与写入：
+    支持的方言使用多行 upsert，其他方言使用批量插入加按取值分组的更新。
+    调用方负责提交事务。
+    """
+    key = getattr(model, key_column)
+    current = dict(
+        db.execute(
+            select(key, model.has_permission).where(model.user_id == user_id)
+        ).all()
+    )
+    added = [k for k in desired if k not in current]
+    removed = [k for k in current if k not in desired]
+    updated = [k for k in desired if k in current and current[k] != desired[k]]
+
+    if removed:
+        db.execute(delete(model).where(model.user_id == user_id, key.in_(removed)))
 
-    # 添加新权限
-    for perm in menu_permissions:
-        db_user_menu = UserMenuItem(
-            user_id=user_id,
-            menu_item_id=perm.menu_item_id,
-            has_permission=perm.has_permission,
+    rows = [
+        {"user_id": user_id, key_column: k, "has_permission": desired[k]}
+        for k in added + updated
+    ]
+    dialect = db.get_bind().dialect.name
+    if rows and dialect in ("postgresql", "sqlite"):
+        upsert = postgresql.insert if dialect == "postgresql" else sqlite.insert
+        stmt = upsert(model).values(rows)
+        stmt = stmt.on_conflict_do_update(
+            index_elements=["user_id", key_column],
+            set_={"has_permission": stmt.excluded.has_permission},
         )
-        db.add(db_user_menu)
+        db.execute(stmt)
+    elif rows:
+        if added:
+            db.execute(insert(model), rows[: len(added)])
+        for value in (True, False):
+            keys = [k for k in updated if desired[k] == value]
+            if keys:
+                db.execute(
+                    update(model)
+                    .where(model.user_id == user_id, key.in_(keys))
+                    .values(has_permission=value)
+                )
+    return PermissionChanges(added, removed, updated)
+
 
+def set_user_menu_permissions(
+    db: Session, user_id: int, menu_permissions: List[UserMenuPermission]
+) -> PermissionChanges:
+    """设置用户菜单权限，只写入与现有权限的差异，返回变更集"""
+    desired = {perm.menu_item_id: perm.has_permission for perm in menu_permissions}
+    changes = apply_permission_diff(
+        db, UserMenuItem, "menu_item_id", user_id, desired
+    )
+    effective = (
+        materialize_effective_permissions(db, [user_id]) if changes.changed else {}
+    )
     db.commit()
-    return True
+    refresh_permission_caches(effective)
+    return changes
 
 
 def get_user_menu_permissions(db: Session, user_id: int) -> List[UserMenuItem]:
@@ -122,28 +367,21 @@ def get_user_menu_permissions(db: Session, user_id: int) -> List[UserMenuItem]:
 
 
 def get_user_accessible_menus(db: Session, user_id: int) -> List[MenuItem]:
-    """获取用户可访问的菜单项"""
+    """获取用户可访问的菜单项（读取物化的最终权限）"""
+    is_superuser, permissions = get_effective_permissions(db, user_id)
     # 如果是超级用户，返回所有活跃菜单
-    from models.user import User
-
-    user = db.query(User).filter(User.id == user_id).first()
-    if user and user.is_superuser:
+    if is_superuser:
         return get_root_menu_items(db, include_inactive=False)
 
     # 普通用户只返回有权限的菜单
-    accessible_menu_ids = (
-        db.query(UserMenuItem.menu_item_id)
-        .filter(
-            and_(UserMenuItem.user_id == user_id, UserMenuItem.has_permission == True)
-        )
-        .subquery()
-    )
-
+    granted_bits = bitmap.to_indexes(permissions.menu_bitmap)
+    if not granted_bits:
+        return []
     return (
         db.query(MenuItem)
         .filter(
             and_(
-                MenuItem.id.in_(accessible_menu_ids),
+                MenuItem.bit_index.in_(granted_bits),
                 MenuItem.is_active == True,
                 MenuItem.parent_id.is_(None),
             )
@@ -156,24 +394,18 @@ def get_user_accessible_menus(db: Session, user_id: int) -> List[MenuItem]:
 # User Button Permissions
 def set_user_button_permissions(
     db: Session, user_id: int, button_permissions: List[UserButtonPermissionSchema]
-) -> bool:
-    """设置用户按钮权限"""
-    # 删除现有权限
-    db.query(UserButtonPermission).filter(
-        UserButtonPermission.user_id == user_id
-    ).delete()
-
-    # 添加新权限
-    for perm in button_permissions:
-        db_user_button = UserButtonPermission(
-            user_id=user_id,
-            button_id=perm.button_id,
-            has_permission=perm.has_permission,
-        )
-        db.add(db_user_button)
-
+) -> PermissionChanges:
+    """设置用户按钮权限，只写入与现有权限的差异，返回变更集"""
+    desired = {perm.button_id: perm.has_permission for perm in button_permissions}
+    changes = apply_permission_diff(
+        db, UserButtonPermission, "button_id", user_id, desired
+    )
+    effective = (
+        materialize_effective_permissions(db, [user_id]) if changes.changed else {}
+    )
     db.commit()
-    return True
+    refresh_permission_caches(effective)
+    return changes
 
 
 def get_user_button_permissions(
@@ -187,26 +419,713 @@ def get_user_button_permissions(
     )
 
 
-def check_user_button_permission(db: Session, user_id: int, button_id: str) -> bool:
-    """检查用户是否有特定按钮权限"""
-    # 如果是超级用户，拥有所有权限
-    from models.user import User
+def check_user_button_permission(
+    db: Session,
+    user_id: int,
+    button_id: str,
+    is_superuser: Optional[bool] = None,
+    button_bitmap: Optional[bytes] = None,
+) -> bool:
+    """检查用户是否有特定按钮权限
 
-    user = db.query(User).filter(User.id == user_id).first()
-    if user and user.is_superuser:
-        return True
+    调用方已知用户身份时传入is_superuser，可省去加载用户的查询
+    """
+    return check_user_button_permissions(
+        db, user_id, [button_id], is_superuser, button_bitmap
+    )[button_id]
 
-    # 检查具体权限
-    permission = (
-        db.query(UserButtonPermission)
-        .filter(
-            and_(
-                UserButtonPermission.user_id == user_id,
-                UserButtonPermission.button_id == button_id,
-                UserButtonPermission.has_permission == True,
+
+def check_user_button_permissions(
+    db: Session,
+    user_id: int,
+    button_ids: Iterable[str],
+    is_superuser: Optional[bool] = None,
+    button_bitmap: Optional[bytes] = None,
+) -> Dict[str, bool]:
+    """批量检查按钮权限，一次位图读取判定全部按钮
+
+    button_bitmap 为已校验过版本的令牌权限声明中的按钮位图，传入时不再读取缓存
+    """
+    button_ids = list(dict.fromkeys(button_ids))
+    if not button_ids:
+        return {}
+    if is_superuser is None:
+        is_superuser = bool(
+            db.execute(
+                select(User.is_superuser).where(User.id == user_id)
+            ).scalar_one_or_none()
+        )
+    if is_superuser:
+        return dict.fromkeys(button_ids, True)
+    if button_bitmap is not None:
+        return _test_buttons(db, button_bitmap, button_ids)
+    return _check_granted_buttons(db, user_id, button_ids)
+
+
+# 用户按钮权限缓存: perm:buttons:user:{user_id} 以 Redis 字符串保存按钮位图
+# （位序与 GETBIT 一致，见 core.bitmap）。空字符串表示已加载但没有任何按钮，
+# 键不存在表示未缓存。
+USER_BUTTONS_KEY = "perm:buttons:user:{user_id}"
+BUTTON_BITS_NAMESPACE = "menu:button-bits"
+
+
+@cache.cached(
+    BUTTON_BITS_NAMESPACE,
+    ttl=settings.MENU_CACHE_TTL_SECONDS,
+    key=lambda db: "-",
+    near=True,
+)
+def get_button_bit_indexes(db: Session) -> Dict[str, int]:
+    """按钮ID到位图位置的映射"""
+    return dict(
+        db.execute(select(ButtonPermission.button_id, ButtonPermission.bit_index)).all()
+    )
+
+
+def _test_buttons(
+    db: Session, bits: bytes, button_ids: List[str]
+) -> Dict[str, bool]:
+    bit_indexes = get_button_bit_indexes(db)
+    return {
+        button_id: button_id in bit_indexes
+        and bitmap.has_bit(bits, bit_indexes[button_id])
+        for button_id in button_ids
+    }
+
+
+def _check_granted_buttons(
+    db: Session, user_id: int, button_ids: List[str]
+) -> Dict[str, bool]:
+    """读取一次按钮位图判定多个按钮；缓存未命中时读取最终权限并回填"""
+    key = USER_BUTTONS_KEY.format(user_id=user_id)
+    client = get_redis()
+    try:
+        bits = client.get(key)
+    except redis.RedisError:
+        logger.warning("button permission cache unavailable", exc_info=True)
+        client, bits = None, None
+
+    if bits is None:
+        bits = get_effective_permissions(db, user_id)[1].button_bitmap
+        if client is not None:
+            try:
+                # NX: 不覆盖写路径在此期间写入的新位图
+                client.set(
+                    key, bits, nx=True, ex=settings.USER_BUTTONS_CACHE_TTL_SECONDS
+                )
+            except redis.RedisError:
+                logger.warning(
+                    "failed to cache buttons of user %s", user_id, exc_info=True
+                )
+    return _test_buttons(db, bits, button_ids)
+
+
+def _queue_store_user_buttons(pipe, user_id: int, bits: bytes) -> None:
+    pipe.set(
+        USER_BUTTONS_KEY.format(user_id=user_id),
+        bits,
+        ex=settings.USER_BUTTONS_CACHE_TTL_SECONDS,
+    )
+
+
+def store_user_buttons(user_id: int, bits: bytes) -> None:
+    """写路径提交后直接覆盖用户的按钮位图"""
+    try:
+        pipe = get_redis().pipeline()
+        _queue_store_user_buttons(pipe, user_id, bits)
+        pipe.execute()
+    except redis.RedisError:
+        logger.error("failed to store buttons of user %s", user_id, exc_info=True)
+
+
+# Effective Permissions
+#
+# 用户最终权限 = 所属角色授权的并集，再应用用户级覆盖
+# （UserMenuItem / UserButtonPermission 的 has_permission
+# 为 True 时追加，为 False 时移除）。结果以位图物化在 user_effective_permissions 表，
+# 由用户权限、用户角色、角色授权的写操作只针对受影响的用户增量重算；
+# 读取时按主键读取一行，检查权限只需测试对应的位。
+EFFECTIVE_PERMISSIONS_CHUNK_SIZE = 500
+
+
+class EffectivePermissions(NamedTuple):
+    menu_bitmap: bytes
+    button_bitmap: bytes
+    # 物化写入后的版本号，仅 materialize_effective_permissions 的结果携带
+    version: Optional[int] = None
+
+
+EMPTY_PERMISSIONS = EffectivePermissions(b"", b"")
+
+
+def effective_permission_sources_stmt(user_ids: Sequence[int]):
+    """一条 UNION ALL 查询取出计算最终权限所需的全部授权位"""
+    role_menus = (
+        select(
+            UserRole.user_id,
+            literal("menu").label("kind"),
+            MenuItem.bit_index.label("bit"),
+            true().label("granted"),
+            false().label("is_override"),
+        )
+        .join(RoleMenuItem, RoleMenuItem.role_id == UserRole.role_id)
+        .join(MenuItem, MenuItem.id == RoleMenuItem.menu_item_id)
+        .where(UserRole.user_id.in_(user_ids))
+    )
+    role_buttons = (
+        select(
+            UserRole.user_id,
+            literal("button"),
+            ButtonPermission.bit_index,
+            true(),
+            false(),
+        )
+        .join(RoleButtonPermission, RoleButtonPermission.role_id == UserRole.role_id)
+        .join(
+            ButtonPermission,
+            ButtonPermission.button_id == RoleButtonPermission.button_id,
+        )
+        .where(UserRole.user_id.in_(user_ids))
+    )
+    user_menus = (
+        select(
+            UserMenuItem.user_id,
+            literal("menu"),
+            MenuItem.bit_index,
+            UserMenuItem.has_permission,
+            true(),
+        )
+        .join(MenuItem, MenuItem.id == UserMenuItem.menu_item_id)
+        .where(UserMenuItem.user_id.in_(user_ids))
+    )
+    user_buttons = (
+        select(
+            UserButtonPermission.user_id,
+            literal("button"),
+            ButtonPermission.bit_index,
+            UserButtonPermission.has_permission,
+            true(),
+        )
+        .join(
+            ButtonPermission,
+            ButtonPermission.button_id == UserButtonPermission.button_id,
+        )
+        .where(UserButtonPermission.user_id.in_(user_ids))
+    )
+    return union_all(role_menus, role_buttons, user_menus, user_buttons)
+
+
+def fold_effective_permissions(
+    user_ids: Sequence[int], rows: Iterable
+) -> Dict[int, EffectivePermissions]:
+    """由授权行计算每个用户的最终权限，用户级覆盖在角色授权之后应用"""
+    bits: Dict[Tuple[int, str], Set[int]] = {
+        (user_id, kind): set() for user_id in user_ids for kind in ("menu", "button")
+    }
+    overrides = []
+    for row in rows:
+        if row.is_override:
+            overrides.append(row)
+        else:
+            bits[row.user_id, row.kind].add(row.bit)
+    for row in overrides:
+        if row.granted:
+            bits[row.user_id, row.kind].add(row.bit)
+        else:
+            bits[row.user_id, row.kind].discard(row.bit)
+    return {
+        user_id: EffectivePermissions(
+            bitmap.from_indexes(bits[user_id, "menu"]),
+            bitmap.from_indexes(bits[user_id, "button"]),
+        )
+        for user_id in user_ids
+    }
+
+
+def _store_effective_permissions(
+    db: Session, effective: Dict[int, EffectivePermissions]
+) -> Dict[int, int]:
+    """写入最终权限，返回各用户写入后的版本号"""
+    rows = [
+        {
+            "user_id": user_id,
+            "menu_bitmap": permissions.menu_bitmap,
+            "button_bitmap": permissions.button_bitmap,
+        }
+        for user_id, permissions in effective.items()
+    ]
+    if not rows:
+        return {}
+
+    dialect = db.get_bind().dialect.name
+    if dialect in ("postgresql", "sqlite"):
+        upsert = postgresql.insert if dialect == "postgresql" else sqlite.insert
+        stmt = upsert(UserEffectivePermission).values(rows)
+        stmt = stmt.on_conflict_do_update(
+            index_elements=["user_id"],
+            set_={
+                "menu_bitmap": stmt.excluded.menu_bitmap,
+                "button_bitmap": stmt.excluded.button_bitmap,
+                "version": UserEffectivePermission.version + 1,
+                "updated_at": func.now(),
+            },
+        ).returning(UserEffectivePermission.user_id, UserEffectivePermission.version)
+        return dict(db.execute(stmt).all())
+
+    for row in rows:
+        result = db.execute(
+            update(UserEffectivePermission)
+            .where(UserEffectivePermission.user_id == row["user_id"])
+            .values(
+                menu_bitmap=row["menu_bitmap"],
+                button_bitmap=row["button_bitmap"],
+                version=UserEffectivePermission.version + 1,
+                updated_at=func.now(),
             )
         )
-        .first()
+        if result.rowcount == 0:
+            db.execute(insert(UserEffectivePermission).values(row))
+    return dict(
+        db.execute(
+            select(
+                UserEffectivePermission.user_id, UserEffectivePermission.version
+            ).where(UserEffectivePermission.user_id.in_(effective))
+        ).all()
+    )
+
+
+def materialize_effective_permissions(
+    db: Session, user_ids: Iterable[int]
+) -> Dict[int, EffectivePermissions]:
+    """重算并写入指定用户的最终权限（不提交事务）
+
+    每批用户一次查询一次写入；提交后应调用 refresh_permission_caches。
+    """
+    user_ids = list(dict.fromkeys(user_ids))
+    effective: Dict[int, EffectivePermissions] = {}
+    for start in range(0, len(user_ids), EFFECTIVE_PERMISSIONS_CHUNK_SIZE):
+        chunk = user_ids[start : start + EFFECTIVE_PERMISSIONS_CHUNK_SIZE]
+        rows = db.execute(effective_permission_sources_stmt(chunk)).all()
+        folded = fold_effective_permissions(chunk, rows)
+        versions = _store_effective_permissions(db, folded)
+        effective.update(
+            (user_id, permissions._replace(version=versions[user_id]))
+            for user_id, permissions in folded.items()
+        )
+    return effective
+
+
+def rebuild_effective_permissions(db: Session) -> int:
+    """为所有用户重算最终权限（用于上线时回填），返回用户数"""
+    user_ids = list(db.scalars(select(User.id)))
+    effective = materialize_effective_permissions(db, user_ids)
+    db.commit()
+    refresh_permission_caches(effective)
+    return len(user_ids)
+
+
+def user_permissions_stmt(user_id: int) -> Select:
+    """用户的超级用户标记及物化的最终权限（未物化时位图列为NULL）"""
+    return (
+        select(
+            User.is_superuser,
+            UserEffectivePermission.menu_bitmap,
+            UserEffectivePermission.button_bitmap,
+        )
+        .outerjoin(
+            UserEffectivePermission, UserEffectivePermission.user_id == User.id
+        )
+        .where(User.id == user_id)
     )
 
-    return permission is not None
+
+def effective_permissions_from_row(row) -> Optional[EffectivePermissions]:
+    if row is None or row.menu_bitmap is None:
+        return None
+    return EffectivePermissions(bytes(row.menu_bitmap), bytes(row.button_bitmap))
+
+
+def get_effective_permissions(
+    db: Session, user_id: int
+) -> Tuple[bool, EffectivePermissions]:
+    """返回 (是否超级用户, 最终权限)；尚未物化的用户从授权表现算（不写入）"""
+    row = db.execute(user_permissions_stmt(user_id)).first()
+    if row is None:
+        return False, EMPTY_PERMISSIONS
+    permissions = effective_permissions_from_row(row)
+    if permissions is None:
+        rows = db.execute(effective_permission_sources_stmt([user_id])).all()
+        permissions = fold_effective_permissions([user_id], rows)[user_id]
+    return bool(row.is_superuser), permissions
+
+
+def _users_with_bit(db: Session, column, index: int) -> List[int]:
+    """扫描物化位图，返回第 index 位被置位的用户ID
+
+    Postgres 在库内按字节测试位；其他数据库流式读取位图在进程内测试。
+    不包含超级用户隐含的权限及尚未物化的用户。
+    """
+    byte_index, mask = index >> 3, 0x80 >> (index & 7)
+    if db.get_bind().dialect.name == "postgresql":
+        byte = case(
+            (func.length(column) > byte_index, func.get_byte(column, byte_index)),
+            else_=0,
+        )
+        stmt = (
+            select(UserEffectivePermission.user_id)
+            .where(byte.op("&")(mask) != 0)
+            .order_by(UserEffectivePermission.user_id)
+        )
+        return list(db.scalars(stmt))
+
+    stmt = (
+        select(UserEffectivePermission.user_id, column)
+        .where(func.length(column) > byte_index)
+        .order_by(UserEffectivePermission.user_id)
+        .execution_options(yield_per=1000)
+    )
+    return [
+        user_id for user_id, bits in db.execute(stmt) if bitmap.has_bit(bits, index)
+    ]
+
+
+def get_users_with_menu(db: Session, menu_item_id: int) -> List[int]:
+    """获取被授予某菜单的用户ID"""
+    index = db.scalar(select(MenuItem.bit_index).where(MenuItem.id == menu_item_id))
+    if index is None:
+        return []
+    return _users_with_bit(db, UserEffectivePermission.menu_bitmap, index)
+
+
+def get_users_with_button(db: Session, button_id: str) -> List[int]:
+    """获取被授予某按钮的用户ID"""
+    index = get_button_bit_indexes(db).get(button_id)
+    if index is None:
+        return []
+    return _users_with_bit(db, UserEffectivePermission.button_bitmap, index)
+
+
+def refresh_permission_caches(effective: Dict[int, EffectivePermissions]) -> None:
+    """最终权限重算并提交后，批量失效菜单树、覆盖按钮位图缓存并推进权限版本"""
+    if not effective:
+        return
+    try:
+        pipe = get_redis().pipeline()
+        for user_id, permissions in effective.items():
+            pipe.incr(MENU_TREE_USER_GEN_KEY.format(user_id=user_id))
+            pipe.delete(MENU_TREE_KEY.format(user_id=user_id))
+            pipe.srem(MENU_TREE_USERS_KEY, user_id)
+            _queue_store_user_buttons(pipe, user_id, permissions.button_bitmap)
+            if permissions.version is not None:
+                _queue_store_permission_version(pipe, user_id, permissions.version)
+            # 复制延迟期间重建的菜单树改从主库读取，避免缓存旧权限
+            replicas.queue_mark_recent_write(pipe, replicas.user_scope(user_id))
+        pipe.execute()
+    except redis.RedisError:
+        logger.error(
+            "failed to refresh permission caches of %d users",
+            len(effective),
+            exc_info=True,
+        )
+        _forget_cached_permissions(effective)
+
+
+def _forget_cached_permissions(user_ids: Iterable[int]) -> None:
+    """推进版本失败时删除用户的权限缓存
+
+    版本号缺失时令牌摘要回退到常规检查，而不是在令牌有效期内继续信任旧版本。
+    """
+    keys = [
+        key.format(user_id=user_id)
+        for user_id in user_ids
+        for key in (PERMISSION_VERSION_KEY, USER_BUTTONS_KEY, MENU_TREE_KEY)
+    ]
+    try:
+        get_redis().delete(*keys)
+    except redis.RedisError:
+        logger.critical(
+            "failed to drop stale permission caches of users %s",
+            sorted(user_ids),
+            exc_info=True,
+        )
+
+
+# Token Permission Claims
+#
+# 开启 TOKEN_PERMISSION_CLAIMS 后，访问令牌携带权限摘要（见 security.PermissionClaims），
+# 其中 pv 为签发时 user_effective_permissions.version。perm:version:user:{user_id}
+# 缓存用户当前的版本，由写路径在提交后推进；令牌的 pv 与之相等时摘要才可用，
+# 版本未缓存或不一致时回退到常规检查，因此权限变更在令牌过期前即可生效。
+PERMISSION_VERSION_KEY = "perm:version:user:{user_id}"
+
+# 版本单调递增，只写入更大的值，避免较慢的读者写回旧版本
+SET_VERSION_IF_NEWER = """
+local current = redis.call('GET', KEYS[1])
+if current and tonumber(current) >= tonumber(ARGV[1]) then
+    return 0
+end
+redis.call('SET', KEYS[1], ARGV[1], 'EX', ARGV[2])
+return 1
+"""
+
+
+def _queue_store_permission_version(pipe, user_id: int, version: int) -> None:
+    pipe.eval(
+        SET_VERSION_IF_NEWER,
+        1,
+        PERMISSION_VERSION_KEY.format(user_id=user_id),
+        version,
+        settings.PERMISSION_VERSION_TTL_SECONDS,
+    )
+
+
+def get_permission_claims(db: Session, user_id: int) -> security.PermissionClaims:
+    """读取签发令牌用的权限摘要，并缓存当前版本号
+
+    尚未物化的用户版本号为0，首次物化后即失效。
+    """
+    row = db.execute(
+        user_permissions_stmt(user_id).add_columns(UserEffectivePermission.version)
+    ).first()
+    permissions = effective_permissions_from_row(row)
+    if permissions is None:
+        rows = db.execute(effective_permission_sources_stmt([user_id])).all()
+        permissions = fold_effective_permissions([user_id], rows)[user_id]
+    version = row.version if row is not None and row.version is not None else 0
+    try:
+        pipe = get_redis().pipeline()
+        _queue_store_permission_version(pipe, user_id, version)
+        pipe.execute()
+    except redis.RedisError:
+        logger.warning(
+            "failed to cache permission version of user %s", user_id, exc_info=True
+        )
+    return security.PermissionClaims(
+        is_superuser=bool(row is not None and row.is_superuser),
+        version=version,
+        menu_bitmap=permissions.menu_bitmap,
+        button_bitmap=permissions.button_bitmap,
+    )
+
+
+# User Menu Tree
+def assemble_user_menu_tree(
+    menus: Iterable,
+    buttons: Iterable,
+    granted_menu_ids: Set[int],
+    button_grants: Dict[str, bool],
+    is_superuser: bool,
+) -> List[UserMenuResponse]:
+    """在内存中组装用户菜单树
+
+    menus 与 buttons 只需提供 id/parent_id/title 等属性（ORM 对象或行元组均可），
+    根节点按用户菜单权限过滤，子节点沿用父节点的可见性。
+    """
+    children_by_parent = defaultdict(list)
+    for menu in menus:
+        children_by_parent[menu.parent_id].append(menu)
+    for siblings in children_by_parent.values():
+        siblings.sort(key=lambda m: (m.order, m.id))
+
+    buttons_by_menu = defaultdict(list)
+    for btn in buttons:
+        buttons_by_menu[btn.menu_item_id].append(
+            UserButtonPermissionSchema(
+                button_id=btn.button_id,
+                has_permission=button_grants.get(btn.button_id, False),
+            )
+        )
+
+    def build(menu) -> UserMenuResponse:
+        return UserMenuResponse(
+            id=menu.id,
+            title=menu.title,
+            icon=menu.icon,
+            route=menu.route,
+            order=menu.order,
+            children=[build(child) for child in children_by_parent.get(menu.id, [])],
+            buttons=buttons_by_menu.get(menu.id, []),
+        )
+
+    return [
+        build(menu)
+        for menu in children_by_parent.get(None, [])
+        if is_superuser or menu.id in granted_menu_ids
+    ]
+
+
+class MenuTreeStatements(NamedTuple):
+    permissions: Select
+    menus: Select
+    buttons: Select
+    sources: Select
+
+
+def menu_tree_statements(user_id: int) -> MenuTreeStatements:
+    """构建用户菜单树所需的全部查询（同步与异步实现共用）
+
+    sources 仅在用户的最终权限尚未物化时执行。
+    """
+    return MenuTreeStatements(
+        permissions=user_permissions_stmt(user_id),
+        menus=select(
+            MenuItem.id,
+            MenuItem.parent_id,
+            MenuItem.title,
+            MenuItem.icon,
+            MenuItem.route,
+            MenuItem.order,
+            MenuItem.bit_index,
+        ).where(MenuItem.is_active == True),
+        buttons=select(
+            ButtonPermission.button_id,
+            ButtonPermission.menu_item_id,
+            ButtonPermission.bit_index,
+        ).order_by(ButtonPermission.id),
+        sources=effective_permission_sources_stmt([user_id]),
+    )
+
+
+def assemble_menu_tree_for_row(
+    user_id: int, row, menus: Iterable, buttons: Iterable, sources: Optional[Iterable]
+) -> List[UserMenuResponse]:
+    permissions = effective_permissions_from_row(row)
+    if permissions is None:
+        permissions = fold_effective_permissions([user_id], sources or [])[user_id]
+    granted_menu_ids = {
+        menu.id
+        for menu in menus
+        if bitmap.has_bit(permissions.menu_bitmap, menu.bit_index)
+    }
+    button_grants = {
+        btn.button_id: True
+        for btn in buttons
+        if bitmap.has_bit(permissions.button_bitmap, btn.bit_index)
+    }
+    return assemble_user_menu_tree(
+        menus,
+        buttons,
+        granted_menu_ids,
+        button_grants,
+        bool(row is not None and row.is_superuser),
+    )
+
+
+def build_user_menu_tree(db: Session, user_id: int) -> List[UserMenuResponse]:
+    """以固定次数的查询构建用户菜单树（含按钮权限）"""
+    stmts = menu_tree_statements(user_id)
+    row = db.execute(stmts.permissions).first()
+    menus = db.execute(stmts.menus).all()
+    buttons = db.execute(stmts.buttons).all()
+    sources = None
+    if row is not None and effective_permissions_from_row(row) is None:
+        sources = db.execute(stmts.sources).all()
+    return assemble_menu_tree_for_row(user_id, row, menus, buttons, sources)
+
+
+# User Menu Tree Cache
+#
+# 缓存键:
+#   menu:tree:user:{user_id}  序列化后的菜单树(JSON)，命中时只需一次 GET
+#   menu:tree:gen:{user_id}   用户级失效计数器
+#   menu:tree:gen             全局(菜单目录)失效计数器
+#   menu:tree:users           已缓存用户集合，用于全局失效
+#
+# 写入缓存前先读取两个计数器，构建完成后通过脚本比较计数器再写入，
+# 构建期间发生的任何失效都会使这次写入作废，从而不会回填过期数据。
+MENU_TREE_KEY = "menu:tree:user:{user_id}"
+MENU_TREE_USER_GEN_KEY = "menu:tree:gen:{user_id}"
+MENU_TREE_GEN_KEY = "menu:tree:gen"
+MENU_TREE_USERS_KEY = "menu:tree:users"
+
+menu_tree_adapter = TypeAdapter(List[UserMenuResponse])
+
+STORE_IF_CURRENT = cache.STORE_IF_CURRENT
+
+
+def read_menu_tree_cache(user_id: int) -> Tuple[Optional[bytes], tuple]:
+    """读取缓存的菜单树；未命中时返回当前的失效计数器供回填时比较"""
+    client = get_redis()
+    cached = client.get(MENU_TREE_KEY.format(user_id=user_id))
+    if cached is not None:
+        return cached, ()
+    generations = client.mget(
+        MENU_TREE_GEN_KEY, MENU_TREE_USER_GEN_KEY.format(user_id=user_id)
+    )
+    return None, tuple(gen or b"0" for gen in generations)
+
+
+def menu_tree_store_args(user_id: int, generations: tuple, payload: bytes) -> list:
+    """STORE_IF_CURRENT 脚本的 numkeys、KEYS 与 ARGV"""
+    return [
+        4,
+        MENU_TREE_GEN_KEY,
+        MENU_TREE_USER_GEN_KEY.format(user_id=user_id),
+        MENU_TREE_KEY.format(user_id=user_id),
+        MENU_TREE_USERS_KEY,
+        *generations,
+        payload,
+        settings.MENU_CACHE_TTL_SECONDS,
+        user_id,
+    ]
+
+
+def get_user_menu_tree_json(db: Session, user_id: int) -> bytes:
+    """获取用户菜单树的JSON，优先读取Redis缓存"""
+    try:
+        cached, generations = read_menu_tree_cache(user_id)
+    except redis.RedisError:
+        logger.warning("menu tree cache unavailable", exc_info=True)
+        return menu_tree_adapter.dump_json(build_user_menu_tree(db, user_id))
+    if cached is not None:
+        return cached
+
+    payload = menu_tree_adapter.dump_json(build_user_menu_tree(db, user_id))
+    try:
+        get_redis().eval(
+            STORE_IF_CURRENT, *menu_tree_store_args(user_id, generations, payload)
+        )
+    except redis.RedisError:
+        logger.warning("failed to store menu tree cache", exc_info=True)
+    return payload
+
+
+def invalidate_user_menu_tree(user_id: int) -> None:
+    """用户权限变更后失效该用户的菜单树缓存"""
+    try:
+        pipe = get_redis().pipeline()
+        pipe.incr(MENU_TREE_USER_GEN_KEY.format(user_id=user_id))
+        pipe.delete(MENU_TREE_KEY.format(user_id=user_id))
+        pipe.srem(MENU_TREE_USERS_KEY, user_id)
+        replicas.queue_mark_recent_write(pipe, replicas.user_scope(user_id))
+        pipe.execute()
+    except redis.RedisError:
+        logger.error(
+            "failed to invalidate menu tree of user %s", user_id, exc_info=True
+        )
+
+
+def invalidate_all_menu_trees() -> None:
+    """菜单或按钮定义变更后失效所有用户的菜单树缓存"""
+    client = get_redis()
+    replicas.mark_recent_write(replicas.CATALOG_SCOPE)
+    try:
+        client.incr(MENU_TREE_GEN_KEY)
+        user_ids = client.smembers(MENU_TREE_USERS_KEY)
+        if user_ids:
+            pipe = client.pipeline()
+            pipe.delete(
+                *[MENU_TREE_KEY.format(user_id=uid.decode()) for uid in user_ids]
+            )
+            pipe.srem(MENU_TREE_USERS_KEY, *user_ids)
+            pipe.execute()
+    except redis.RedisError:
+        logger.error("failed to invalidate menu tree cache", exc_info=True)
+
+
+def invalidate_menu_catalog() -> None:
+    """菜单或按钮定义变更后失效目录读缓存及所有用户的菜单树"""
+    cache.invalidate_namespace(MENU_ROOTS_NAMESPACE)
+    cache.invalidate_namespace(BUTTON_PERMISSIONS_NAMESPACE)
+    cache.invalidate_namespace(BUTTON_BITS_NAMESPACE)
+    invalidate_all_menu_trees()
@@ -0,0 +1,90 @@
+import logging
+from typing import List, Optional
+
+import redis
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from crud.crud_menu import (
+    MENU_TREE_GEN_KEY,
+    MENU_TREE_KEY,
+    MENU_TREE_USER_GEN_KEY,
+    PERMISSION_VERSION_KEY,
+    STORE_IF_CURRENT,
+    assemble_menu_tree_for_row,
+    effective_permissions_from_row,
+    menu_tree_adapter,
+    menu_tree_statements,
+    menu_tree_store_args,
+)
+from db.redis import get_async_redis
+from models.menu import MenuItem, ButtonPermission
+from schemas.menu import UserMenuResponse
+
+logger = logging.getLogger(__name__)
+
+
+async def get_menu_item(db: AsyncSession, menu_item_id: int) -> Optional[MenuItem]:
+    return await db.scalar(select(MenuItem).where(MenuItem.id == menu_item_id))
+
+
+async def get_button_permissions(
+    db: AsyncSession, menu_item_id: Optional[int] = None
+) -> List[ButtonPermission]:
+    stmt = select(ButtonPermission)
+    if menu_item_id:
+        stmt = stmt.where(ButtonPermission.menu_item_id == menu_item_id)
+    return list((await db.scalars(stmt)).all())
+
+
+async def build_user_menu_tree(
+    db: AsyncSession, user_id: int
+) -> List[UserMenuResponse]:
+    """以固定次数的查询构建用户菜单树（异步版本）"""
+    stmts = menu_tree_statements(user_id)
+    row = (await db.execute(stmts.permissions)).first()
+    menus = (await db.execute(stmts.menus)).all()
+    buttons = (await db.execute(stmts.buttons)).all()
+    sources = None
+    if row is not None and effective_permissions_from_row(row) is None:
+        sources = (await db.execute(stmts.sources)).all()
+    return assemble_menu_tree_for_row(user_id, row, menus, buttons, sources)
+
+
+async def get_user_menu_tree_json(db: AsyncSession, user_id: int) -> bytes:
+    """获取用户菜单树的JSON，优先读取Redis缓存（异步版本）"""
+    client = get_async_redis()
+    try:
+        cached = await client.get(MENU_TREE_KEY.format(user_id=user_id))
+        if cached is not None:
+            return cached
+        generations = tuple(
+            gen or b"0"
+            for gen in await client.mget(
+                MENU_TREE_GEN_KEY, MENU_TREE_USER_GEN_KEY.format(user_id=user_id)
+            )
+        )
+    except redis.RedisError:
+        logger.warning("menu tree cache unavailable", exc_info=True)
+        return menu_tree_adapter.dump_json(await build_user_menu_tree(db, user_id))
+
+    payload = menu_tree_adapter.dump_json(await build_user_menu_tree(db, user_id))
+    try:
+        await client.eval(
+            STORE_IF_CURRENT, *menu_tree_store_args(user_id, generations, payload)
+        )
+    except redis.RedisError:
+        logger.warning("failed to store menu tree cache", exc_info=True)
+    return payload
+
+
+async def get_permission_version(user_id: int) -> Optional[int]:
+    """用户当前的权限版本号，未缓存或Redis不可用时返回None"""
+    try:
+        version = await get_async_redis().get(
+            PERMISSION_VERSION_KEY.format(user_id=user_id)
+        )
+    except redis.RedisError:
+        logger.warning("permission version cache unavailable", exc_info=True)
+        return None
+    return int(version) if version is not None else None
@@ -0,0 +1,196 @@
+from sqlalchemy.orm import Session
+from sqlalchemy import delete, insert, select
+from typing import Iterable, List, NamedTuple, Optional
+from crud.crud_menu import (
+    PermissionChanges,
+    materialize_effective_permissions,
+    refresh_permission_caches,
+)
+from models.menu import ButtonPermission, MenuItem
+from models.role import Role, RoleButtonPermission, RoleMenuItem, UserRole
+from schemas.role import RoleCreate, RolePermissions, RoleUpdate
+
+
+class RolePermissionChanges(NamedTuple):
+    """角色授权变更集及因此重算了最终权限的用户"""
+
+    menus: PermissionChanges
+    buttons: PermissionChanges
+    affected_user_ids: List[int]
+
+
+# Role CRUD
+def create_role(db: Session, role: RoleCreate) -> Role:
+    db_role = Role(**role.model_dump())
+    db.add(db_role)
+    db.commit()
+    db.refresh(db_role)
+    return db_role
+
+
+def get_role(db: Session, role_id: int) -> Optional[Role]:
+    return db.query(Role).filter(Role.id == role_id).first()
+
+
+def get_role_by_name(db: Session, name: str) -> Optional[Role]:
+    return db.query(Role).filter(Role.name == name).first()
+
+
+def get_roles(db: Session, skip: int = 0, limit: int = 100) -> List[Role]:
+    return db.query(Role).order_by(Role.id).offset(skip).limit(limit).all()
+
+
+def update_role(db: Session, role_id: int, role_update: RoleUpdate) -> Optional[Role]:
+    db_role = get_role(db, role_id)
+    if not db_role:
+        return None
+
+    for key, value in role_update.model_dump(exclude_unset=True).items():
+        setattr(db_role, key, value)
+
+    db.commit()
+    db.refresh(db_role)
+    return db_role
+
+
+def delete_role(db: Session, role_id: int) -> bool:
+    """删除角色及其授权，并重算原角色成员的最终权限"""
+    db_role = get_role(db, role_id)
+    if not db_role:
+        return False
+
+    user_ids = get_role_user_ids(db, role_id)
+    db.delete(db_role)
+    db.flush()
+    effective = materialize_effective_permissions(db, user_ids)
+    db.commit()
+    refresh_permission_caches(effective)
+    return True
+
+
+def get_role_user_ids(db: Session, role_id: int) -> List[int]:
+    return list(
+        db.scalars(select(UserRole.user_id).where(UserRole.role_id == role_id))
+    )
+
+
+def _check_exist(db: Session, column, keys: Iterable, label: str) -> None:
+    """keys 中有不存在的记录时抛出 ValueError，避免写入悬空的外键"""
+    keys = list(dict.fromkeys(keys))
+    if not keys:
+        return
+    existing = set(db.scalars(select(column).where(column.in_(keys))))
+    missing = [key for key in keys if key not in existing]
+    if missing:
+        raise ValueError(f"Unknown {label}: {', '.join(map(str, missing))}")
+
+
+# Role Permissions
+def _sync_role_grants(
+    db: Session, model, key_column: str, role_id: int, keys: Iterable
+) -> PermissionChanges:
+    """将角色的授权同步为 keys：一条删除语句加一条多行插入"""
+    key = getattr(model, key_column)
+    desired = list(dict.fromkeys(keys))
+    current = set(db.scalars(select(key).where(model.role_id == role_id)))
+    added = [k for k in desired if k not in current]
+    removed = sorted(current.difference(desired))
+
+    if removed:
+        db.execute(delete(model).where(model.role_id == role_id, key.in_(removed)))
+    if added:
+        db.execute(
+            insert(model).values([{"role_id": role_id, key_column: k} for k in added])
+        )
+    return PermissionChanges(added, removed, [])
+
+
+def get_role_permissions(db: Session, role_id: int) -> RolePermissions:
+    return RolePermissions(
+        menu_item_ids=list(
+            db.scalars(
+                select(RoleMenuItem.menu_item_id)
+                .where(RoleMenuItem.role_id == role_id)
+                .order_by(RoleMenuItem.menu_item_id)
+            )
+        ),
+        button_ids=list(
+            db.scalars(
+                select(RoleButtonPermission.button_id)
+                .where(RoleButtonPermission.role_id == role_id)
+                .order_by(RoleButtonPermission.button_id)
+            )
+        ),
+    )
+
+
+def set_role_permissions(
+    db: Session, role_id: int, permissions: RolePermissions
+) -> RolePermissionChanges:
+    """设置角色的菜单与按钮授权，只重算该角色成员的最终权限
+
+    菜单或按钮不存在时抛出 ValueError，不做任何修改。
+    """
+    _check_exist(db, MenuItem.id, permissions.menu_item_ids, "menu item ids")
+    _check_exist(db, ButtonPermission.button_id, permissions.button_ids, "button ids")
+    menu_changes = _sync_role_grants(
+        db, RoleMenuItem, "menu_item_id", role_id, permissions.menu_item_ids
+    )
+    button_changes = _sync_role_grants(
+        db, RoleButtonPermission, "button_id", role_id, permissions.button_ids
+    )
+    user_ids: List[int] = []
+    effective = {}
+    if menu_changes.changed or button_changes.changed:
+        user_ids = get_role_user_ids(db, role_id)
+        effective = materialize_effective_permissions(db, user_ids)
+    db.commit()
+    refresh_permission_caches(effective)
+    return RolePermissionChanges(menu_changes, button_changes, user_ids)
+
+
+# User Roles
+def get_user_roles(db: Session, user_id: int) -> List[Role]:
+    return (
+        db.query(Role)
+        .join(UserRole, UserRole.role_id == Role.id)
+        .filter(UserRole.user_id == user_id)
+        .order_by(Role.id)
+        .all()
+    )
+
+
+def set_user_roles(
+    db: Session, user_id: int, role_ids: Iterable[int]
+) -> PermissionChanges:
+    """设置用户的角色，返回新增与移除的角色ID
+
+    角色不存在时抛出 ValueError，不做任何修改。
+    """
+    desired = list(dict.fromkeys(role_ids))
+    _check_exist(db, Role.id, desired, "role ids")
+    current = set(
+        db.scalars(select(UserRole.role_id).where(UserRole.user_id == user_id))
+    )
+    added = [role_id for role_id in desired if role_id not in current]
+    removed = sorted(current.difference(desired))
+
+    if removed:
+        db.execute(
+            delete(UserRole).where(
+                UserRole.user_id == user_id, UserRole.role_id.in_(removed)
+            )
+        )
+    if added:
+        db.execute(
+            insert(UserRole).values(
+                [{"user_id": user_id, "role_id": role_id} for role_id in added]
+            )
+        )
+    changes = PermissionChanges(added, removed, [])
+    effective = (
+        materialize_effective_permissions(db, [user_id]) if changes.changed else {}
+    )
+    db.commit()
+    refresh_permission_caches(effective)
+    return changes
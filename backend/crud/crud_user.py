@@ -1,9 +1,213 @@
+import json
+import logging
+import threading
+import time
+from collections import OrderedDict
+
+import redis
+from sqlalchemy import select
 from sqlalchemy.orm import Session
+from starlette.concurrency import run_in_threadpool
 from models.user import User
-from schemas.user import UserCreate
-from passlib.context import CryptContext
-
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+from schemas.user import UserCreate, UserUpdate
+from core import cache, security
+from core.config import settings
+from crud import crud_menu
+from db.redis import get_redis
+
+pwd_context = security.pwd_context
+
+logger = logging.getLogger(__name__)
+
+PRINCIPAL_KEY = "principal:{user_id}"
+# Bumped by every invalidation; a load only stores its principal when the
+# generation it read before querying the database is still current
+PRINCIPAL_GEN_KEY = "principal:gen:{user_id}"
+USER_CACHE_NAMESPACE = "user"
+PRINCIPAL_LOCAL_MAX_ENTRIES = 10000
+# Flags that change what a user may see: is_superuser grants every menu
+# and is part of the token permission claims
+PERMISSION_FIELDS = ("is_superuser", "is_active")
+
+
+class Principal:
+    """Authenticated identity, enough to authorize a request without the ORM row."""
+
+    __slots__ = ("id", "email", "is_active", "is_superuser")
+
+    def __init__(self, id: int, email: str, is_active: bool, is_superuser: bool):
+        self.id = id
+        self.email = email
+        self.is_active = is_active
+        self.is_superuser = is_superuser
+
+    @classmethod
+    def from_user(cls, user: User) -> "Principal":
+        return cls(
+            id=user.id,
+            email=user.email,
+            is_active=bool(user.is_active),
+            is_superuser=bool(user.is_superuser),
+        )
+
+    def to_json(self) -> str:
+        return json.dumps([self.id, self.email, self.is_active, self.is_superuser])
+
+    @classmethod
+    def from_json(cls, raw: bytes | str) -> "Principal":
+        return cls(*json.loads(raw))
+
+
+_local_principals: "OrderedDict[int, tuple[float, Principal]]" = OrderedDict()
+_local_principals_lock = threading.Lock()
+
+
+def remember_principal(principal: Principal) -> None:
+    expires_at = time.monotonic() + settings.PRINCIPAL_LOCAL_TTL_SECONDS
+    with _local_principals_lock:
+        _local_principals[principal.id] = (expires_at, principal)
+        _local_principals.move_to_end(principal.id)
+        while len(_local_principals) > PRINCIPAL_LOCAL_MAX_ENTRIES:
+            _local_principals.popitem(last=False)
+
+
+def get_local_principal(user_id: int) -> Principal | None:
+    with _local_principals_lock:
+        entry = _local_principals.get(user_id)
+        if entry is not None:
+            if entry[0] > time.monotonic():
+                return entry[1]
+            del _local_principals[user_id]
+    return None
+
+
+def principal_stmt(user_id: int):
+    return select(User.id, User.email, User.is_active, User.is_superuser).where(
+        User.id == user_id
+    )
+
+
+def principal_from_row(row) -> Principal:
+    return Principal(
+        id=row.id,
+        email=row.email,
+        is_active=bool(row.is_active),
+        is_superuser=bool(row.is_superuser),
+    )
+
+
+STORE_PRINCIPAL_IF_CURRENT = """
+if (redis.call('GET', KEYS[1]) or '0') ~= ARGV[1] then return 0 end
+redis.call('SET', KEYS[2], ARGV[2], 'EX', ARGV[3])
+return 1
+"""
+
+
+def principal_store_args(
+    user_id: int, generation: bytes, principal: Principal
+) -> list:
+    """numkeys, KEYS and ARGV of STORE_PRINCIPAL_IF_CURRENT."""
+    return [
+        2,
+        PRINCIPAL_GEN_KEY.format(user_id=user_id),
+        PRINCIPAL_KEY.format(user_id=user_id),
+        generation,
+        principal.to_json(),
+        settings.PRINCIPAL_CACHE_TTL_SECONDS,
+    ]
+
+
+def forget_local_principal(user_id: int) -> None:
+    with _local_principals_lock:
+        _local_principals.pop(user_id, None)
+
+
+def get_cached_principal(user_id: int) -> Principal | None:
+    """Look up a principal in process memory, then in Redis."""
+    principal = get_local_principal(user_id)
+    if principal is not None:
+        return principal
+    try:
+        raw = get_redis().get(PRINCIPAL_KEY.format(user_id=user_id))
+    except redis.RedisError:
+        logger.warning("principal cache unavailable", exc_info=True)
+        return None
+    if raw is None:
+        return None
+    principal = Principal.from_json(raw)
+    remember_principal(principal)
+    return principal
+
+
+def load_principal(db: Session, user_id: int) -> Principal | None:
+    """Load a principal from the database and populate both cache tiers.
+
+    Nothing is cached when the user was invalidated while the row was being
+    read, since the row may predate the change.
+    """
+    client = get_redis()
+    try:
+        generation = client.get(PRINCIPAL_GEN_KEY.format(user_id=user_id)) or b"0"
+    except redis.RedisError:
+        logger.warning("principal cache unavailable", exc_info=True)
+        generation = None
+    row = db.execute(principal_stmt(user_id)).first()
+    if row is None:
+        return None
+    principal = principal_from_row(row)
+    # Remembered before the store, so an invalidation that lands after the
+    # store still finds and drops the local copy
+    remember_principal(principal)
+    if generation is None:
+        return principal
+    try:
+        stored = client.eval(
+            STORE_PRINCIPAL_IF_CURRENT,
+            *principal_store_args(user_id, generation, principal),
+        )
+    except redis.RedisError:
+        logger.warning("failed to store principal %s", user_id, exc_info=True)
+    else:
+        if not stored:
+            forget_local_principal(user_id)
+    return principal
+
+
+def invalidate_principal(user_id: int) -> None:
+    """Drop a cached principal and cached user row after the user changes.
+
+    Bumping the generation turns away loads that read the row before the
+    change, and the shared copy goes before the published invalidation, so
+    no worker reloads the old principal from Redis.
+    """
+    forget_local_principal(user_id)
+    try:
+        pipe = get_redis().pipeline()
+        pipe.incr(PRINCIPAL_GEN_KEY.format(user_id=user_id))
+        pipe.delete(PRINCIPAL_KEY.format(user_id=user_id))
+        pipe.execute()
+    except redis.RedisError:
+        logger.error("failed to invalidate principal %s", user_id, exc_info=True)
+    cache.invalidate(USER_CACHE_NAMESPACE, str(user_id))
+
+
+def clear_local_principals() -> None:
+    with _local_principals_lock:
+        _local_principals.clear()
+
+
+def _discard_local_principals(keys) -> None:
+    if keys is None:
+        clear_local_principals()
+        return
+    with _local_principals_lock:
+        for key in keys:
+            _local_principals.pop(int(key), None)
+
+
+# invalidate_principal publishes through cache.invalidate, so every worker's
+# listener drops its local copy too, not only the worker that made the change
+cache.on_invalidation(USER_CACHE_NAMESPACE, _discard_local_principals)
 
 
 def get_user_by_email(db: Session, email: str):
@@ -23,7 +227,8 @@ def get_users(db: Session, skip: int = 0, limit: int = 100):
 
 
 def get_password_hash(password: str) -> str:
-    return pwd_context.hash(password)
+    """Hash on the bounded password pool; raises security.PasswordHasherBusy."""
+    return security.get_password_hash_pooled(password)
 
 
 def create_user(db: Session, obj_in: UserCreate, is_superuser: bool = False):
@@ -41,6 +246,7 @@ def create_user(db: Session, obj_in: UserCreate, is_superuser: bool = False):
     db.add(db_user)
     db.commit()
     db.refresh(db_user)
+    invalidate_principal(db_user.id)
     return db_user
 
 
@@ -48,7 +254,22 @@ def authenticate_user(db: Session, email: str, password: str) -> User | None:
     user = get_user_by_email(db, email=email)
     if not user:
         return None
-    if not pwd_context.verify(password, user.hashed_password):
+    if not security.verify_password(password, user.hashed_password):
+        return None
+    return user
+
+
+async def authenticate_user_async(
+    db: Session, email: str, password: str
+) -> User | None:
+    """Like authenticate_user, with bcrypt on the bounded password pool.
+
+    Raises security.PasswordHasherBusy when the pool is saturated.
+    """
+    user = await run_in_threadpool(get_user_by_email, db, email)
+    if not user:
+        return None
+    if not await security.verify_password_async(password, user.hashed_password):
         return None
     return user
 
@@ -57,7 +278,7 @@ def is_active(user: User) -> bool:
     return user.is_active
 
 
-def is_superuser(user: User) -> bool:
+def is_superuser(user: User | Principal) -> bool:
     return user.is_superuser
 
 
@@ -65,13 +286,15 @@ class CRUDUser:
     def get_by_email(self, db: Session, *, email: str) -> User | None:
         return db.query(User).filter(User.email == email).first()
 
-    def create(self, db: Session, *, obj_in: UserCreate) -> User:
+    def create(
+        self, db: Session, *, obj_in: UserCreate, hashed_password: str | None = None
+    ) -> User:
         # Create a dictionary for the database model
         db_obj_data = {
             "email": obj_in.email,
             "full_name": obj_in.full_name,
             "username": obj_in.username or obj_in.email,  # Default username to email
-            "hashed_password": get_password_hash(obj_in.password),
+            "hashed_password": hashed_password or get_password_hash(obj_in.password),
         }
 
         db_obj = User(**db_obj_data)
@@ -79,15 +302,68 @@ class CRUDUser:
         db.add(db_obj)
         db.commit()
         db.refresh(db_obj)
+        invalidate_principal(db_obj.id)
+        return db_obj
+
+    async def create_async(self, db: Session, *, obj_in: UserCreate) -> User:
+        """Like create, awaiting bcrypt on the password pool instead of blocking.
+
+        Raises security.PasswordHasherBusy when the pool is saturated.
+        """
+        hashed_password = await security.get_password_hash_async(obj_in.password)
+        return await run_in_threadpool(
+            self.create, db, obj_in=obj_in, hashed_password=hashed_password
+        )
+
+    def update(self, db: Session, *, db_obj: User, obj_in: UserUpdate) -> User:
+        update_data = obj_in.model_dump(exclude_unset=True)
+        password = update_data.pop("password", None)
+        if password:
+            update_data["hashed_password"] = get_password_hash(password)
+        permissions_changed = any(
+            field in update_data and update_data[field] != getattr(db_obj, field)
+            for field in PERMISSION_FIELDS
+        )
+        for field, value in update_data.items():
+            setattr(db_obj, field, value)
+
+        db.add(db_obj)
+        return self._commit(db, db_obj, permissions_changed)
+
+    def deactivate(self, db: Session, *, db_obj: User) -> User:
+        permissions_changed = db_obj.is_active is not False
+        db_obj.is_active = False
+        db.add(db_obj)
+        return self._commit(db, db_obj, permissions_changed)
+
+    def _commit(self, db: Session, db_obj: User, permissions_changed: bool) -> User:
+        # A new effective-permissions version drops the cached menu tree and
+        # button bitmap and stops tokens carrying the old flags being trusted
+        effective = (
+            crud_menu.materialize_effective_permissions(db, [db_obj.id])
+            if permissions_changed
+            else {}
+        )
+        db.commit()
+        db.refresh(db_obj)
+        invalidate_principal(db_obj.id)
+        crud_menu.refresh_permission_caches(effective)
         return db_obj
 
+    @cache.cached(
+        USER_CACHE_NAMESPACE,
+        ttl=settings.USER_CACHE_TTL_SECONDS,
+        key=lambda self, db, id: str(id),
+        negative_ttl=settings.USER_NEGATIVE_CACHE_TTL_SECONDS,
+        codec=cache.OrmCodec(User, exclude=("hashed_password",)),
+    )
     def get(self, db: Session, id: int) -> User | None:
         return db.query(User).filter(User.id == id).first()
 
     def get_multi(self, db: Session, *, skip: int = 0, limit: int = 100) -> list[User]:
         return db.query(User).offset(skip).limit(limit).all()
 
-    def is_superuser(self, user: User) -> bool:
+    def is_superuser(self, user: User | Principal) -> bool:
         return user.is_superuser
 
 
@@ -0,0 +1,85 @@
+import logging
+
+import redis
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from crud.crud_user import (
+    PRINCIPAL_GEN_KEY,
+    PRINCIPAL_KEY,
+    STORE_PRINCIPAL_IF_CURRENT,
+    Principal,
+    forget_local_principal,
+    get_local_principal,
+    principal_from_row,
+    principal_stmt,
+    principal_store_args,
+    remember_principal,
+)
+from db.redis import get_async_redis
+from models.user import User
+
+logger = logging.getLogger(__name__)
+
+
+async def get_user(db: AsyncSession, user_id: int) -> User | None:
+    return await db.scalar(select(User).where(User.id == user_id))
+
+
+async def get_user_by_email(db: AsyncSession, email: str) -> User | None:
+    return await db.scalar(select(User).where(User.email == email))
+
+
+async def get_users(db: AsyncSession, skip: int = 0, limit: int = 100) -> list[User]:
+    result = await db.scalars(select(User).offset(skip).limit(limit))
+    return list(result.all())
+
+
+async def get_cached_principal(user_id: int) -> Principal | None:
+    """Look up a principal in process memory, then in Redis."""
+    principal = get_local_principal(user_id)
+    if principal is not None:
+        return principal
+    try:
+        raw = await get_async_redis().get(PRINCIPAL_KEY.format(user_id=user_id))
+    except redis.RedisError:
+        logger.warning("principal cache unavailable", exc_info=True)
+        return None
+    if raw is None:
+        return None
+    principal = Principal.from_json(raw)
+    remember_principal(principal)
+    return principal
+
+
+async def load_principal(db: AsyncSession, user_id: int) -> Principal | None:
+    """Load a principal from the database and populate both cache tiers.
+
+    Same generation check as crud_user.load_principal.
+    """
+    client = get_async_redis()
+    try:
+        generation = (
+            await client.get(PRINCIPAL_GEN_KEY.format(user_id=user_id)) or b"0"
+        )
+    except redis.RedisError:
+        logger.warning("principal cache unavailable", exc_info=True)
+        generation = None
+    row = (await db.execute(principal_stmt(user_id))).first()
+    if row is None:
+        return None
+    principal = principal_from_row(row)
+    remember_principal(principal)
+    if generation is None:
+        return principal
+    try:
+        stored = await client.eval(
+            STORE_PRINCIPAL_IF_CURRENT,
+            *principal_store_args(user_id, generation, principal),
+        )
+    except redis.RedisError:
+        logger.warning("failed to store principal %s", user_id, exc_info=True)
+    else:
+        if not stored:
+            forget_local_principal(user_id)
+    return principal
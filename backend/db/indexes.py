@@ -0,0 +1,37 @@
+from typing import List
+
+from sqlalchemy import inspect
+
+
+def find_unindexed_foreign_keys(bind) -> List[str]:
+    """List foreign keys of a live database that no index can serve.
+
+    A foreign key counts as indexed when its columns form the leading columns
+    of an index, unique constraint or primary key; partial indexes do not count.
+    Each entry reads ``table(col, ...) -> referred_table``.
+    """
+    inspector = inspect(bind)
+    unindexed = []
+    for table in inspector.get_table_names():
+        leading = [
+            index["column_names"]
+            for index in inspector.get_indexes(table)
+            if not any(
+                option.endswith("_where") and value is not None
+                for option, value in index.get("dialect_options", {}).items()
+            )
+        ]
+        leading += [
+            constraint["column_names"]
+            for constraint in inspector.get_unique_constraints(table)
+        ]
+        leading.append(inspector.get_pk_constraint(table)["constrained_columns"])
+        for fk in inspector.get_foreign_keys(table):
+            columns = fk["constrained_columns"]
+            if not any(
+                set(candidate[: len(columns)]) == set(columns) for candidate in leading
+            ):
+                unindexed.append(
+                    f"{table}({', '.join(columns)}) -> {fk['referred_table']}"
+                )
+    return sorted(unindexed)
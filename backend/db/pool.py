@@ -0,0 +1,152 @@
+"""Database connection pool configuration and instrumentation.
+
+Every engine (primary, async and replicas) is built from ``engine_options`` so
+pool size, overflow, timeout, recycle and the pre-ping strategy all come from
+``Settings``:
+
+- ``always``: SQLAlchemy's ``pool_pre_ping``, one round trip per checkout.
+- ``idle``: ping only connections that sat in the pool longer than
+  ``DATABASE_POOL_PING_IDLE_SECONDS``; connections in steady use skip the
+  round trip, while ones the server or a proxy may have dropped are checked.
+- ``never``: no ping; rely on ``DATABASE_POOL_RECYCLE`` and the disconnect
+  handling of the failing statement.
+
+The queue pools record wait time (getting a pool entry, including opening an
+overflow connection) and checkout latency (the whole checkout, including any
+ping), plus timeouts, for the metrics endpoint.
+"""
+
+import time
+from typing import Any, Dict, Tuple
+
+from sqlalchemy import event, exc
+from sqlalchemy.engine import Engine, make_url
+from sqlalchemy.pool import AsyncAdaptedQueuePool, QueuePool
+
+from core.config import settings
+from core.metrics import LatencyRecorder
+
+# Upper bounds (ms) of the checkout latency histogram buckets
+LATENCY_BUCKETS_MS: Tuple[float, ...] = (1, 5, 10, 50, 100, 500, 1000)
+
+_CHECKED_IN_AT = "checked_in_at"
+
+
+class DatabasePoolStats:
+    """Wait times, checkout latencies and timeouts of one engine's pool."""
+
+    def __init__(self) -> None:
+        self.wait = LatencyRecorder()
+        self.checkout = LatencyRecorder()
+        self.timeouts = 0
+
+    def report(self, pool: QueuePool) -> Dict[str, Any]:
+        return {
+            "size": pool.size(),
+            "max_overflow": pool._max_overflow,
+            "checked_out": pool.checkedout(),
+            "overflow": max(pool.overflow(), 0),
+            "timeouts": self.timeouts,
+            "checkouts": self.checkout.count,
+            "wait": self.wait.percentiles(),
+            "checkout_latency": self.checkout.percentiles(),
+            "checkout_histogram": self.checkout.histogram(LATENCY_BUCKETS_MS),
+        }
+
+
+class _InstrumentedPoolMixin:
+    stats: DatabasePoolStats
+
+    def __init__(self, *args: Any, **kwargs: Any) -> None:
+        super().__init__(*args, **kwargs)
+        self.stats = DatabasePoolStats()
+
+    def recreate(self):
+        # dispose() and invalidation replace the pool; keep the statistics
+        pool = super().recreate()
+        pool.stats = self.stats
+        return pool
+
+    def _do_get(self):
+        started = time.perf_counter()
+        try:
+            return super()._do_get()
+        except exc.TimeoutError:
+            self.stats.timeouts += 1
+            raise
+        finally:
+            self.stats.wait.observe(time.perf_counter() - started)
+
+    def connect(self):
+        started = time.perf_counter()
+        connection = super().connect()
+        self.stats.checkout.observe(time.perf_counter() - started)
+        return connection
+
+
+class InstrumentedQueuePool(_InstrumentedPoolMixin, QueuePool):
+    pass
+
+
+class InstrumentedAsyncQueuePool(_InstrumentedPoolMixin, AsyncAdaptedQueuePool):
+    pass
+
+
+def _is_memory_sqlite(url: str) -> bool:
+    parsed = make_url(url)
+    return parsed.get_backend_name() == "sqlite" and parsed.database in (
+        None,
+        "",
+        ":memory:",
+    )
+
+
+def engine_options(url: str, asynchronous: bool = False) -> Dict[str, Any]:
+    """Keyword arguments for ``create_engine``/``create_async_engine``."""
+    options: Dict[str, Any] = {
+        "pool_pre_ping": settings.DATABASE_POOL_PRE_PING == "always",
+    }
+    # In-memory SQLite needs its single-connection pool
+    if _is_memory_sqlite(url):
+        return options
+    options.update(
+        poolclass=InstrumentedAsyncQueuePool if asynchronous else InstrumentedQueuePool,
+        pool_size=settings.DATABASE_POOL_SIZE,
+        max_overflow=settings.DATABASE_MAX_OVERFLOW,
+        pool_timeout=settings.DATABASE_POOL_TIMEOUT,
+        pool_recycle=settings.DATABASE_POOL_RECYCLE,
+    )
+    return options
+
+
+def configure_engine(engine: Engine) -> Engine:
+    """Install the ``idle`` pre-ping strategy on a (sync) engine's pool."""
+    if settings.DATABASE_POOL_PRE_PING != "idle":
+        return engine
+    dialect = engine.dialect
+
+    @event.listens_for(engine.pool, "checkin")
+    def _checkin(dbapi_connection, connection_record):
+        connection_record.info[_CHECKED_IN_AT] = time.monotonic()
+
+    @event.listens_for(engine.pool, "checkout")
+    def _checkout(dbapi_connection, connection_record, connection_proxy):
+        checked_in_at = connection_record.info.pop(_CHECKED_IN_AT, None)
+        if checked_in_at is None:
+            return
+        if time.monotonic() - checked_in_at < settings.DATABASE_POOL_PING_IDLE_SECONDS:
+            return
+        try:
+            dialect.do_ping(dbapi_connection)
+        except Exception as error:
+            # The pool discards the connection and checks out another one
+            raise exc.DisconnectionError(f"idle connection failed ping: {error}")
+
+    return engine
+
+
+def pool_report(engine: Engine) -> Dict[str, Any]:
+    pool = engine.pool
+    if isinstance(pool, _InstrumentedPoolMixin):
+        return pool.stats.report(pool)
+    return {"status": pool.status()}
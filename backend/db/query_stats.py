@@ -0,0 +1,135 @@
+"""Per-request SQL statement accounting.
+
+Listeners on every ``Engine`` (sync and the sync side of async engines) record
+each cursor execution into the collectors active in the current context. The
+HTTP middleware in ``main.py`` opens one collector per request; tests open their
+own around a block of requests (see the ``query_budget`` fixture). Collectors
+nest, so a statement is counted by every enclosing ``track()``.
+
+Pool checkouts are counted the same way, so a test can assert that an endpoint
+served from cache never touches a connection.
+
+Statements are grouped by shape: the SQL text with whitespace normalized and
+placeholder lists such as ``IN (?, ?, ?)`` collapsed, so the same query issued
+once per row of a parent result shows up as one shape repeated N times.
+"""
+
+import logging
+import re
+import time
+from collections import Counter
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Dict, Iterator, Tuple
+
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+from sqlalchemy.pool import Pool
+
+from core.config import settings
+
+logger = logging.getLogger(__name__)
+
+_PARAM = r"(?:\?|%\(\w+\)s|%s|\$\d+|:\w+)"
+_PARAM_LIST = re.compile(rf"\(\s*{_PARAM}(?:\s*,\s*{_PARAM})*\s*\)")
+_GROUP_LIST = re.compile(r"\(\?\)(?:\s*,\s*\(\?\))+")
+
+
+def statement_shape(statement: str) -> str:
+    shape = _PARAM_LIST.sub("(?)", " ".join(statement.split()))
+    return _GROUP_LIST.sub("(?)", shape)
+
+
+class QueryStats:
+    """Statement count, total execution time, per-shape and pool checkout counts."""
+
+    def __init__(self) -> None:
+        self.count = 0
+        self.checkouts = 0
+        self.duration = 0.0
+        self.shapes: Counter = Counter()
+
+    def record(self, shape: str, seconds: float) -> None:
+        self.count += 1
+        self.duration += seconds
+        self.shapes[shape] += 1
+
+    @property
+    def max_repeats(self) -> int:
+        return max(self.shapes.values(), default=0)
+
+    def repeated(self, threshold: int = 2) -> Dict[str, int]:
+        """Shapes executed at least ``threshold`` times, most frequent first."""
+        return {
+            shape: count
+            for shape, count in self.shapes.most_common()
+            if count >= threshold
+        }
+
+    def server_timing(self) -> str:
+        return f'db;dur={self.duration * 1000:.1f};desc="{self.count} queries"'
+
+
+_collectors: ContextVar[Tuple[QueryStats, ...]] = ContextVar(
+    "query_stats_collectors", default=()
+)
+
+
+@contextmanager
+def track() -> Iterator[QueryStats]:
+    """Collect the statements executed in the current context until exit."""
+    stats = QueryStats()
+    token = _collectors.set(_collectors.get() + (stats,))
+    try:
+        yield stats
+    finally:
+        _collectors.reset(token)
+
+
+@event.listens_for(Engine, "before_cursor_execute")
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    if context is not None and _collectors.get():
+        context._query_stats_started = time.perf_counter()
+
+
+@event.listens_for(Engine, "after_cursor_execute")
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    started = getattr(context, "_query_stats_started", None)
+    if started is None:
+        return
+    elapsed = time.perf_counter() - started
+    shape = statement_shape(statement)
+    for stats in _collectors.get():
+        stats.record(shape, elapsed)
+
+
+@event.listens_for(Pool, "checkout")
+def _on_checkout(dbapi_connection, connection_record, connection_proxy):
+    for stats in _collectors.get():
+        stats.checkouts += 1
+
+
+def log_request(method: str, path: str, stats: QueryStats) -> None:
+    """Log a request's statement totals, warning when a shape repeats too often."""
+    if not stats.count:
+        return
+    repeated = stats.repeated(settings.QUERY_REPEAT_WARN_THRESHOLD)
+    if repeated:
+        shape, count = next(iter(repeated.items()))
+        logger.warning(
+            "%s %s: %d queries in %.1f ms, possible N+1: %d x %s",
+            method,
+            path,
+            stats.count,
+            stats.duration * 1000,
+            count,
+            shape,
+        )
+    else:
+        logger.info(
+            "%s %s: %d queries in %.1f ms",
+            method,
+            path,
+            stats.count,
+            stats.duration * 1000,
+        )
@@ -0,0 +1,120 @@
+import time
+from typing import Any, Dict, Optional
+
+import redis
+import redis.asyncio as aioredis
+
+from core.config import settings
+from core.metrics import LatencyRecorder
+
+
+def _connection_kwargs() -> Dict[str, Any]:
+    return {
+        "host": settings.REDIS_HOST,
+        "port": settings.REDIS_PORT,
+        "db": 0,
+        "max_connections": settings.REDIS_MAX_CONNECTIONS,
+        "timeout": settings.REDIS_POOL_TIMEOUT,
+        "socket_connect_timeout": settings.REDIS_SOCKET_CONNECT_TIMEOUT,
+        "socket_timeout": settings.REDIS_SOCKET_TIMEOUT,
+        "health_check_interval": settings.REDIS_HEALTH_CHECK_INTERVAL,
+    }
+
+
+class PoolStats:
+    """Checkout wait times and exhaustion count of one Redis connection pool."""
+
+    def __init__(self) -> None:
+        self.wait = LatencyRecorder()
+        self.exhausted = 0
+
+    def report(self, in_use: int, max_connections: int) -> Dict[str, Any]:
+        return {
+            "in_use": in_use,
+            "max_connections": max_connections,
+            "exhausted": self.exhausted,
+            "wait": self.wait.percentiles(),
+        }
+
+
+class InstrumentedBlockingConnectionPool(redis.BlockingConnectionPool):
+    """Sync pool that records how long callers wait for a connection."""
+
+    def __init__(self, **kwargs: Any) -> None:
+        super().__init__(**kwargs)
+        self.stats = PoolStats()
+
+    def get_connection(self, *args: Any, **kwargs: Any):
+        started = time.perf_counter()
+        try:
+            return super().get_connection(*args, **kwargs)
+        except redis.ConnectionError:
+            self.stats.exhausted += self.pool.empty()
+            raise
+        finally:
+            self.stats.wait.observe(time.perf_counter() - started)
+
+    def report(self) -> Dict[str, Any]:
+        in_use = self.max_connections - self.pool.qsize()
+        return self.stats.report(in_use, self.max_connections)
+
+
+class InstrumentedAsyncBlockingConnectionPool(aioredis.BlockingConnectionPool):
+    """asyncio pool that records how long callers wait for a connection."""
+
+    def __init__(self, **kwargs: Any) -> None:
+        super().__init__(**kwargs)
+        self.stats = PoolStats()
+
+    async def get_connection(self, *args: Any, **kwargs: Any):
+        started = time.perf_counter()
+        try:
+            return await super().get_connection(*args, **kwargs)
+        except redis.ConnectionError:
+            self.stats.exhausted += not self.can_get_connection()
+            raise
+        finally:
+            self.stats.wait.observe(time.perf_counter() - started)
+
+    def report(self) -> Dict[str, Any]:
+        return self.stats.report(len(self._in_use_connections), self.max_connections)
+
+
+# The sync client serves code running in the threadpool (sync endpoints and
+# crud write paths); async endpoints use the asyncio client created in the
+# application lifespan so Redis calls never block the event loop.
+redis_client = redis.Redis(
+    connection_pool=InstrumentedBlockingConnectionPool(**_connection_kwargs())
+)
+async_redis_client: Optional[aioredis.Redis] = None
+
+
+def get_redis() -> redis.Redis:
+    """获取同步Redis客户端"""
+    return redis_client
+
+
+def get_async_redis() -> aioredis.Redis:
+    """获取异步Redis客户端，未在应用生命周期中初始化时按需创建"""
+    global async_redis_client
+    if async_redis_client is None:
+        async_redis_client = aioredis.Redis(
+            connection_pool=InstrumentedAsyncBlockingConnectionPool(
+                **_connection_kwargs()
+            )
+        )
+    return async_redis_client
+
+
+async def close_async_redis() -> None:
+    global async_redis_client
+    if async_redis_client is not None:
+        await async_redis_client.aclose()
+        async_redis_client = None
+
+
+def redis_pool_stats() -> Dict[str, Any]:
+    stats = {"sync": get_redis().connection_pool.report()}
+    if async_redis_client is not None:
+        stats["async"] = async_redis_client.connection_pool.report()
+    return stats
@@ -0,0 +1,262 @@
+"""Read-replica routing.
+
+``DATABASE_REPLICA_URLS`` lists streaming replicas of ``DATABASE_URL``. Read-only
+endpoints take their session from ``deps.get_read_db``/``deps.get_async_read_db``,
+which hand out replicas round-robin and skip any whose last measured replication
+lag exceeds ``REPLICA_MAX_LAG_SECONDS`` or whose lag probe failed; with no usable
+replica they fall back to the primary. Lag is measured by ``replica_monitor``, a
+background thread started in the application lifespan, so choosing a replica
+never costs a round trip.
+
+Read-your-writes: after a write, the data it touched is marked recent for
+``READ_YOUR_WRITES_SECONDS`` (a Redis key per scope, see ``mark_recent_write``).
+Reads covering a recent scope go to the primary. Scopes are a user's own data
+(``user_scope``) and the menu catalog (``CATALOG_SCOPE``); a permission change
+marks every affected user, so a menu tree rebuilt right after it is never cached
+from a lagging replica.
+"""
+
+import itertools
+import logging
+import threading
+from typing import Any, Dict, List, Optional
+
+import redis
+from sqlalchemy import create_engine, text
+from sqlalchemy.engine import make_url
+from sqlalchemy.exc import SQLAlchemyError
+from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine
+from sqlalchemy.orm import Session, sessionmaker
+from sqlalchemy.util import await_only
+
+from core.config import settings
+from db.pool import configure_engine, engine_options, pool_report
+from db.redis import get_async_redis, get_redis
+from db.session import SessionLocal, async_database_url, async_engine
+
+logger = logging.getLogger(__name__)
+
+RECENT_WRITE_KEY = "replica:recent-write:{scope}"
+CATALOG_SCOPE = "catalog"
+
+_ROUTE = "replica_route"
+
+# Zero while the replica has replayed everything it received; otherwise the age
+# of the last replayed transaction. Comparing LSNs first keeps an idle primary
+# (no new transactions to replay) from looking like lag.
+POSTGRES_LAG_SQL = text(
+    "SELECT CASE WHEN pg_last_wal_receive_lsn() = pg_last_wal_replay_lsn() THEN 0 "
+    "ELSE COALESCE(EXTRACT(EPOCH FROM now() - pg_last_xact_replay_timestamp()), 0) "
+    "END"
+)
+
+
+def user_scope(user_id: int) -> str:
+    return f"user:{user_id}"
+
+
+class Replica:
+    """Sync and async engines of one replica plus its last measured lag."""
+
+    def __init__(self, url: str) -> None:
+        self.name = make_url(url).render_as_string(hide_password=True)
+        self.engine = configure_engine(create_engine(url, **engine_options(url)))
+        self.async_engine = create_async_engine(
+            async_database_url(url), **engine_options(url, asynchronous=True)
+        )
+        configure_engine(self.async_engine.sync_engine)
+        self.session = sessionmaker(autocommit=False, autoflush=False, bind=self.engine)
+        # None until the first probe: an unmeasured replica is assumed current
+        self.lag: Optional[float] = None
+        self.available = True
+        self.reads = 0
+
+    def probe(self) -> None:
+        try:
+            with self.engine.connect() as conn:
+                if conn.dialect.name == "postgresql":
+                    lag = float(conn.execute(POSTGRES_LAG_SQL).scalar_one())
+                else:
+                    lag = 0.0
+        except SQLAlchemyError as exc:
+            if self.available:
+                logger.warning("replica %s unavailable: %s", self.name, exc)
+            self.available = False
+            return
+        self.lag = lag
+        self.available = lag <= settings.REPLICA_MAX_LAG_SECONDS
+        if not self.available:
+            logger.warning("replica %s lagging by %.1f s", self.name, lag)
+
+    def report(self) -> Dict[str, Any]:
+        return {
+            "name": self.name,
+            "lag": self.lag,
+            "available": self.available,
+            "reads": self.reads,
+            "pool": pool_report(self.engine),
+            "async_pool": pool_report(self.async_engine.sync_engine),
+        }
+
+    async def dispose(self) -> None:
+        self.engine.dispose()
+        await self.async_engine.dispose()
+
+
+class _RoutedReadSession(Session):
+    """Sync side of an async read session that picks its engine on first use.
+
+    ``get_bind`` runs inside the AsyncSession's greenlet, so the route can
+    await the read-your-writes check there; a session that never queries never
+    makes the check.
+    """
+
+    def get_bind(self, *args: Any, **kwargs: Any):
+        if self.bind is None:
+            self.bind = self.info.pop(_ROUTE)()
+        return super().get_bind(*args, **kwargs)
+
+
+class ReplicaRouter:
+    """Round-robin over the currently available replicas."""
+
+    def __init__(self, urls: List[str]) -> None:
+        self.replicas = [Replica(url) for url in urls]
+        self._turn = itertools.count()
+        self.primary_reads = 0
+
+    def choose(self) -> Optional[Replica]:
+        """Next available replica, or None when reads must go to the primary."""
+        if self.replicas:
+            start = next(self._turn)
+            for offset in range(len(self.replicas)):
+                replica = self.replicas[(start + offset) % len(self.replicas)]
+                if replica.available:
+                    replica.reads += 1
+                    return replica
+        self.primary_reads += 1
+        return None
+
+    def session(self, primary: bool = False):
+        replica = None if primary else self.choose()
+        return replica.session() if replica is not None else SessionLocal()
+
+    def async_session(self, *scopes: str) -> AsyncSession:
+        """Async read session routed on its first query: to the primary if any
+        scope was written recently, otherwise to a replica."""
+
+        def route():
+            primary = await_only(wrote_recently_async(*scopes))
+            replica = None if primary else self.choose()
+            engine = replica.async_engine if replica is not None else async_engine
+            return engine.sync_engine
+
+        return AsyncSession(
+            sync_session_class=_RoutedReadSession,
+            info={_ROUTE: route},
+            autoflush=False,
+            expire_on_commit=False,
+        )
+
+    def probe(self) -> None:
+        for replica in self.replicas:
+            replica.probe()
+
+    def report(self) -> Dict[str, Any]:
+        return {
+            "primary_reads": self.primary_reads,
+            "replicas": [replica.report() for replica in self.replicas],
+        }
+
+    async def dispose(self) -> None:
+        for replica in self.replicas:
+            await replica.dispose()
+
+
+replica_router = ReplicaRouter(settings.DATABASE_REPLICA_URLS)
+
+
+class ReplicaMonitor:
+    """Background thread probing replica lag every REPLICA_LAG_CHECK_INTERVAL_SECONDS."""
+
+    def __init__(self) -> None:
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def start(self) -> None:
+        if self._thread is not None or not replica_router.replicas:
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(
+            target=self._run, name="replica-monitor", daemon=True
+        )
+        self._thread.start()
+
+    def stop(self) -> None:
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout=5)
+            self._thread = None
+
+    def _run(self) -> None:
+        while not self._stop.is_set():
+            replica_router.probe()
+            self._stop.wait(settings.REPLICA_LAG_CHECK_INTERVAL_SECONDS)
+
+
+replica_monitor = ReplicaMonitor()
+
+
+def _recent_write_keys(scopes) -> List[str]:
+    return [RECENT_WRITE_KEY.format(scope=scope) for scope in scopes]
+
+
+def queue_mark_recent_write(pipe, *scopes: str) -> None:
+    """Queue read-your-writes marks on a pipeline; a no-op without replicas."""
+    if not replica_router.replicas:
+        return
+    for key in _recent_write_keys(scopes):
+        pipe.set(key, 1, ex=settings.READ_YOUR_WRITES_SECONDS)
+
+
+def mark_recent_write(*scopes: str) -> None:
+    if not replica_router.replicas:
+        return
+    try:
+        pipe = get_redis().pipeline()
+        queue_mark_recent_write(pipe, *scopes)
+        pipe.execute()
+    except redis.RedisError:
+        logger.warning("failed to mark recent write of %s", scopes, exc_info=True)
+
+
+async def mark_recent_write_async(*scopes: str) -> None:
+    if not replica_router.replicas:
+        return
+    try:
+        async with get_async_redis().pipeline(transaction=False) as pipe:
+            queue_mark_recent_write(pipe, *scopes)
+            await pipe.execute()
+    except redis.RedisError:
+        logger.warning("failed to mark recent write of %s", scopes, exc_info=True)
+
+
+def wrote_recently(*scopes: str) -> bool:
+    """Whether any scope was written within the window; True if Redis is down."""
+    if not replica_router.replicas:
+        return False
+    try:
+        return bool(get_redis().exists(*_recent_write_keys(scopes)))
+    except redis.RedisError:
+        logger.warning("read-your-writes check unavailable", exc_info=True)
+        return True
+
+
+async def wrote_recently_async(*scopes: str) -> bool:
+    if not replica_router.replicas:
+        return False
+    try:
+        return bool(await get_async_redis().exists(*_recent_write_keys(scopes)))
+    except redis.RedisError:
+        logger.warning("read-your-writes check unavailable", exc_info=True)
+        return True
@@ -1,16 +1,177 @@
-from sqlalchemy import create_engine
-from sqlalchemy.orm import sessionmaker
+from typing import Any, Callable, Dict, Optional
+
+import anyio
+from sqlalchemy import create_engine, event
+from sqlalchemy.engine import make_url
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
+from sqlalchemy.orm import Session, sessionmaker
 
 from core.config import settings
+from db.pool import configure_engine, engine_options, pool_report
 
-engine = create_engine(settings.DATABASE_URL, pool_pre_ping=True)
+engine = configure_engine(
+    create_engine(settings.DATABASE_URL, **engine_options(settings.DATABASE_URL))
+)
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
+ASYNC_DRIVERS = {"postgresql": "postgresql+asyncpg", "sqlite": "sqlite+aiosqlite"}
+
+
+def async_database_url(url: str) -> str:
+    """把同步数据库URL转换为对应的异步驱动URL"""
+    parsed = make_url(url)
+    drivername = ASYNC_DRIVERS.get(parsed.get_backend_name(), parsed.drivername)
+    return parsed.set(drivername=drivername).render_as_string(hide_password=False)
+
+
+async_engine = create_async_engine(
+    async_database_url(settings.DATABASE_URL),
+    **engine_options(settings.DATABASE_URL, asynchronous=True),
+)
+configure_engine(async_engine.sync_engine)
+AsyncSessionLocal = async_sessionmaker(
+    bind=async_engine, class_=AsyncSession, autoflush=False, expire_on_commit=False
+)
+
+
+def db_pool_stats() -> Dict[str, Any]:
+    return {
+        "sync": pool_report(engine),
+        "async": pool_report(async_engine.sync_engine),
+    }
+
+
+# 事务内发生过 flush 的会话不能由 release() 提前提交
+_WROTE = "lazy_session_wrote"
+
+
+@event.listens_for(Session, "after_flush")
+def _mark_written(session, flush_context):
+    session.info[_WROTE] = True
+
+
+@event.listens_for(Session, "after_commit")
+@event.listens_for(Session, "after_rollback")
+def _clear_written(session):
+    session.info.pop(_WROTE, None)
+
+
+def _is_read_only(session: Session) -> bool:
+    return not (
+        session.info.get(_WROTE) or session.new or session.dirty or session.deleted
+    )
+
+
+class LazySession:
+    """数据库会话代理：首次访问属性时才创建会话，未使用时不占用连接池
+
+    release() 在只读事务上提前提交（不过期已加载对象），把连接归还连接池；
+    之后的访问会自动开启新事务。有未提交写入时不做任何事，由关闭时回滚。
+    """
+
+    def __init__(self, factory: Callable[[], Session]) -> None:
+        self._factory = factory
+        self._session: Optional[Session] = None
+
+    @property
+    def session(self) -> Session:
+        if self._session is None:
+            self._session = self._factory()
+        return self._session
+
+    @property
+    def created(self) -> bool:
+        return self._session is not None
+
+    def __getattr__(self, name: str) -> Any:
+        return getattr(self.session, name)
 
-def get_db():
-    """获取数据库会话"""
-    db = SessionLocal()
+    def release(self) -> None:
+        session = self._session
+        if session is None or not session.in_transaction():
+            return
+        if not _is_read_only(session):
+            return
+        expire_on_commit = session.expire_on_commit
+        session.expire_on_commit = False
+        try:
+            session.commit()
+        finally:
+            session.expire_on_commit = expire_on_commit
+
+    def close(self) -> None:
+        if self._session is not None:
+            self._session.close()
+
+
+class LazyAsyncSession:
+    """异步数据库会话代理，行为与 LazySession 相同"""
+
+    def __init__(self, factory: Callable[[], AsyncSession]) -> None:
+        self._factory = factory
+        self._session: Optional[AsyncSession] = None
+
+    @property
+    def session(self) -> AsyncSession:
+        if self._session is None:
+            self._session = self._factory()
+        return self._session
+
+    @property
+    def created(self) -> bool:
+        return self._session is not None
+
+    def __getattr__(self, name: str) -> Any:
+        return getattr(self.session, name)
+
+    async def release(self) -> None:
+        session = self._session
+        if session is None or not session.in_transaction():
+            return
+        sync_session = session.sync_session
+        if not _is_read_only(sync_session):
+            return
+        expire_on_commit = sync_session.expire_on_commit
+        sync_session.expire_on_commit = False
+        try:
+            await session.commit()
+        finally:
+            sync_session.expire_on_commit = expire_on_commit
+
+    async def close(self) -> None:
+        if self._session is not None:
+            await self._session.close()
+
+
+async def release_lazy_session(db: LazySession) -> None:
+    if db.created and db.session.in_transaction():
+        # 提交只读事务是一次阻塞的数据库往返，同样放到线程池中
+        await anyio.to_thread.run_sync(db.release)
+
+
+async def close_lazy_session(db: LazySession) -> None:
+    if not db.created:
+        return
+    if db.session.in_transaction():
+        # 归还连接需要一次回滚，放到线程池中避免阻塞事件循环
+        await anyio.to_thread.run_sync(db.close)
+    else:
+        db.close()
+
+
+async def get_db():
+    """获取数据库会话（首次使用时才创建，见 LazySession）"""
+    db = LazySession(SessionLocal)
     try:
         yield db
     finally:
-        db.close()
+        await close_lazy_session(db)
+
+
+async def get_async_db():
+    """获取异步数据库会话（首次使用时才创建）"""
+    db = LazyAsyncSession(AsyncSessionLocal)
+    try:
+        yield db
+    finally:
+        await db.close()
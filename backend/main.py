@@ -1,21 +1,31 @@
-from fastapi import FastAPI
+from fastapi import FastAPI, Request
 from starlette.middleware.cors import CORSMiddleware
-import redis
 from contextlib import asynccontextmanager
 
+from api import deps
 from api.api import api_router
-from core.config import settings
+from core.cache import invalidation_listener
+from db import query_stats, replicas
+from db.redis import close_async_redis, get_async_redis, get_redis
+from db.session import async_engine
 
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
-    app.state.redis = redis.Redis(
-        host=settings.REDIS_HOST, port=settings.REDIS_PORT, db=0
-    )
+    app.state.redis = get_async_redis()
+    invalidation_listener.start()
+    replicas.replica_monitor.start()
     yield
-    app.state.redis.close()
+    replicas.replica_monitor.stop()
+    invalidation_listener.stop()
+    await close_async_redis()
+    get_redis().close()
+    await async_engine.dispose()
+    await replicas.replica_router.dispose()
 
 
+SAFE_METHODS = frozenset({"GET", "HEAD", "OPTIONS"})
+
 app = FastAPI(title="Cat Expense Tracker API", version="0.1.0", lifespan=lifespan)
 
 # Set all CORS enabled origins
@@ -25,8 +35,30 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["X-Next-Cursor"],
 )
 
+
+@app.middleware("http")
+async def record_query_stats(request: Request, call_next):
+    with query_stats.track() as stats:
+        response = await call_next(request)
+    response.headers["Server-Timing"] = stats.server_timing()
+    query_stats.log_request(request.method, request.url.path, stats)
+    return response
+
+
+@app.middleware("http")
+async def mark_user_writes(request: Request, call_next):
+    """Open the caller's read-your-writes window after any non-read request."""
+    response = await call_next(request)
+    if request.method not in SAFE_METHODS and replicas.replica_router.replicas:
+        user_id = deps.token_user_id(request)
+        if user_id is not None:
+            await replicas.mark_recent_write_async(replicas.user_scope(user_id))
+    return response
+
+
 app.include_router(api_router, prefix="/api/v1")
 
 
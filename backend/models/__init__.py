@@ -1,3 +1,10 @@
 from .user import User
-from .expense import Expense
+from .expense import Expense, ExpenseDailyRollup
 from .menu import MenuItem, UserMenuItem, ButtonPermission, UserButtonPermission
+from .role import (
+    Role,
+    RoleMenuItem,
+    RoleButtonPermission,
+    UserRole,
+    UserEffectivePermission,
+)
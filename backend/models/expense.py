@@ -1,4 +1,13 @@
-from sqlalchemy import Column, Integer, String, Float, DateTime, ForeignKey
+from sqlalchemy import (
+    Column,
+    Integer,
+    String,
+    Float,
+    Date,
+    DateTime,
+    ForeignKey,
+    Index,
+)
 from sqlalchemy.orm import relationship
 from db.base import Base
 import datetime
@@ -12,4 +21,26 @@ class Expense(Base):
     date = Column(DateTime, default=datetime.datetime.utcnow)
     owner_id = Column(Integer, ForeignKey("users.id"))
 
-    owner = relationship("User") 
\ No newline at end of file
+    owner = relationship("User")
+
+    __table_args__ = (
+        # Serves keyset pagination of an owner's expenses by (date desc, id desc)
+        Index("ix_expenses_owner_id_date_id", "owner_id", "date", "id"),
+    ) 
+
+
+class ExpenseDailyRollup(Base):
+    """Per-owner totals for each (day, description) bucket.
+
+    Maintained by crud_expense in the same transaction as the expense write,
+    so summaries read O(buckets) rows instead of scanning expenses.
+    A missing description is stored as an empty string.
+    """
+
+    __tablename__ = "expense_daily_rollups"
+
+    owner_id = Column(Integer, ForeignKey("users.id"), primary_key=True)
+    day = Column(Date, primary_key=True)
+    description = Column(String, primary_key=True, default="")
+    total = Column(Float, nullable=False, default=0)
+    count = Column(Integer, nullable=False, default=0)
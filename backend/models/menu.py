@@ -1,11 +1,37 @@
-from sqlalchemy import Column, Integer, String, Boolean, DateTime, ForeignKey
-from sqlalchemy.orm import relationship
+from sqlalchemy import (
+    Column,
+    Integer,
+    String,
+    Boolean,
+    DateTime,
+    ForeignKey,
+    Index,
+    UniqueConstraint,
+    event,
+    literal,
+    select,
+    text,
+    update,
+)
+from sqlalchemy.orm import Session, attributes, relationship
 from sqlalchemy.sql import func
 from db.base import Base
 
 
 class MenuItem(Base):
     __tablename__ = "menu_items"
+    __table_args__ = (
+        Index("ix_menu_items_parent_id_order", "parent_id", "order"),
+        Index("ix_menu_items_path_order", "path", "order"),
+        # 只含启用菜单的部分索引，服务于默认的目录加载
+        Index(
+            "ix_menu_items_active_path_order",
+            "path",
+            "order",
+            postgresql_where=text("is_active"),
+            sqlite_where=text("is_active = 1"),
+        ),
+    )
 
     id = Column(Integer, primary_key=True, index=True)
     title = Column(String(50), nullable=False)
@@ -15,6 +41,10 @@ class MenuItem(Base):
     order = Column(Integer, nullable=False, default=0)
     is_active = Column(Boolean, nullable=False, default=True)
     created_at = Column(DateTime, nullable=False, default=func.now())
+    # 在用户权限位图中的位置，插入时自动分配
+    bit_index = Column(Integer, nullable=False, unique=True)
+    # 物化路径: 祖先ID序列（根节点为 "/"，其子节点为 "/1/"），插入与移动时自动维护
+    path = Column(String(255), nullable=False, default="/")
 
     # 自引用关系
     parent = relationship("MenuItem", remote_side=[id], back_populates="children")
@@ -29,10 +59,17 @@ class MenuItem(Base):
 
 class UserMenuItem(Base):
     __tablename__ = "user_menu_items"
+    __table_args__ = (
+        UniqueConstraint(
+            "user_id", "menu_item_id", name="uq_user_menu_items_user_id_menu_item_id"
+        ),
+    )
 
     id = Column(Integer, primary_key=True, index=True)
     user_id = Column(Integer, ForeignKey("users.id"), nullable=False)
-    menu_item_id = Column(Integer, ForeignKey("menu_items.id"), nullable=False)
+    menu_item_id = Column(
+        Integer, ForeignKey("menu_items.id"), nullable=False, index=True
+    )
     has_permission = Column(Boolean, nullable=False, default=True)
 
     # 关系
@@ -46,7 +83,11 @@ class ButtonPermission(Base):
     id = Column(Integer, primary_key=True, index=True)
     button_id = Column(String(50), nullable=False, unique=True)
     description = Column(String(100), nullable=True)
-    menu_item_id = Column(Integer, ForeignKey("menu_items.id"), nullable=False)
+    menu_item_id = Column(
+        Integer, ForeignKey("menu_items.id"), nullable=False, index=True
+    )
+    # 在用户权限位图中的位置，插入时自动分配
+    bit_index = Column(Integer, nullable=False, unique=True)
 
     # 关系
     menu_item = relationship("MenuItem", back_populates="button_permissions")
@@ -57,11 +98,19 @@ class ButtonPermission(Base):
 
 class UserButtonPermission(Base):
     __tablename__ = "user_button_permissions"
+    __table_args__ = (
+        UniqueConstraint(
+            "user_id", "button_id", name="uq_user_button_permissions_user_id_button_id"
+        ),
+    )
 
     id = Column(Integer, primary_key=True, index=True)
     user_id = Column(Integer, ForeignKey("users.id"), nullable=False)
     button_id = Column(
-        String(50), ForeignKey("button_permissions.button_id"), nullable=False
+        String(50),
+        ForeignKey("button_permissions.button_id"),
+        nullable=False,
+        index=True,
     )
     has_permission = Column(Boolean, nullable=False, default=False)
 
@@ -70,3 +119,68 @@ class UserButtonPermission(Base):
     button_permission = relationship(
         "ButtonPermission", back_populates="user_button_permissions"
     )
+
+
+@event.listens_for(Session, "before_flush")
+def _assign_bit_indexes(session, flush_context, instances):
+    """为新的菜单项与按钮分配紧凑的位图位置（当前最大值之后依次递增）"""
+    for model in (MenuItem, ButtonPermission):
+        pending = [
+            obj
+            for obj in session.new
+            if isinstance(obj, model) and obj.bit_index is None
+        ]
+        if not pending:
+            continue
+        with session.no_autoflush:
+            next_index = session.execute(
+                select(func.coalesce(func.max(model.bit_index), -1) + 1)
+            ).scalar_one()
+        for offset, obj in enumerate(pending):
+            obj.bit_index = next_index + offset
+
+
+def _menu_path(session, parent_id) -> str:
+    if parent_id is None:
+        return "/"
+    parent = session.get(MenuItem, parent_id)
+    if parent is None:
+        raise ValueError(f"Parent menu item {parent_id} not found")
+    return f"{parent.path}{parent.id}/"
+
+
+@event.listens_for(Session, "before_flush")
+def _maintain_menu_paths(session, flush_context, instances):
+    """计算新菜单项的物化路径；移动菜单项时一条UPDATE同步其全部子孙节点"""
+    with session.no_autoflush:
+        for obj in session.new:
+            if isinstance(obj, MenuItem):
+                obj.path = _menu_path(session, obj.parent_id)
+
+        for obj in list(session.dirty):
+            if not isinstance(obj, MenuItem):
+                continue
+            if not attributes.get_history(obj, "parent_id").has_changes():
+                continue
+            old_prefix = f"{obj.path}{obj.id}/"
+            new_path = _menu_path(session, obj.parent_id)
+            if new_path.startswith(old_prefix):
+                raise ValueError("Cannot move a menu item under its own subtree")
+            new_prefix = f"{new_path}{obj.id}/"
+            obj.path = new_path
+            session.execute(
+                update(MenuItem)
+                .where(MenuItem.path.startswith(old_prefix))
+                .values(
+                    path=literal(new_prefix)
+                    + func.substr(MenuItem.path, len(old_prefix) + 1)
+                )
+                .execution_options(synchronize_session=False)
+            )
+            # 已加载的子孙节点同步内存中的路径（未加载的属性会从数据库读取新值）
+            for other in list(session.identity_map.values()):
+                path = other.__dict__.get("path") if isinstance(other, MenuItem) else None
+                if path is not None and path.startswith(old_prefix):
+                    attributes.set_committed_value(
+                        other, "path", new_prefix + path[len(old_prefix) :]
+                    )
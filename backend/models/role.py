@@ -0,0 +1,104 @@
+from sqlalchemy import (
+    Column,
+    DateTime,
+    ForeignKey,
+    Integer,
+    LargeBinary,
+    String,
+    UniqueConstraint,
+)
+from sqlalchemy.orm import relationship
+from sqlalchemy.sql import func
+from db.base import Base
+
+
+class Role(Base):
+    __tablename__ = "roles"
+
+    id = Column(Integer, primary_key=True, index=True)
+    name = Column(String(50), nullable=False, unique=True)
+    description = Column(String(100), nullable=True)
+    created_at = Column(DateTime, nullable=False, default=func.now())
+
+    # 角色拥有的菜单与按钮授权，删除角色时一并删除
+    menu_items = relationship(
+        "RoleMenuItem", back_populates="role", cascade="all, delete-orphan"
+    )
+    button_permissions = relationship(
+        "RoleButtonPermission", back_populates="role", cascade="all, delete-orphan"
+    )
+    user_roles = relationship(
+        "UserRole", back_populates="role", cascade="all, delete-orphan"
+    )
+
+
+class RoleMenuItem(Base):
+    __tablename__ = "role_menu_items"
+    __table_args__ = (
+        UniqueConstraint(
+            "role_id", "menu_item_id", name="uq_role_menu_items_role_id_menu_item_id"
+        ),
+    )
+
+    id = Column(Integer, primary_key=True, index=True)
+    role_id = Column(Integer, ForeignKey("roles.id"), nullable=False)
+    menu_item_id = Column(
+        Integer, ForeignKey("menu_items.id"), nullable=False, index=True
+    )
+
+    # 关系
+    role = relationship("Role", back_populates="menu_items")
+
+
+class RoleButtonPermission(Base):
+    __tablename__ = "role_button_permissions"
+    __table_args__ = (
+        UniqueConstraint(
+            "role_id", "button_id", name="uq_role_button_permissions_role_id_button_id"
+        ),
+    )
+
+    id = Column(Integer, primary_key=True, index=True)
+    role_id = Column(Integer, ForeignKey("roles.id"), nullable=False)
+    button_id = Column(
+        String(50),
+        ForeignKey("button_permissions.button_id"),
+        nullable=False,
+        index=True,
+    )
+
+    # 关系
+    role = relationship("Role", back_populates="button_permissions")
+
+
+class UserRole(Base):
+    __tablename__ = "user_roles"
+    __table_args__ = (
+        UniqueConstraint("user_id", "role_id", name="uq_user_roles_user_id_role_id"),
+    )
+
+    id = Column(Integer, primary_key=True, index=True)
+    user_id = Column(Integer, ForeignKey("users.id"), nullable=False)
+    # 角色授权变更时按角色查找受影响的用户
+    role_id = Column(Integer, ForeignKey("roles.id"), nullable=False, index=True)
+
+    # 关系
+    role = relationship("Role", back_populates="user_roles")
+
+
+class UserEffectivePermission(Base):
+    """用户最终权限的物化结果: 角色授权并集，再应用用户级覆盖
+
+    由 crud_menu.materialize_effective_permissions 在相关写操作中增量重算，
+    读取时只需按主键读取一行。权限以位图保存（见 core.bitmap），
+    第 i 位对应 bit_index 为 i 的菜单项或按钮。
+    """
+
+    __tablename__ = "user_effective_permissions"
+
+    user_id = Column(Integer, ForeignKey("users.id"), primary_key=True)
+    menu_bitmap = Column(LargeBinary, nullable=False, default=b"")
+    button_bitmap = Column(LargeBinary, nullable=False, default=b"")
+    # 每次重算递增
+    version = Column(Integer, nullable=False, default=1)
+    updated_at = Column(DateTime, nullable=False, default=func.now())
@@ -1,4 +1,5 @@
 from pydantic import BaseModel
+from typing import Any, Dict, List
 import datetime
 
 # Shared properties
@@ -17,7 +18,7 @@ class ExpenseUpdate(ExpenseBase):
 # Properties shared by models stored in DB
 class ExpenseInDBBase(ExpenseBase):
     id: int
-    date: datetime.datetime
+    date: datetime.datetime | None = None
     owner_id: int
 
     class Config:
@@ -29,4 +30,22 @@ class Expense(ExpenseInDBBase):
 
 # Properties stored in DB
 class ExpenseInDB(ExpenseInDBBase):
-    pass 
\ No newline at end of file
+    pass 
+
+# Aggregated totals for one day, month or description
+class ExpenseSummaryBucket(BaseModel):
+    key: str | None = None
+    total: float
+    count: int
+    average: float
+
+
+# Outcome of a bulk import: ids of created rows and per-item validation errors
+class ExpenseBulkError(BaseModel):
+    index: int
+    errors: List[Dict[str, Any]]
+
+
+class ExpenseBulkResult(BaseModel):
+    created_ids: List[int]
+    errors: List[ExpenseBulkError]
@@ -1,4 +1,4 @@
-from pydantic import BaseModel
+from pydantic import BaseModel, Field
 from typing import List, Optional
 from datetime import datetime
 
@@ -90,6 +90,10 @@ class SetUserButtonPermissions(BaseModel):
     button_permissions: List[UserButtonPermission]
 
 
+class ButtonPermissionCheck(BaseModel):
+    button_ids: List[str] = Field(..., max_length=500)
+
+
 # 解决前向引用
 MenuItem.model_rebuild()
 UserMenuResponse.model_rebuild()
@@ -0,0 +1,36 @@
+from pydantic import BaseModel
+from typing import List, Optional
+from datetime import datetime
+
+
+# Role Schemas
+class RoleBase(BaseModel):
+    name: str
+    description: Optional[str] = None
+
+
+class RoleCreate(RoleBase):
+    pass
+
+
+class RoleUpdate(BaseModel):
+    name: Optional[str] = None
+    description: Optional[str] = None
+
+
+class Role(RoleBase):
+    id: int
+    created_at: datetime
+
+    class Config:
+        from_attributes = True
+
+
+# Role Permission Schemas
+class RolePermissions(BaseModel):
+    menu_item_ids: List[int] = []
+    button_ids: List[str] = []
+
+
+class SetUserRoles(BaseModel):
+    role_ids: List[int]
@@ -8,3 +8,9 @@ class Token(BaseModel):
 
 class TokenPayload(BaseModel):
     sub: str | None = None
+    exp: int | None = None
+    # Optional permission digest, see core.security.PermissionClaims
+    su: bool | None = None
+    pv: int | None = None
+    mb: str | None = None
+    bb: str | None = None
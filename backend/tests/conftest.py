@@ -5,7 +5,8 @@
 
 import os
 import pytest
-from typing import Generator
+from contextlib import contextmanager
+from typing import Generator, Optional
 from fastapi.testclient import TestClient
 from sqlalchemy import create_engine
 from sqlalchemy.orm import sessionmaker, Session
@@ -21,6 +22,7 @@ os.environ.setdefault("FIRST_SUPERUSER", "admin@example.com")
 os.environ.setdefault("FIRST_SUPERUSER_PASSWORD", "adminpassword")
 
 from main import app
+from db import query_stats
 from db.base import Base
 from db.session import get_db
 from models.user import User
@@ -56,8 +58,9 @@ def db_session() -> Generator[Session, None, None]:
         yield session
     finally:
         session.close()
-        # 清理表
+        # 清理表及进程内缓存（用户ID会在测试间复用）
         Base.metadata.drop_all(bind=engine)
+        crud_user.clear_local_principals()
 
 
 @pytest.fixture(scope="function")
@@ -81,6 +84,62 @@ def client(db_session: Session) -> Generator[TestClient, None, None]:
     app.dependency_overrides.clear()
 
 
+@pytest.fixture
+def query_budget():
+    """
+    SQL语句预算夹具
+    用法: with query_budget(3): client.get(...)
+    代码块内执行的语句数（或同一语句的重复次数、连接检出次数）超出预算时测试失败
+    """
+
+    @contextmanager
+    def budget(
+        max_queries: int,
+        max_repeats: Optional[int] = None,
+        max_checkouts: Optional[int] = None,
+    ):
+        with query_stats.track() as stats:
+            yield stats
+        shapes = "\n".join(
+            f"  {count} x {shape}" for shape, count in stats.shapes.most_common()
+        )
+        if stats.count > max_queries:
+            pytest.fail(
+                f"{stats.count} queries executed, budget is {max_queries}:\n{shapes}"
+            )
+        if max_repeats is not None and stats.max_repeats > max_repeats:
+            pytest.fail(
+                f"a statement repeated {stats.max_repeats} times, "
+                f"budget is {max_repeats}:\n{shapes}"
+            )
+        if max_checkouts is not None and stats.checkouts > max_checkouts:
+            pytest.fail(
+                f"{stats.checkouts} connections checked out, "
+                f"budget is {max_checkouts}"
+            )
+
+    return budget
+
+
+@pytest.fixture
+def fake_redis(monkeypatch):
+    """
+    内存Redis夹具
+    使用fakeredis替换全局的同步与异步Redis客户端（共享同一份数据）
+    """
+    import fakeredis
+    import db.redis
+
+    server = fakeredis.FakeServer()
+    client = fakeredis.FakeRedis(server=server)
+    monkeypatch.setattr(db.redis, "redis_client", client)
+    monkeypatch.setattr(
+        db.redis, "async_redis_client", fakeredis.FakeAsyncRedis(server=server)
+    )
+    yield client
+    client.flushall()
+
+
 # 用户相关夹具
 @pytest.fixture
 def test_user(db_session: Session) -> User:
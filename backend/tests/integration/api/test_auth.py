@@ -242,3 +242,23 @@ class TestAuthAPI:
         assert isinstance(token2, str)
         assert len(token1) > 0
         assert len(token2) > 0
+
+    def test_principal_served_from_redis(
+        self, client: TestClient, test_user: User, auth_headers: dict, fake_redis
+    ):
+        """
+        测试身份缓存
+        预期: 首次请求后身份写入Redis，清空进程缓存后仍可认证
+        """
+        # Arrange
+        from crud import crud_user
+
+        client.get("/api/v1/users/me", headers=auth_headers)
+        crud_user.clear_local_principals()
+
+        # Act
+        response = client.get("/api/v1/users/me", headers=auth_headers)
+
+        # Assert
+        assert response.status_code == status.HTTP_200_OK
+        assert fake_redis.get(f"principal:{test_user.id}") is not None
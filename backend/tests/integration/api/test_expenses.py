@@ -0,0 +1,249 @@
+"""
+支出API集成测试
+"""
+
+import csv
+import io
+import json
+
+import pytest
+from fastapi import status
+from fastapi.testclient import TestClient
+from sqlalchemy import update
+
+from db import replicas
+from db.base import Base
+from models.expense import Expense
+
+
+def _create_expenses(client: TestClient, headers: dict, count: int) -> list:
+    return [
+        client.post(
+            "/api/v1/expenses/",
+            json={"description": f"expense {i}", "amount": i + 1},
+            headers=headers,
+        ).json()
+        for i in range(count)
+    ]
+
+
+@pytest.mark.integration
+class TestExpenseAPI:
+    """支出API测试套件"""
+
+    def test_read_own_expenses_with_cursor(
+        self, client: TestClient, auth_headers: dict
+    ):
+        """
+        测试游标分页
+        预期: 通过X-Next-Cursor依次获取所有支出
+        """
+        # Arrange
+        created = _create_expenses(client, auth_headers, 3)
+
+        # Act
+        first = client.get("/api/v1/expenses/me?limit=2", headers=auth_headers)
+        second = client.get(
+            "/api/v1/expenses/me",
+            params={"limit": 2, "cursor": first.headers["X-Next-Cursor"]},
+            headers=auth_headers,
+        )
+
+        # Assert
+        assert first.status_code == status.HTTP_200_OK
+        ids = [e["id"] for e in first.json() + second.json()]
+        assert ids == sorted((e["id"] for e in created), reverse=True)
+        assert "X-Next-Cursor" not in second.headers
+
+    def test_read_own_expenses_without_date(
+        self, client: TestClient, db_session, test_user, auth_headers: dict
+    ):
+        """
+        测试分页读取没有日期的支出
+        预期: 返回200，游标可以越过无日期支出
+        """
+        # Arrange
+        created = _create_expenses(client, auth_headers, 2)
+        undated = Expense(description="undated", amount=1.0, owner_id=test_user.id)
+        db_session.add(undated)
+        db_session.flush()
+        db_session.execute(
+            update(Expense).where(Expense.id == undated.id).values(date=None)
+        )
+        db_session.commit()
+
+        # Act
+        first = client.get("/api/v1/expenses/me?limit=1", headers=auth_headers)
+        rest = client.get(
+            "/api/v1/expenses/me",
+            params={"limit": 2, "cursor": first.headers["X-Next-Cursor"]},
+            headers=auth_headers,
+        )
+
+        # Assert
+        assert first.status_code == status.HTTP_200_OK
+        assert first.json()[0]["id"] == undated.id
+        assert first.json()[0]["date"] is None
+        assert [e["id"] for e in rest.json()] == sorted(
+            (e["id"] for e in created), reverse=True
+        )
+
+    def test_export_own_expenses_csv(self, client: TestClient, auth_headers: dict):
+        """
+        测试导出CSV
+        预期: 返回表头及每条支出一行
+        """
+        # Arrange
+        _create_expenses(client, auth_headers, 3)
+
+        # Act
+        response = client.get("/api/v1/expenses/me/export", headers=auth_headers)
+
+        # Assert
+        assert response.status_code == status.HTTP_200_OK
+        assert response.headers["content-type"].startswith("text/csv")
+        lines = response.text.strip().splitlines()
+        assert lines[0] == "id,date,description,amount,owner_id"
+        assert len(lines) == 4
+
+    def test_export_own_expenses_ndjson(self, client: TestClient, auth_headers: dict):
+        """
+        测试导出NDJSON
+        预期: 每行一个JSON对象
+        """
+        # Arrange
+        _create_expenses(client, auth_headers, 2)
+
+        # Act
+        response = client.get(
+            "/api/v1/expenses/me/export?format=ndjson", headers=auth_headers
+        )
+
+        # Assert
+        rows = [json.loads(line) for line in response.text.splitlines()]
+        assert {row["description"] for row in rows} == {"expense 0", "expense 1"}
+
+    def test_export_expense_without_date(
+        self, client: TestClient, db_session, test_user, auth_headers: dict
+    ):
+        """
+        测试导出没有日期的支出
+        预期: CSV中日期为空，NDJSON中为null，导出完整结束
+        """
+        # Arrange
+        _create_expenses(client, auth_headers, 1)
+        # 显式传入None仍会触发默认值，插入后再清空日期
+        undated = Expense(description="undated", amount=1.0, owner_id=test_user.id)
+        db_session.add(undated)
+        db_session.flush()
+        db_session.execute(
+            update(Expense).where(Expense.id == undated.id).values(date=None)
+        )
+        db_session.commit()
+
+        # Act
+        csv_response = client.get("/api/v1/expenses/me/export", headers=auth_headers)
+        ndjson_response = client.get(
+            "/api/v1/expenses/me/export?format=ndjson", headers=auth_headers
+        )
+
+        # Assert
+        rows = list(csv.DictReader(io.StringIO(csv_response.text)))
+        assert len(rows) == 2
+        assert {row["description"]: row["date"] for row in rows}["undated"] == ""
+        records = [json.loads(line) for line in ndjson_response.text.splitlines()]
+        assert {r["description"]: r["date"] for r in records}["undated"] is None
+        assert len(records) == 2
+
+    def test_export_all_expenses_requires_superuser(
+        self, client: TestClient, auth_headers: dict
+    ):
+        """
+        测试普通用户导出全部支出
+        预期: 返回400状态码
+        """
+        # Act
+        response = client.get("/api/v1/expenses/export", headers=auth_headers)
+
+        # Assert
+        assert response.status_code == status.HTTP_400_BAD_REQUEST
+
+    def test_bulk_create_reports_invalid_items(
+        self, client: TestClient, auth_headers: dict
+    ):
+        """
+        测试批量创建支出
+        预期: 有效条目全部创建，无效条目按索引返回错误
+        """
+        # Arrange
+        items = [
+            {"description": "rent", "amount": 1000},
+            {"description": "broken"},
+            {"description": "food", "amount": 20.5},
+        ]
+
+        # Act
+        response = client.post(
+            "/api/v1/expenses/bulk", json=items, headers=auth_headers
+        )
+        own = client.get("/api/v1/expenses/me", headers=auth_headers).json()
+
+        # Assert
+        assert response.status_code == status.HTTP_200_OK
+        result = response.json()
+        assert len(result["created_ids"]) == 2
+        assert [error["index"] for error in result["errors"]] == [1]
+        assert sorted(e["id"] for e in own) == sorted(result["created_ids"])
+
+
+@pytest.mark.integration
+class TestReadReplicaRouting:
+    """只读副本路由API测试套件"""
+
+    @pytest.fixture
+    def empty_replica(self, tmp_path, monkeypatch):
+        """只有表结构的副本，模拟尚未复制到任何数据"""
+        router = replicas.ReplicaRouter([f"sqlite:///{tmp_path / 'replica.db'}"])
+        Base.metadata.create_all(bind=router.replicas[0].engine)
+        monkeypatch.setattr(replicas, "replica_router", router)
+        yield router.replicas[0]
+        router.replicas[0].engine.dispose()
+
+    def test_own_write_read_from_primary(
+        self, client: TestClient, auth_headers: dict, empty_replica, fake_redis
+    ):
+        """
+        测试读己之写窗口
+        预期: 写入后立即读取走主库；窗口过期后改由副本提供
+        """
+        # Arrange
+        created = _create_expenses(client, auth_headers, 1)
+
+        # Act
+        within_window = client.get("/api/v1/expenses/me", headers=auth_headers)
+        fake_redis.flushall()
+        after_window = client.get("/api/v1/expenses/me", headers=auth_headers)
+
+        # Assert
+        assert [e["id"] for e in within_window.json()] == [created[0]["id"]]
+        assert after_window.json() == []
+        assert empty_replica.reads == 1
+
+    def test_lagging_replica_falls_back_to_primary(
+        self, client: TestClient, auth_headers: dict, empty_replica, fake_redis
+    ):
+        """
+        测试延迟超限的副本
+        预期: 读取回退到主库
+        """
+        # Arrange
+        created = _create_expenses(client, auth_headers, 1)
+        fake_redis.flushall()
+        empty_replica.available = False
+
+        # Act
+        response = client.get("/api/v1/expenses/me", headers=auth_headers)
+
+        # Assert
+        assert [e["id"] for e in response.json()] == [created[0]["id"]]
+        assert empty_replica.reads == 0
@@ -0,0 +1,285 @@
+"""
+菜单API集成测试
+"""
+
+import pytest
+import redis
+from fastapi import status
+from fastapi.testclient import TestClient
+
+from core.config import settings
+from crud import crud_menu, crud_user
+from db import query_stats
+from models.menu import ButtonPermission, MenuItem
+from models.user import User
+from schemas.menu import UserButtonPermission
+from schemas.user import UserCreate
+
+
+@pytest.mark.integration
+class TestButtonPermissionCheckAPI:
+    """按钮权限批量检查API测试套件"""
+
+    def test_batch_check_returns_map(
+        self,
+        client: TestClient,
+        auth_headers: dict,
+        db_session,
+        test_user: User,
+        test_button_permission: ButtonPermission,
+        fake_redis,
+    ):
+        """
+        测试批量检查按钮权限
+        预期: 返回每个button_id的权限，重复的id只出现一次
+        """
+        # Arrange
+        crud_menu.set_user_button_permissions(
+            db_session,
+            user_id=test_user.id,
+            button_permissions=[
+                UserButtonPermission(button_id="test_button", has_permission=True)
+            ],
+        )
+
+        # Act
+        response = client.post(
+            "/api/v1/menus/users/me/buttons/check",
+            json={"button_ids": ["test_button", "missing", "test_button"]},
+            headers=auth_headers,
+        )
+
+        # Assert
+        assert response.status_code == status.HTTP_200_OK
+        assert response.json() == {"test_button": True, "missing": False}
+
+    def test_batch_check_superuser_has_all(self, client: TestClient, db_session):
+        """
+        测试超级用户批量检查
+        预期: 所有按钮均有权限
+        """
+        # Arrange
+        crud_user.create_user(
+            db_session,
+            UserCreate(email="root@example.com", password="rootpassword"),
+            is_superuser=True,
+        )
+        token = client.post(
+            "/api/v1/login/access-token",
+            data={"username": "root@example.com", "password": "rootpassword"},
+        ).json()["access_token"]
+
+        # Act
+        response = client.post(
+            "/api/v1/menus/users/me/buttons/check",
+            json={"button_ids": ["a", "b"]},
+            headers={"Authorization": f"Bearer {token}"},
+        )
+
+        # Assert
+        assert response.status_code == status.HTTP_200_OK
+        assert response.json() == {"a": True, "b": True}
+
+    def test_batch_check_requires_auth(self, client: TestClient):
+        """
+        测试未认证的批量检查
+        预期: 返回401
+        """
+        # Act
+        response = client.post(
+            "/api/v1/menus/users/me/buttons/check", json={"button_ids": ["a"]}
+        )
+
+        # Assert
+        assert response.status_code == status.HTTP_401_UNAUTHORIZED
+
+
+@pytest.mark.integration
+class TestTokenPermissionClaimsAPI:
+    """令牌权限摘要API测试套件"""
+
+    @pytest.fixture(autouse=True)
+    def _enable_claims(self, monkeypatch):
+        monkeypatch.setattr(settings, "TOKEN_PERMISSION_CLAIMS", True)
+
+    def _login(self, client: TestClient, test_user: User) -> dict:
+        token = client.post(
+            "/api/v1/login/access-token",
+            data={"username": test_user.email, "password": "testpassword"},
+        ).json()["access_token"]
+        return {"Authorization": f"Bearer {token}"}
+
+    def _set_button(self, db_session, user_id: int, has_permission: bool) -> None:
+        crud_menu.set_user_button_permissions(
+            db_session,
+            user_id=user_id,
+            button_permissions=[
+                UserButtonPermission(
+                    button_id="test_button", has_permission=has_permission
+                )
+            ],
+        )
+
+    def test_current_claims_answer_check(
+        self,
+        client: TestClient,
+        db_session,
+        test_user: User,
+        test_button_permission: ButtonPermission,
+        fake_redis,
+    ):
+        """
+        测试版本一致的权限摘要
+        预期: 直接由令牌中的按钮位图判定，不读取按钮缓存
+        """
+        # Arrange
+        self._set_button(db_session, test_user.id, True)
+        headers = self._login(client, test_user)
+        crud_menu.store_user_buttons(test_user.id, b"")
+
+        # Act
+        response = client.post(
+            "/api/v1/menus/users/me/buttons/check",
+            json={"button_ids": ["test_button"]},
+            headers=headers,
+        )
+
+        # Assert
+        assert response.json() == {"test_button": True}
+
+    def test_permission_change_supersedes_claims(
+        self,
+        client: TestClient,
+        db_session,
+        test_user: User,
+        test_button_permission: ButtonPermission,
+        fake_redis,
+    ):
+        """
+        测试签发令牌后权限变更
+        预期: 版本号推进，旧令牌的摘要不再被采用
+        """
+        # Arrange
+        self._set_button(db_session, test_user.id, True)
+        headers = self._login(client, test_user)
+
+        # Act
+        self._set_button(db_session, test_user.id, False)
+        response = client.get(
+            "/api/v1/menus/users/me/buttons/test_button/check", headers=headers
+        )
+
+        # Assert
+        assert response.json() == {"has_permission": False}
+
+    def test_failed_version_bump_distrusts_claims(
+        self,
+        client: TestClient,
+        db_session,
+        test_user: User,
+        test_button_permission: ButtonPermission,
+        fake_redis,
+        monkeypatch,
+    ):
+        """
+        测试权限变更后推进版本失败
+        预期: 缓存的版本号被删除，旧令牌的摘要不再被采用
+        """
+        # Arrange
+        self._set_button(db_session, test_user.id, True)
+        headers = self._login(client, test_user)
+        pipeline = fake_redis.pipeline
+
+        def failing_pipeline(*args, **kwargs):
+            pipe = pipeline(*args, **kwargs)
+
+            def execute(*args, **kwargs):
+                raise redis.ConnectionError("down")
+
+            pipe.execute = execute
+            return pipe
+
+        # Act
+        with monkeypatch.context() as patch:
+            patch.setattr(fake_redis, "pipeline", failing_pipeline)
+            self._set_button(db_session, test_user.id, False)
+        response = client.get(
+            "/api/v1/menus/users/me/buttons/test_button/check", headers=headers
+        )
+
+        # Assert
+        version_key = crud_menu.PERMISSION_VERSION_KEY.format(user_id=test_user.id)
+        assert fake_redis.exists(version_key) == 0
+        assert response.json() == {"has_permission": False}
+
+
+@pytest.mark.integration
+class TestMenuCatalogQueryBudget:
+    """菜单目录查询预算测试套件"""
+
+    def test_catalog_listing_within_budget(
+        self, client: TestClient, db_session, query_budget, fake_redis
+    ):
+        """
+        测试获取整个菜单目录
+        预期: 不随节点数增加查询，Server-Timing 头报告语句数
+        """
+        # Arrange
+        crud_user.create_user(
+            db_session,
+            UserCreate(email="root@example.com", password="rootpassword"),
+            is_superuser=True,
+        )
+        token = client.post(
+            "/api/v1/login/access-token",
+            data={"username": "root@example.com", "password": "rootpassword"},
+        ).json()["access_token"]
+        root = MenuItem(title="Root")
+        db_session.add(root)
+        db_session.commit()
+        db_session.add_all(
+            [MenuItem(title=f"Child {i}", parent_id=root.id) for i in range(5)]
+        )
+        db_session.commit()
+
+        # Act: 分页查询加本页子孙节点查询
+        with query_budget(3, max_repeats=1):
+            response = client.get(
+                "/api/v1/menus/", headers={"Authorization": f"Bearer {token}"}
+            )
+
+        # Assert
+        assert response.status_code == status.HTTP_200_OK
+        assert len(response.json()[0]["children"]) == 5
+        assert response.headers["Server-Timing"].startswith("db;dur=")
+
+
+@pytest.mark.integration
+class TestCachedEndpointConnections:
+    """缓存端点连接占用测试套件"""
+
+    def test_cached_menu_tree_uses_no_connection(
+        self,
+        client: TestClient,
+        auth_headers: dict,
+        test_menu_item: MenuItem,
+        query_budget,
+        fake_redis,
+    ):
+        """
+        测试由缓存提供的菜单树
+        预期: 首次请求检出连接；缓存命中后既不执行语句也不检出连接
+        """
+        # Arrange
+        with query_stats.track() as cold:
+            first = client.get("/api/v1/menus/users/me/menus", headers=auth_headers)
+
+        # Act
+        with query_budget(0, max_checkouts=0):
+            second = client.get(
+                "/api/v1/menus/users/me/menus", headers=auth_headers
+            )
+
+        # Assert
+        assert cold.checkouts > 0
+        assert second.json() == first.json()
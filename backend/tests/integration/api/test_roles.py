@@ -0,0 +1,70 @@
+"""
+角色API集成测试
+"""
+
+import pytest
+from fastapi import status
+from fastapi.testclient import TestClient
+from sqlalchemy.orm import Session
+
+from crud import crud_role
+from models.user import User
+from schemas.role import RoleCreate
+
+
+@pytest.fixture
+def admin_headers(client: TestClient, db_session: Session, test_superuser: User) -> dict:
+    """确保为超级用户后登录，获取认证头"""
+    test_superuser.is_superuser = True
+    db_session.commit()
+    login_data = {"username": test_superuser.email, "password": "testpassword"}
+    response = client.post("/api/v1/login/access-token", data=login_data)
+    return {"Authorization": f"Bearer {response.json()['access_token']}"}
+
+
+@pytest.mark.integration
+class TestRoleGrantValidationAPI:
+    """角色授权ID校验API测试套件"""
+
+    def test_set_unknown_role_permissions(
+        self, client: TestClient, db_session: Session, admin_headers: dict
+    ):
+        """
+        测试授予不存在的菜单或按钮
+        预期: 返回400状态码并列出未知ID
+        """
+        # Arrange
+        role = crud_role.create_role(db_session, RoleCreate(name="editor"))
+
+        # Act
+        response = client.put(
+            f"/api/v1/roles/{role.id}/permissions",
+            json={"menu_item_ids": [999], "button_ids": []},
+            headers=admin_headers,
+        )
+
+        # Assert
+        assert response.status_code == status.HTTP_400_BAD_REQUEST
+        assert "999" in response.json()["detail"]
+
+    def test_set_user_unknown_roles(
+        self, client: TestClient, test_user: User, admin_headers: dict
+    ):
+        """
+        测试为用户设置不存在的角色
+        预期: 返回400状态码；用户不存在时返回404
+        """
+        # Act
+        unknown_role = client.post(
+            f"/api/v1/roles/users/{test_user.id}",
+            json={"role_ids": [999]},
+            headers=admin_headers,
+        )
+        unknown_user = client.post(
+            "/api/v1/roles/users/999", json={"role_ids": []}, headers=admin_headers
+        )
+
+        # Assert
+        assert unknown_role.status_code == status.HTTP_400_BAD_REQUEST
+        assert "999" in unknown_role.json()["detail"]
+        assert unknown_user.status_code == status.HTTP_404_NOT_FOUND
@@ -60,6 +60,27 @@ class TestUserAPI:
         assert response.status_code == status.HTTP_400_BAD_REQUEST
         assert "already exists" in response.json()["detail"]
 
+    def test_create_user_password_pool_busy(self, client: TestClient, monkeypatch):
+        """
+        测试密码哈希线程池饱和时注册
+        预期: 返回503状态码和Retry-After，不创建用户
+        """
+        # Arrange
+        import threading
+
+        from core import security
+
+        monkeypatch.setattr(security, "_password_slots", threading.BoundedSemaphore(1))
+        security._password_slots.acquire()
+        user_data = {"email": "busy@example.com", "password": "testpassword"}
+
+        # Act
+        response = client.post("/api/v1/users/", json=user_data)
+
+        # Assert
+        assert response.status_code == status.HTTP_503_SERVICE_UNAVAILABLE
+        assert response.headers["Retry-After"] == "1"
+
     def test_create_user_invalid_email(self, client: TestClient):
         """
         测试创建用户时使用无效邮箱
@@ -0,0 +1,55 @@
+"""
+权限位图单元测试
+"""
+
+import pytest
+
+from core import bitmap
+
+
+@pytest.mark.unit
+class TestBitmap:
+    """位图编码测试套件"""
+
+    def test_round_trip(self):
+        """
+        测试编码与解码
+        预期: 解码得到排序去重后的位置，空集合编码为空字节串
+        """
+        # Act
+        bits = bitmap.from_indexes([9, 0, 9, 17])
+
+        # Assert
+        assert bits == bytes([0b10000000, 0b01000000, 0b01000000])
+        assert bitmap.to_indexes(bits) == [0, 9, 17]
+        assert bitmap.from_indexes([]) == b""
+
+    def test_has_bit_beyond_length(self):
+        """
+        测试超出长度的位置
+        预期: 视为未置位
+        """
+        bits = bitmap.from_indexes([3])
+
+        assert bitmap.has_bit(bits, 3) is True
+        assert bitmap.has_bit(bits, 4) is False
+        assert bitmap.has_bit(bits, 1000) is False
+
+    def test_negative_index_rejected(self):
+        with pytest.raises(ValueError):
+            bitmap.from_indexes([-1])
+
+    def test_matches_redis_bit_order(self, fake_redis):
+        """
+        测试与Redis位序一致
+        预期: SETBIT 生成的字符串与 from_indexes 相同，GETBIT 可直接探测
+        """
+        # Arrange
+        for index in (1, 8, 15):
+            fake_redis.setbit("bits", index, 1)
+        fake_redis.set("ours", bitmap.from_indexes([1, 8, 15]))
+
+        # Assert
+        assert fake_redis.get("bits") == fake_redis.get("ours")
+        assert fake_redis.getbit("ours", 8) == 1
+        assert fake_redis.getbit("ours", 9) == 0
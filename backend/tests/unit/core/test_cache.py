@@ -0,0 +1,439 @@
+"""
+缓存旁路装饰器单元测试
+"""
+
+import datetime
+import json
+import threading
+import time
+
+import pytest
+from sqlalchemy.orm import Session
+
+from core import cache
+from crud import crud_menu, crud_user
+from models.menu import MenuItem
+from schemas.menu import MenuItemCreate
+from schemas.user import UserCreate, UserUpdate
+
+
+def _counting(namespace: str, **options):
+    """返回被缓存的计数函数及其调用记录"""
+    calls = []
+
+    @cache.cached(namespace, **options)
+    def load(value):
+        calls.append(value)
+        return None if value is None else {"value": value}
+
+    return load, calls
+
+
+@pytest.mark.unit
+class TestCachedDecorator:
+    """缓存装饰器测试套件"""
+
+    def test_second_call_served_from_cache(self, fake_redis):
+        """
+        测试缓存命中
+        预期: 第二次调用不再执行被包装的函数
+        """
+        # Arrange
+        load, calls = _counting("test:hit", ttl=60)
+
+        # Act
+        first = load(1)
+        second = load(1)
+
+        # Assert
+        assert first == second == {"value": 1}
+        assert calls == [1]
+
+    def test_negative_result_cached_when_enabled(self, fake_redis):
+        """
+        测试负缓存
+        预期: None结果在negative_ttl内被缓存
+        """
+        # Arrange
+        load, calls = _counting("test:negative", ttl=60, negative_ttl=10)
+        plain, plain_calls = _counting("test:plain", ttl=60)
+
+        # Act
+        load(None)
+        load(None)
+        plain(None)
+        plain(None)
+
+        # Assert
+        assert calls == [None]
+        assert plain_calls == [None, None]
+
+    def test_stale_entry_served_while_locked(self, fake_redis):
+        """
+        测试过期条目在其他进程刷新期间继续提供
+        预期: 锁被占用时返回旧值且不调用被包装的函数
+        """
+        # Arrange
+        load, calls = _counting("test:stale", ttl=60)
+        load(1)
+        key = cache.CACHE_KEY.format(namespace="test:stale", key="1")
+        envelope = json.loads(fake_redis.get(key))
+        envelope["e"] = time.time() - 1
+        fake_redis.set(key, json.dumps(envelope))
+        lock_key = cache.CACHE_LOCK_KEY.format(namespace="test:stale", key="1")
+        fake_redis.set(lock_key, "x")
+
+        # Act
+        result = load(1)
+
+        # Assert
+        assert result == {"value": 1}
+        assert calls == [1]
+
+    def test_concurrent_cold_reads_compute_once(self, fake_redis):
+        """
+        测试冷启动时的并发读取
+        预期: 只有一个调用者执行被包装的函数，其余等待结果
+        """
+        # Arrange
+        calls = []
+
+        @cache.cached("test:herd", ttl=60)
+        def slow(value):
+            calls.append(value)
+            time.sleep(0.2)
+            return value * 2
+
+        results = []
+        threads = [
+            threading.Thread(target=lambda: results.append(slow(21)))
+            for _ in range(5)
+        ]
+
+        # Act
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        # Assert
+        assert results == [42] * 5
+        assert calls == [21]
+
+    def test_invalidate_namespace_drops_all_keys(self, fake_redis):
+        """
+        测试命名空间失效
+        预期: 失效后重新执行被包装的函数
+        """
+        # Arrange
+        load, calls = _counting("test:invalidate", ttl=60)
+        load(1)
+        load(2)
+
+        # Act
+        cache.invalidate_namespace("test:invalidate")
+        load(1)
+        load(2)
+
+        # Assert
+        assert calls == [1, 2, 1, 2]
+
+    @pytest.mark.parametrize(
+        "invalidate",
+        [
+            lambda: cache.invalidate("test:race", "1"),
+            lambda: cache.invalidate_namespace("test:race"),
+        ],
+        ids=["key", "namespace"],
+    )
+    def test_value_read_before_invalidation_not_stored(self, fake_redis, invalidate):
+        """
+        测试计算与失效交错
+        预期: 计算期间发生失效时旧值不写入缓存，下次调用重新计算
+        """
+        # Arrange
+        calls = []
+
+        @cache.cached("test:race", ttl=60)
+        def load(value):
+            calls.append(value)
+            if len(calls) == 1:
+                # 已读到旧数据，此时写操作提交并失效缓存
+                invalidate()
+                return {"value": "old"}
+            return {"value": "new"}
+
+        # Act
+        first = load(1)
+        second = load(1)
+        third = load(1)
+
+        # Assert
+        assert first == {"value": "old"}
+        assert second == third == {"value": "new"}
+        assert calls == [1, 1]
+
+    def test_redis_unavailable_falls_back_to_function(self, monkeypatch):
+        """
+        测试Redis不可用
+        预期: 直接调用被包装的函数
+        """
+        # Arrange
+        import redis
+        import db.redis
+
+        monkeypatch.setattr(
+            db.redis,
+            "redis_client",
+            redis.Redis(host="localhost", port=1, socket_connect_timeout=0.1),
+        )
+        load, calls = _counting("test:down", ttl=60)
+
+        # Act
+        result = load(3)
+
+        # Assert
+        assert result == {"value": 3}
+        assert calls == [3]
+
+
+@pytest.mark.unit
+class TestCachedCrudReads:
+    """CRUD读缓存测试套件"""
+
+    def test_cached_user_attached_to_session(self, db_session: Session, fake_redis):
+        """
+        测试缓存的用户对象
+        预期: 从缓存恢复的对象属于当前会话且字段一致
+        """
+        # Arrange
+        user = crud_user.user.create(
+            db_session,
+            obj_in=UserCreate(
+                email="cached@example.com", password="password", username="cached"
+            ),
+        )
+        user_id = user.id
+        crud_user.user.get(db_session, id=user_id)
+        db_session.expunge_all()
+
+        # Act
+        cached = crud_user.user.get(db_session, id=user_id)
+
+        # Assert
+        assert cached in db_session
+        assert cached.email == "cached@example.com"
+        assert cached.hashed_password == user.hashed_password
+
+    def test_cached_user_payload_excludes_password_hash(
+        self, db_session: Session, fake_redis
+    ):
+        """
+        测试缓存中的用户数据
+        预期: Redis中不保存密码哈希，读取时从数据库加载
+        """
+        # Arrange
+        user = crud_user.user.create(
+            db_session,
+            obj_in=UserCreate(
+                email="secret@example.com", password="password", username="secret"
+            ),
+        )
+        user_id, hashed_password = user.id, user.hashed_password
+
+        # Act
+        crud_user.user.get(db_session, id=user_id)
+        db_session.expunge_all()
+        cached = crud_user.user.get(db_session, id=user_id)
+
+        # Assert
+        raw = fake_redis.get(f"cache:{crud_user.USER_CACHE_NAMESPACE}:{user_id}")
+        assert b"hashed_password" not in raw
+        assert hashed_password.encode() not in raw
+        assert cached.hashed_password == hashed_password
+
+    def test_user_update_invalidates_cached_user(
+        self, db_session: Session, fake_redis
+    ):
+        """
+        测试更新用户后缓存失效
+        预期: 再次读取返回新的字段值
+        """
+        # Arrange
+        user = crud_user.user.create(
+            db_session,
+            obj_in=UserCreate(
+                email="stale@example.com", password="password", username="stale"
+            ),
+        )
+        crud_user.user.get(db_session, id=user.id)
+
+        # Act
+        crud_user.user.update(
+            db_session,
+            db_obj=user,
+            obj_in=UserUpdate(email="stale@example.com", full_name="Renamed"),
+        )
+        db_session.expunge_all()
+        refreshed = crud_user.user.get(db_session, id=user.id)
+
+        # Assert
+        assert refreshed.full_name == "Renamed"
+
+    def test_create_menu_item_invalidates_root_menus(
+        self, db_session: Session, fake_redis
+    ):
+        """
+        测试创建菜单项后根菜单缓存失效
+        预期: 新菜单出现在根菜单列表中
+        """
+        # Arrange
+        crud_menu.create_menu_item(db_session, MenuItemCreate(title="First"))
+        assert [m.title for m in crud_menu.get_root_menu_items(db_session)] == [
+            "First"
+        ]
+
+        # Act
+        crud_menu.create_menu_item(
+            db_session, MenuItemCreate(title="Second", order=1)
+        )
+        roots = crud_menu.get_root_menu_items(db_session)
+
+        # Assert
+        assert [m.title for m in roots] == ["First", "Second"]
+        assert all(isinstance(m, MenuItem) for m in roots)
+        assert isinstance(roots[0].created_at, datetime.datetime)
+
+
+@pytest.fixture
+def near_cache():
+    """启用进程内近端缓存（不启动订阅线程）"""
+    cache.near_cache.clear()
+    cache.near_cache.active = True
+    yield cache.near_cache
+    cache.near_cache.active = False
+    cache.near_cache.clear()
+
+
+@pytest.mark.unit
+class TestNearCache:
+    """进程内近端缓存测试套件"""
+
+    def test_near_hit_skips_redis(self, fake_redis, near_cache, monkeypatch):
+        """
+        测试近端缓存命中
+        预期: 第二次调用不访问Redis
+        """
+        # Arrange
+        load, calls = _counting("test:near", ttl=60, near=True)
+        load(1)
+        monkeypatch.setattr(fake_redis, "get", None)
+
+        # Act
+        result = load(1)
+
+        # Assert
+        assert result == {"value": 1}
+        assert calls == [1]
+        assert cache.stats()["test:near"]["near_hit"] >= 1
+
+    def test_inactive_near_cache_not_used(self, fake_redis):
+        """
+        测试未订阅失效通道时
+        预期: 近端缓存不保存条目
+        """
+        # Arrange
+        load, _ = _counting("test:inactive", ttl=60, near=True)
+
+        # Act
+        load(1)
+
+        # Assert
+        assert len(cache.near_cache) == 0
+
+    def test_invalidation_message_drops_entry(self, fake_redis, near_cache):
+        """
+        测试其他进程发布的失效消息
+        预期: 对应的近端条目被删除
+        """
+        # Arrange
+        load, calls = _counting("test:remote", ttl=60, near=True)
+        load(1)
+        load(2)
+
+        # Act
+        cache.handle_invalidation_message(
+            json.dumps({"ns": "test:remote", "keys": ["1"]})
+        )
+
+        # Assert
+        assert near_cache.get("test:remote", "1") is None
+        assert near_cache.get("test:remote", "2") is not None
+
+    def test_put_ignored_after_concurrent_invalidation(self, near_cache):
+        """
+        测试读取期间发生失效
+        预期: 读取开始前的旧值不会写入近端缓存
+        """
+        # Arrange
+        epoch = near_cache.epoch("test:race")
+        near_cache.discard("test:race", ["1"])
+
+        # Act
+        near_cache.put("test:race", "1", {"e": time.time() + 60, "v": 1}, epoch)
+
+        # Assert
+        assert near_cache.get("test:race", "1") is None
+
+    def test_lru_evicts_oldest_entry(self, near_cache, monkeypatch):
+        """
+        测试容量上限
+        预期: 超出容量时淘汰最久未使用的条目
+        """
+        # Arrange
+        monkeypatch.setattr(near_cache, "max_entries", 2)
+        envelope = {"e": time.time() + 60, "v": 1}
+        near_cache.put("test:lru", "a", envelope, near_cache.epoch("test:lru"))
+        near_cache.put("test:lru", "b", envelope, near_cache.epoch("test:lru"))
+        near_cache.get("test:lru", "a")
+
+        # Act
+        near_cache.put("test:lru", "c", envelope, near_cache.epoch("test:lru"))
+
+        # Assert
+        assert near_cache.get("test:lru", "a") is not None
+        assert near_cache.get("test:lru", "b") is None
+
+    def test_listener_applies_published_invalidations(self, fake_redis):
+        """
+        测试失效订阅线程
+        预期: 订阅后启用近端缓存，收到发布的失效消息后删除条目
+        """
+        # Arrange
+        listener = cache.InvalidationListener()
+        listener.start()
+        try:
+            deadline = time.monotonic() + 5
+            while not cache.near_cache.active and time.monotonic() < deadline:
+                time.sleep(0.01)
+            load, _ = _counting("test:listener", ttl=60, near=True)
+            load(1)
+            assert cache.near_cache.get("test:listener", "1") is not None
+            epoch = cache.near_cache.epoch("test:listener")
+
+            # Act: 模拟另一个进程发布失效
+            fake_redis.publish(
+                cache.CACHE_INVALIDATION_CHANNEL,
+                json.dumps({"ns": "test:listener", "keys": None}),
+            )
+            while (
+                cache.near_cache.epoch("test:listener") == epoch
+                and time.monotonic() < deadline
+            ):
+                time.sleep(0.01)
+
+            # Assert
+            assert cache.near_cache.get("test:listener", "1") is None
+        finally:
+            listener.stop()
+        assert not cache.near_cache.active
@@ -0,0 +1,218 @@
+"""
+安全模块单元测试
+"""
+
+import threading
+from datetime import timedelta
+
+import pytest
+from jose import jwt
+
+from core import security
+from core.metrics import LatencyRecorder
+
+
+@pytest.fixture
+def token_cache():
+    """清空令牌缓存"""
+    security.token_cache.clear()
+    yield security.token_cache
+    security.token_cache.clear()
+
+
+@pytest.mark.unit
+class TestDecodeAccessToken:
+    """访问令牌解码测试套件"""
+
+    def test_decode_caches_verified_token(self, token_cache):
+        """
+        测试重复解码同一令牌
+        预期: 第二次解码命中缓存并返回相同的载荷
+        """
+        # Arrange
+        token = security.create_access_token(42)
+
+        # Act
+        first = security.decode_access_token(token)
+        second = security.decode_access_token(token)
+
+        # Assert
+        assert first.sub == "42"
+        assert second is first
+        assert token_cache.stats()["hits"] == 1
+        assert token_cache.stats()["misses"] == 1
+
+    def test_decode_rejects_expired_token(self, token_cache):
+        """
+        测试过期令牌
+        预期: 抛出JWTError且不写入缓存
+        """
+        # Arrange
+        token = security.create_access_token(42, expires_delta=timedelta(seconds=-1))
+
+        # Act & Assert
+        with pytest.raises(jwt.JWTError):
+            security.decode_access_token(token)
+        assert token_cache.stats()["size"] == 0
+
+    def test_cached_entry_expires_with_token(self, token_cache):
+        """
+        测试缓存条目随令牌过期
+        预期: 过期的缓存条目不会被返回
+        """
+        # Arrange
+        token = security.create_access_token(42)
+        payload = security.decode_access_token(token)
+        token_cache.put(token, payload, expires_at=0)
+
+        # Act & Assert
+        assert token_cache.get(token) is None
+
+    def test_cache_is_bounded(self):
+        """
+        测试缓存容量
+        预期: 超出容量时淘汰最久未使用的条目
+        """
+        # Arrange
+        cache = security.TokenCache(maxsize=2)
+        payload = security.TokenPayload(sub="1")
+        far_future = 2**32
+
+        # Act
+        cache.put("a", payload, far_future)
+        cache.put("b", payload, far_future)
+        cache.get("a")
+        cache.put("c", payload, far_future)
+
+        # Assert
+        assert cache.get("b") is None
+        assert cache.get("a") is payload
+        assert cache.get("c") is payload
+
+
+@pytest.mark.unit
+class TestPermissionClaims:
+    """令牌权限摘要测试套件"""
+
+    def test_claims_round_trip(self, token_cache):
+        """
+        测试权限摘要写入令牌后解码
+        预期: 位图、版本与超级用户标记保持不变
+        """
+        # Arrange
+        claims = security.PermissionClaims(
+            is_superuser=False,
+            version=7,
+            menu_bitmap=bytes([0b10100000]),
+            button_bitmap=bytes(64) + b"\x01",
+        )
+
+        # Act
+        token = security.create_access_token(1, claims=claims.to_claims())
+        payload = security.decode_access_token(token)
+
+        # Assert
+        assert payload.sub == "1"
+        assert security.PermissionClaims.from_payload(payload) == claims
+        assert len(payload.bb) < len(claims.button_bitmap)
+
+    def test_token_without_claims(self, token_cache):
+        """
+        测试未携带权限摘要的令牌
+        预期: from_payload 返回None
+        """
+        token = security.create_access_token(1)
+
+        payload = security.decode_access_token(token)
+
+        assert security.PermissionClaims.from_payload(payload) is None
+
+
+@pytest.mark.unit
+class TestPasswordPool:
+    """密码哈希线程池测试套件"""
+
+    @pytest.mark.asyncio
+    async def test_verify_password_async(self):
+        """
+        测试异步密码校验
+        预期: 结果与同步校验一致
+        """
+        # Arrange
+        hashed = security.get_password_hash("testpassword")
+
+        # Act & Assert
+        assert await security.verify_password_async("testpassword", hashed) is True
+        assert await security.verify_password_async("wrongpassword", hashed) is False
+
+    @pytest.mark.asyncio
+    async def test_saturated_pool_rejects_fast(self, monkeypatch):
+        """
+        测试线程池饱和
+        预期: 立即抛出PasswordHasherBusy
+        """
+        # Arrange
+        monkeypatch.setattr(security, "_password_slots", threading.BoundedSemaphore(1))
+        security._password_slots.acquire()
+
+        # Act & Assert
+        with pytest.raises(security.PasswordHasherBusy):
+            await security.get_password_hash_async("testpassword")
+
+    def test_sync_hash_uses_pool(self, monkeypatch):
+        """
+        测试同步代码中的密码哈希
+        预期: 同样经过线程池并受准入限制
+        """
+        # Arrange
+        monkeypatch.setattr(security, "_password_slots", threading.BoundedSemaphore(1))
+
+        # Act
+        hashed = security.get_password_hash_pooled("testpassword")
+
+        # Assert
+        assert security.verify_password("testpassword", hashed)
+        security._password_slots.acquire()
+        with pytest.raises(security.PasswordHasherBusy):
+            security.get_password_hash_pooled("testpassword")
+
+
+@pytest.mark.unit
+class TestLatencyRecorder:
+    """延迟统计测试套件"""
+
+    def test_percentiles(self):
+        """
+        测试百分位统计
+        预期: 按样本计算p50/p95/p99
+        """
+        # Arrange
+        recorder = LatencyRecorder()
+
+        # Act
+        for ms in range(1, 101):
+            recorder.observe(ms / 1000)
+
+        # Assert
+        stats = recorder.percentiles()
+        assert stats["count"] == 100
+        assert stats["p50_ms"] == 51.0
+        assert stats["p99_ms"] == 100.0
+        assert stats["max_ms"] == 100.0
+
+    def test_histogram(self):
+        """
+        测试直方图
+        预期: 各上限的累计样本数
+        """
+        recorder = LatencyRecorder()
+
+        for ms in (0.5, 3, 3, 40, 2000):
+            recorder.observe(ms / 1000)
+
+        assert recorder.histogram((1, 5, 50)) == {
+            "le_1ms": 1,
+            "le_5ms": 3,
+            "le_50ms": 4,
+            "le_inf": 5,
+        }
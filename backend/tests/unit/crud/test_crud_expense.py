@@ -0,0 +1,296 @@
+"""
+支出CRUD操作单元测试
+"""
+
+import datetime
+
+import pytest
+from sqlalchemy import update
+from sqlalchemy.orm import Session
+
+from crud import crud_expense
+from models.expense import Expense, ExpenseDailyRollup
+from models.user import User
+from schemas.expense import ExpenseCreate, ExpenseUpdate
+
+
+def _create_expenses(db_session: Session, owner: User, count: int) -> None:
+    """创建支出，部分日期相同以覆盖id排序"""
+    base = datetime.datetime(2024, 1, 1)
+    db_session.add_all(
+        [
+            Expense(
+                description=f"expense {i}",
+                amount=float(i),
+                date=base + datetime.timedelta(days=i // 2),
+                owner_id=owner.id,
+            )
+            for i in range(count)
+        ]
+    )
+    db_session.commit()
+
+
+@pytest.mark.unit
+class TestExpensePagination:
+    """支出分页测试套件"""
+
+    def test_cursor_pages_cover_all_expenses_in_order(
+        self, db_session: Session, test_user: User
+    ):
+        """
+        测试游标分页
+        预期: 按(date desc, id desc)不重不漏地遍历所有支出
+        """
+        # Arrange
+        _create_expenses(db_session, test_user, 7)
+        expected = [
+            e.id
+            for e in sorted(
+                db_session.query(Expense).all(),
+                key=lambda e: (e.date, e.id),
+                reverse=True,
+            )
+        ]
+
+        # Act
+        seen, cursor = [], None
+        while True:
+            page = crud_expense.get_expenses_by_owner(
+                db_session, owner_id=test_user.id, limit=3, cursor=cursor
+            )
+            seen.extend(e.id for e in page)
+            cursor = crud_expense.next_cursor(page, 3)
+            if cursor is None:
+                break
+
+        # Assert
+        assert seen == expected
+
+    def test_cursor_pages_include_undated_expenses(
+        self, db_session: Session, test_user: User
+    ):
+        """
+        测试含无日期支出的游标分页
+        预期: 无日期支出排在最前，游标与skip模式均不重不漏
+        """
+        # Arrange
+        _create_expenses(db_session, test_user, 5)
+        undated = [
+            Expense(description=f"undated {i}", amount=1.0, owner_id=test_user.id)
+            for i in range(3)
+        ]
+        db_session.add_all(undated)
+        db_session.commit()
+        db_session.execute(
+            update(Expense)
+            .where(Expense.id.in_([e.id for e in undated]))
+            .values(date=None)
+        )
+        db_session.commit()
+        dated = sorted(
+            db_session.query(Expense).filter(Expense.date.is_not(None)).all(),
+            key=lambda e: (e.date, e.id),
+            reverse=True,
+        )
+        expected = sorted((e.id for e in undated), reverse=True) + [
+            e.id for e in dated
+        ]
+
+        # Act
+        seen, cursor = [], None
+        while True:
+            page = crud_expense.get_expenses_by_owner(
+                db_session, owner_id=test_user.id, limit=2, cursor=cursor
+            )
+            seen.extend(e.id for e in page)
+            cursor = crud_expense.next_cursor(page, 2)
+            if cursor is None:
+                break
+        by_skip = [
+            e.id
+            for skip in range(0, len(expected), 2)
+            for e in crud_expense.get_expenses_by_owner(
+                db_session, owner_id=test_user.id, skip=skip, limit=2
+            )
+        ]
+
+        # Assert
+        assert seen == expected
+        assert by_skip == expected
+
+    def test_skip_mode_uses_same_order(self, db_session: Session, test_user: User):
+        """
+        测试兼容的skip分页
+        预期: 第一页与游标模式一致
+        """
+        # Arrange
+        _create_expenses(db_session, test_user, 5)
+
+        # Act
+        by_skip = crud_expense.get_expenses_by_owner(
+            db_session, owner_id=test_user.id, skip=0, limit=3
+        )
+        by_cursor = crud_expense.get_expenses_by_owner(
+            db_session, owner_id=test_user.id, limit=3, cursor=None
+        )
+
+        # Assert
+        assert [e.id for e in by_skip] == [e.id for e in by_cursor]
+
+    def test_invalid_cursor_raises(self, db_session: Session):
+        """
+        测试非法游标
+        预期: 抛出ValueError
+        """
+        # Act & Assert
+        with pytest.raises(ValueError):
+            crud_expense.get_expenses(db_session, cursor="not-a-cursor")
+
+
+@pytest.mark.unit
+class TestExpenseRollups:
+    """支出汇总测试套件"""
+
+    def test_rollups_follow_create_update_delete(
+        self, db_session: Session, test_user: User
+    ):
+        """
+        测试增删改后的汇总
+        预期: 汇总与支出表重新计算的结果一致
+        """
+        # Arrange
+        coffee = crud_expense.create_expense(
+            db_session, ExpenseCreate(description="coffee", amount=3), test_user.id
+        )
+        crud_expense.create_expense(
+            db_session, ExpenseCreate(description="coffee", amount=5), test_user.id
+        )
+        food = crud_expense.create_expense(
+            db_session, ExpenseCreate(description="food", amount=10), test_user.id
+        )
+
+        # Act
+        crud_expense.update_expense(
+            db_session, coffee, ExpenseUpdate(description="tea", amount=4)
+        )
+        crud_expense.delete_expense(db_session, food.id)
+        summary = crud_expense.get_expense_summary(
+            db_session, owner_id=test_user.id, group_by="description"
+        )
+
+        # Assert
+        assert [(b.key, b.total, b.count) for b in summary] == [
+            ("coffee", 5.0, 1),
+            ("tea", 4.0, 1),
+        ]
+        assert db_session.query(ExpenseDailyRollup).count() == 2
+
+    def test_undated_expense_update_and_delete(
+        self, db_session: Session, test_user: User
+    ):
+        """
+        测试无日期支出的修改和删除
+        预期: 不报错，且不影响汇总
+        """
+        # Arrange
+        crud_expense.create_expense(
+            db_session, ExpenseCreate(description="coffee", amount=3), test_user.id
+        )
+        undated = crud_expense.create_expense(
+            db_session, ExpenseCreate(description="coffee", amount=5), test_user.id
+        )
+        db_session.execute(
+            update(Expense).where(Expense.id == undated.id).values(date=None)
+        )
+        crud_expense.rebuild_expense_rollups(db_session, owner_id=test_user.id)
+        db_session.refresh(undated)
+
+        # Act
+        updated = crud_expense.update_expense(
+            db_session, undated, ExpenseUpdate(description="tea", amount=4)
+        )
+        summary_after_update = crud_expense.get_expense_summary(
+            db_session, owner_id=test_user.id, group_by="description"
+        )
+        crud_expense.delete_expense(db_session, undated.id)
+        summary_after_delete = crud_expense.get_expense_summary(
+            db_session, owner_id=test_user.id, group_by="description"
+        )
+
+        # Assert
+        assert updated.description == "tea"
+        assert updated.date is None
+        assert [(b.key, b.total, b.count) for b in summary_after_update] == [
+            ("coffee", 3.0, 1)
+        ]
+        assert summary_after_delete == summary_after_update
+        assert crud_expense.get_expense(db_session, undated.id) is None
+
+    def test_bulk_create_across_chunks(self, db_session: Session, test_user: User):
+        """
+        测试跨批次的批量创建
+        预期: 全部写入，ID按输入顺序返回，汇总与逐行重算的结果一致
+        """
+        # Arrange
+        items = [
+            ExpenseCreate(description=["coffee", "food", None][i % 3], amount=i + 1)
+            for i in range(7)
+        ]
+
+        # Act
+        ids = crud_expense.create_expenses_bulk(
+            db_session, items, test_user.id, chunk_size=3
+        )
+        bulk_rollups = sorted(
+            (r.day, r.description, r.total, r.count)
+            for r in db_session.query(ExpenseDailyRollup).all()
+        )
+        crud_expense.rebuild_expense_rollups(db_session, owner_id=test_user.id)
+        rebuilt_rollups = sorted(
+            (r.day, r.description, r.total, r.count)
+            for r in db_session.query(ExpenseDailyRollup).all()
+        )
+
+        # Assert
+        rows = {e.id: e for e in db_session.query(Expense).all()}
+        assert len(ids) == len(set(ids)) == len(rows) == 7
+        assert [(rows[i].description, rows[i].amount) for i in ids] == [
+            (item.description, item.amount) for item in items
+        ]
+        assert bulk_rollups == rebuilt_rollups
+        assert sorted((d, t, c) for _, d, t, c in bulk_rollups) == [
+            ("", 3.0 + 6.0, 2),
+            ("coffee", 1.0 + 4.0 + 7.0, 3),
+            ("food", 2.0 + 5.0, 2),
+        ]
+
+    def test_summary_by_day_and_month(self, db_session: Session, test_user: User):
+        """
+        测试按日、按月汇总及日期过滤
+        预期: 返回正确的合计、数量和平均值
+        """
+        # Arrange
+        _create_expenses(db_session, test_user, 6)
+        crud_expense.rebuild_expense_rollups(db_session, owner_id=test_user.id)
+
+        # Act
+        by_day = crud_expense.get_expense_summary(
+            db_session, owner_id=test_user.id, group_by="day"
+        )
+        by_month = crud_expense.get_expense_summary(
+            db_session,
+            owner_id=test_user.id,
+            group_by="month",
+            start=datetime.date(2024, 1, 2),
+        )
+
+        # Assert
+        assert [(b.key, b.total, b.count) for b in by_day] == [
+            ("2024-01-01", 1.0, 2),
+            ("2024-01-02", 5.0, 2),
+            ("2024-01-03", 9.0, 2),
+        ]
+        assert [(b.key, b.total, b.average) for b in by_month] == [
+            ("2024-01", 14.0, 3.5)
+        ]
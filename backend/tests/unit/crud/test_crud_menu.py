@@ -0,0 +1,771 @@
+"""
+菜单CRUD操作单元测试
+"""
+
+import pytest
+from sqlalchemy import event, select
+from sqlalchemy.orm import Session
+
+from core import bitmap
+from crud import crud_menu, crud_menu_async
+from db.session import AsyncSessionLocal, async_engine
+from models.menu import MenuItem, UserMenuItem, ButtonPermission, UserButtonPermission
+from models.user import User
+from schemas.menu import (
+    MenuItem as MenuItemSchema,
+    MenuItemUpdate,
+    UserButtonPermission as UserButtonPermissionSchema,
+    UserMenuPermission,
+)
+from core.security import get_password_hash
+
+
+def _create_user(
+    db_session: Session, is_superuser: bool = False, username: str = "menuuser"
+) -> User:
+    user = User(
+        username=username,
+        email=f"{username}@example.com",
+        hashed_password=get_password_hash("testpassword"),
+        is_superuser=is_superuser,
+    )
+    db_session.add(user)
+    db_session.commit()
+    db_session.refresh(user)
+    return user
+
+
+def _create_catalog(db_session: Session) -> dict:
+    """创建两级菜单及按钮: dashboard -> (reports, settings), hidden(未授权)"""
+    dashboard = MenuItem(title="Dashboard", order=1)
+    hidden = MenuItem(title="Hidden", order=2)
+    db_session.add_all([dashboard, hidden])
+    db_session.commit()
+
+    settings_menu = MenuItem(title="Settings", parent_id=dashboard.id, order=2)
+    reports = MenuItem(title="Reports", parent_id=dashboard.id, order=1)
+    inactive = MenuItem(
+        title="Inactive", parent_id=dashboard.id, order=0, is_active=False
+    )
+    db_session.add_all([settings_menu, reports, inactive])
+    db_session.commit()
+
+    db_session.add_all(
+        [
+            ButtonPermission(button_id="dashboard_view", menu_item_id=dashboard.id),
+            ButtonPermission(button_id="reports_export", menu_item_id=reports.id),
+            ButtonPermission(button_id="hidden_edit", menu_item_id=hidden.id),
+        ]
+    )
+    db_session.commit()
+    return {"dashboard": dashboard, "hidden": hidden, "reports": reports}
+
+
+@pytest.mark.unit
+class TestBuildUserMenuTree:
+    """用户菜单树构建测试套件"""
+
+    def test_build_tree_for_normal_user(self, db_session: Session):
+        """
+        测试普通用户菜单树
+        预期: 只返回已授权的根菜单，子菜单按order排序并附带按钮权限
+        """
+        # Arrange
+        user = _create_user(db_session)
+        catalog = _create_catalog(db_session)
+        db_session.add_all(
+            [
+                UserMenuItem(user_id=user.id, menu_item_id=catalog["dashboard"].id),
+                UserButtonPermission(
+                    user_id=user.id, button_id="reports_export", has_permission=True
+                ),
+            ]
+        )
+        db_session.commit()
+
+        # Act
+        tree = crud_menu.build_user_menu_tree(db_session, user_id=user.id)
+
+        # Assert
+        assert [menu.title for menu in tree] == ["Dashboard"]
+        assert [child.title for child in tree[0].children] == ["Reports", "Settings"]
+        assert [(b.button_id, b.has_permission) for b in tree[0].buttons] == [
+            ("dashboard_view", False)
+        ]
+        assert [
+            (b.button_id, b.has_permission) for b in tree[0].children[0].buttons
+        ] == [("reports_export", True)]
+
+    def test_build_tree_for_superuser(self, db_session: Session):
+        """
+        测试超级用户菜单树
+        预期: 返回所有活跃的根菜单
+        """
+        # Arrange
+        user = _create_user(db_session, is_superuser=True)
+        _create_catalog(db_session)
+
+        # Act
+        tree = crud_menu.build_user_menu_tree(db_session, user_id=user.id)
+
+        # Assert
+        assert [menu.title for menu in tree] == ["Dashboard", "Hidden"]
+
+    def test_build_tree_query_count_is_constant(self, db_session: Session):
+        """
+        测试菜单树查询次数
+        预期: 查询次数与菜单节点数量无关
+        """
+        # Arrange
+        user = _create_user(db_session)
+        catalog = _create_catalog(db_session)
+        db_session.add(
+            UserMenuItem(user_id=user.id, menu_item_id=catalog["dashboard"].id)
+        )
+        db_session.commit()
+        user_id = user.id
+        statements = []
+
+        def count_statement(conn, cursor, statement, *args):
+            statements.append(statement)
+
+        engine = db_session.get_bind()
+        event.listen(engine, "before_cursor_execute", count_statement)
+
+        # Act
+        try:
+            crud_menu.build_user_menu_tree(db_session, user_id=user_id)
+        finally:
+            event.remove(engine, "before_cursor_execute", count_statement)
+
+        # Assert
+        assert len(statements) <= 5
+
+
+@pytest.mark.unit
+class TestUserMenuTreeCache:
+    """用户菜单树缓存测试套件"""
+
+    def test_menu_tree_cached_after_first_read(self, db_session: Session, fake_redis):
+        """
+        测试菜单树缓存
+        预期: 首次读取后写入Redis，再次读取返回相同内容
+        """
+        # Arrange
+        user = _create_user(db_session, is_superuser=True)
+        _create_catalog(db_session)
+
+        # Act
+        first = crud_menu.get_user_menu_tree_json(db_session, user_id=user.id)
+        second = crud_menu.get_user_menu_tree_json(db_session, user_id=user.id)
+
+        # Assert
+        assert first == second
+        assert fake_redis.get(f"menu:tree:user:{user.id}") == first
+
+    def test_set_user_menu_permissions_invalidates_cache(
+        self, db_session: Session, fake_redis
+    ):
+        """
+        测试设置用户菜单权限后缓存失效
+        预期: 下次读取返回新的权限
+        """
+        # Arrange
+        user = _create_user(db_session)
+        catalog = _create_catalog(db_session)
+        assert crud_menu.get_user_menu_tree_json(db_session, user_id=user.id) == b"[]"
+
+        # Act
+        crud_menu.set_user_menu_permissions(
+            db_session,
+            user_id=user.id,
+            menu_permissions=[
+                UserMenuPermission(menu_item_id=catalog["hidden"].id)
+            ],
+        )
+        payload = crud_menu.get_user_menu_tree_json(db_session, user_id=user.id)
+
+        # Assert
+        assert b'"title":"Hidden"' in payload
+
+    def test_menu_item_change_invalidates_all_users(
+        self, db_session: Session, fake_redis
+    ):
+        """
+        测试菜单项变更后全部缓存失效
+        预期: 所有用户的菜单树缓存被删除
+        """
+        # Arrange
+        user = _create_user(db_session, is_superuser=True)
+        catalog = _create_catalog(db_session)
+        crud_menu.get_user_menu_tree_json(db_session, user_id=user.id)
+
+        # Act
+        crud_menu.update_menu_item(
+            db_session,
+            menu_item_id=catalog["hidden"].id,
+            menu_item_update=MenuItemUpdate(title="Visible"),
+        )
+        payload = crud_menu.get_user_menu_tree_json(db_session, user_id=user.id)
+
+        # Assert
+        assert b'"title":"Visible"' in payload
+
+    def test_stale_tree_not_stored_after_concurrent_invalidation(
+        self, db_session: Session, fake_redis, monkeypatch
+    ):
+        """
+        测试构建期间发生失效
+        预期: 构建结果不会写入缓存
+        """
+        # Arrange
+        user = _create_user(db_session, is_superuser=True)
+        _create_catalog(db_session)
+        build = crud_menu.build_user_menu_tree
+
+        def build_then_invalidate(db, user_id):
+            tree = build(db, user_id)
+            crud_menu.invalidate_user_menu_tree(user_id)
+            return tree
+
+        monkeypatch.setattr(crud_menu, "build_user_menu_tree", build_then_invalidate)
+
+        # Act
+        crud_menu.get_user_menu_tree_json(db_session, user_id=user.id)
+
+        # Assert
+        assert fake_redis.get(f"menu:tree:user:{user.id}") is None
+
+
+@pytest.mark.unit
+class TestAsyncBuildUserMenuTree:
+    """异步用户菜单树构建测试套件"""
+
+    @pytest.mark.asyncio
+    async def test_async_tree_matches_sync_tree(self, db_session: Session):
+        """
+        测试异步菜单树
+        预期: 与同步实现的结果一致
+        """
+        # Arrange
+        user = _create_user(db_session)
+        catalog = _create_catalog(db_session)
+        db_session.add(
+            UserMenuItem(user_id=user.id, menu_item_id=catalog["dashboard"].id)
+        )
+        db_session.commit()
+        expected = crud_menu.build_user_menu_tree(db_session, user_id=user.id)
+
+        # Act
+        try:
+            async with AsyncSessionLocal() as async_db:
+                tree = await crud_menu_async.build_user_menu_tree(
+                    async_db, user_id=user.id
+                )
+        finally:
+            await async_engine.dispose()
+
+        # Assert
+        assert tree == expected
+
+
+def _count_statements(db_session: Session):
+    """记录会话所用引擎执行的SQL语句"""
+    statements = []
+
+    def count_statement(conn, cursor, statement, *args):
+        statements.append(statement)
+
+    engine = db_session.get_bind()
+    event.listen(engine, "before_cursor_execute", count_statement)
+    return statements, lambda: event.remove(
+        engine, "before_cursor_execute", count_statement
+    )
+
+
+@pytest.mark.unit
+class TestCheckUserButtonPermission:
+    """按钮权限检查测试套件"""
+
+    def _grant(self, db_session: Session, user_id: int, *button_ids: str) -> None:
+        crud_menu.set_user_button_permissions(
+            db_session,
+            user_id=user_id,
+            button_permissions=[
+                UserButtonPermissionSchema(button_id=button_id, has_permission=True)
+                for button_id in button_ids
+            ],
+        )
+
+    def test_check_served_from_redis_bitmap(self, db_session: Session, fake_redis):
+        """
+        测试已缓存的按钮权限检查
+        预期: 设置权限后检查不再访问数据库
+        """
+        # Arrange
+        user = _create_user(db_session)
+        _create_catalog(db_session)
+        user_id = user.id
+        self._grant(db_session, user_id, "reports_export")
+        crud_menu.get_button_bit_indexes(db_session)
+        statements, stop = _count_statements(db_session)
+
+        # Act
+        try:
+            granted = crud_menu.check_user_button_permission(
+                db_session, user_id, "reports_export", is_superuser=False
+            )
+            denied = crud_menu.check_user_button_permission(
+                db_session, user_id, "hidden_edit", is_superuser=False
+            )
+        finally:
+            stop()
+
+        # Assert
+        assert granted is True
+        assert denied is False
+        assert statements == []
+
+    def test_cold_cache_rebuilt_with_one_query(self, db_session: Session, fake_redis):
+        """
+        测试冷缓存
+        预期: 一次查询重建位图，之后的检查命中缓存
+        """
+        # Arrange
+        user = _create_user(db_session)
+        _create_catalog(db_session)
+        user_id = user.id
+        self._grant(db_session, user_id, "reports_export")
+        fake_redis.flushall()
+        crud_menu.get_button_bit_indexes(db_session)
+        statements, stop = _count_statements(db_session)
+
+        # Act
+        try:
+            first = crud_menu.check_user_button_permission(
+                db_session, user_id, "reports_export", is_superuser=False
+            )
+            second = crud_menu.check_user_button_permission(
+                db_session, user_id, "dashboard_view", is_superuser=False
+            )
+        finally:
+            stop()
+
+        # Assert
+        assert (first, second) == (True, False)
+        assert len(statements) == 1
+
+    def test_empty_grants_cached(self, db_session: Session, fake_redis):
+        """
+        测试没有任何按钮权限的用户
+        预期: 空位图同样被缓存，不会每次都查询数据库
+        """
+        # Arrange
+        user = _create_user(db_session)
+        user_id = user.id
+        crud_menu.check_user_button_permission(
+            db_session, user_id, "reports_export", is_superuser=False
+        )
+        statements, stop = _count_statements(db_session)
+
+        # Act
+        try:
+            result = crud_menu.check_user_button_permission(
+                db_session, user_id, "reports_export", is_superuser=False
+            )
+        finally:
+            stop()
+
+        # Assert
+        assert result is False
+        assert statements == []
+
+    def test_cold_fill_does_not_overwrite_newer_bitmap(
+        self, db_session: Session, fake_redis
+    ):
+        """
+        测试冷加载与写路径并发
+        预期: 写路径在冷加载期间写入的位图不会被旧数据覆盖
+        """
+        # Arrange
+        user = _create_user(db_session)
+        _create_catalog(db_session)
+        user_id = user.id
+        key = crud_menu.USER_BUTTONS_KEY.format(user_id=user_id)
+        newer = bitmap.from_indexes(
+            [crud_menu.get_button_bit_indexes(db_session)["reports_export"]]
+        )
+        crud_menu.store_user_buttons(user_id, newer)
+        # 模拟读取时缓存尚未写入
+        fake_redis.get = lambda name: None
+
+        # Act
+        try:
+            stale = crud_menu.check_user_button_permission(
+                db_session, user_id, "reports_export", is_superuser=False
+            )
+        finally:
+            del fake_redis.get
+
+        # Assert
+        assert stale is False
+        assert fake_redis.get(key) == newer
+        assert crud_menu.check_user_button_permission(
+            db_session, user_id, "reports_export", is_superuser=False
+        )
+
+    def test_superuser_without_flag_loads_user(self, db_session: Session):
+        """
+        测试未传入is_superuser
+        预期: 从数据库读取用户标记，超级用户拥有全部按钮权限
+        """
+        # Arrange
+        user = _create_user(db_session, is_superuser=True)
+
+        # Act
+        result = crud_menu.check_user_button_permission(
+            db_session, user.id, "anything"
+        )
+
+        # Assert
+        assert result is True
+
+
+@pytest.mark.unit
+class TestPermissionBitmaps:
+    """权限位图测试套件"""
+
+    def test_bit_indexes_assigned_densely(self, db_session: Session):
+        """
+        测试位图位置分配
+        预期: 菜单与按钮各自从0开始连续分配
+        """
+        # Act
+        catalog = _create_catalog(db_session)
+
+        # Assert
+        menu_bits = db_session.scalars(select(MenuItem.bit_index)).all()
+        button_bits = db_session.scalars(select(ButtonPermission.bit_index)).all()
+        assert sorted(menu_bits) == [0, 1, 2, 3, 4]
+        assert sorted(button_bits) == [0, 1, 2]
+        assert catalog["dashboard"].bit_index == 0
+
+    def test_users_with_grant(self, db_session: Session):
+        """
+        测试按菜单/按钮反查用户
+        预期: 只返回物化位图中置位的用户
+        """
+        # Arrange
+        catalog = _create_catalog(db_session)
+        granted = _create_user(db_session, username="granted")
+        other = _create_user(db_session, username="other")
+        granted_id, other_id = granted.id, other.id
+        crud_menu.set_user_menu_permissions(
+            db_session,
+            user_id=granted_id,
+            menu_permissions=[UserMenuPermission(menu_item_id=catalog["reports"].id)],
+        )
+        crud_menu.set_user_button_permissions(
+            db_session,
+            user_id=other_id,
+            button_permissions=[
+                UserButtonPermissionSchema(button_id="hidden_edit", has_permission=True)
+            ],
+        )
+
+        # Act & Assert
+        assert crud_menu.get_users_with_menu(db_session, catalog["reports"].id) == [
+            granted_id
+        ]
+        assert crud_menu.get_users_with_menu(db_session, catalog["hidden"].id) == []
+        assert crud_menu.get_users_with_button(db_session, "hidden_edit") == [other_id]
+        assert crud_menu.get_users_with_button(db_session, "missing") == []
+
+    def test_delete_menu_item_clears_bit(self, db_session: Session):
+        """
+        测试删除菜单项
+        预期: 持有该位的用户被重算，位置复用后不会误授权
+        """
+        # Arrange
+        catalog = _create_catalog(db_session)
+        user = _create_user(db_session)
+        user_id = user.id
+        hidden_id = catalog["hidden"].id
+        crud_menu.set_user_menu_permissions(
+            db_session,
+            user_id=user_id,
+            menu_permissions=[UserMenuPermission(menu_item_id=hidden_id)],
+        )
+        db_session.query(ButtonPermission).filter_by(button_id="hidden_edit").delete()
+        db_session.query(UserMenuItem).filter_by(menu_item_id=hidden_id).delete()
+        db_session.commit()
+
+        # Act
+        deleted = crud_menu.delete_menu_item(db_session, hidden_id)
+
+        # Assert
+        assert deleted is True
+        assert crud_menu.get_users_with_menu(db_session, hidden_id) == []
+        _, permissions = crud_menu.get_effective_permissions(db_session, user_id)
+        assert permissions == crud_menu.EMPTY_PERMISSIONS
+
+
+@pytest.mark.unit
+class TestMenuTreeLoading:
+    """物化路径与菜单树加载测试套件"""
+
+    def test_paths_assigned_on_create(self, db_session: Session):
+        """
+        测试新建菜单项
+        预期: 物化路径为祖先ID序列
+        """
+        # Act
+        catalog = _create_catalog(db_session)
+
+        # Assert
+        assert catalog["dashboard"].path == "/"
+        assert catalog["reports"].path == f"/{catalog['dashboard'].id}/"
+
+    def test_catalog_serialized_with_two_queries(self, db_session: Session):
+        """
+        测试加载并序列化整个目录
+        预期: 一条分页查询加一条子孙节点查询，children 不再懒加载
+        """
+        # Arrange
+        _create_catalog(db_session)
+        db_session.expire_all()
+        statements, stop = _count_statements(db_session)
+
+        # Act
+        try:
+            items = crud_menu.get_menu_items(db_session)
+            serialized = [MenuItemSchema.model_validate(item) for item in items]
+        finally:
+            stop()
+
+        # Assert
+        assert len(statements) == 2
+        assert [item.title for item in serialized] == [
+            "Dashboard",
+            "Hidden",
+            "Reports",
+            "Settings",
+        ]
+        assert [child.title for child in serialized[0].children] == [
+            "Reports",
+            "Settings",
+        ]
+
+    def test_page_limited_in_sql(self, db_session: Session):
+        """
+        测试分页
+        预期: LIMIT/OFFSET 在SQL中执行，只加载本页节点及其子孙节点
+        """
+        # Arrange
+        _create_catalog(db_session)
+        db_session.expire_all()
+        statements, stop = _count_statements(db_session)
+
+        # Act
+        try:
+            items = crud_menu.get_menu_items(db_session, skip=1, limit=2)
+            serialized = [MenuItemSchema.model_validate(item) for item in items]
+        finally:
+            stop()
+
+        # Assert
+        assert "LIMIT" in statements[0]
+        assert [item.title for item in serialized] == ["Hidden", "Reports"]
+        assert all(item.children == [] for item in serialized)
+        assert len(statements) == 2
+
+    def test_subtree_loaded_with_one_query(self, db_session: Session):
+        """
+        测试加载子树
+        预期: 只返回根及其子孙节点，根节点排在首位
+        """
+        # Arrange
+        catalog = _create_catalog(db_session)
+        dashboard_id = catalog["dashboard"].id
+        statements, stop = _count_statements(db_session)
+
+        # Act
+        try:
+            subtree = crud_menu.load_menu_tree(
+                db_session, root_id=dashboard_id, include_inactive=True
+            )
+        finally:
+            stop()
+
+        # Assert
+        assert len(statements) == 1
+        assert [item.title for item in subtree] == [
+            "Dashboard",
+            "Inactive",
+            "Reports",
+            "Settings",
+        ]
+
+    def test_move_updates_descendant_paths(self, db_session: Session):
+        """
+        测试移动菜单项
+        预期: 被移动节点及其子孙节点的路径同步更新
+        """
+        # Arrange
+        catalog = _create_catalog(db_session)
+        dashboard_id, hidden_id = catalog["dashboard"].id, catalog["hidden"].id
+
+        # Act
+        crud_menu.update_menu_item(
+            db_session, dashboard_id, MenuItemUpdate(parent_id=hidden_id)
+        )
+
+        # Assert
+        db_session.expire_all()
+        assert catalog["dashboard"].path == f"/{hidden_id}/"
+        assert catalog["reports"].path == f"/{hidden_id}/{dashboard_id}/"
+        roots = [
+            item
+            for item in crud_menu.load_menu_tree(db_session)
+            if item.parent_id is None
+        ]
+        assert [item.title for item in roots] == ["Hidden"]
+
+    def test_move_under_own_subtree_rejected(self, db_session: Session):
+        """
+        测试移动到自身子树下
+        预期: 抛出 ValueError，数据不变
+        """
+        # Arrange
+        catalog = _create_catalog(db_session)
+        dashboard_id = catalog["dashboard"].id
+
+        # Act & Assert
+        with pytest.raises(ValueError):
+            crud_menu.update_menu_item(
+                db_session,
+                dashboard_id,
+                MenuItemUpdate(parent_id=catalog["reports"].id),
+            )
+        assert crud_menu.get_menu_item(db_session, dashboard_id).parent_id is None
+
+
+@pytest.mark.unit
+class TestSetUserPermissionsDiff:
+    """按差异设置用户权限测试套件"""
+
+    def test_button_permissions_diff(self, db_session: Session):
+        """
+        测试按钮权限差异写入
+        预期: 返回新增、删除与取值变化的按钮，未变化的行保持原主键
+        """
+        # Arrange
+        user = _create_user(db_session)
+        _create_catalog(db_session)
+        user_id = user.id
+        crud_menu.set_user_button_permissions(
+            db_session,
+            user_id=user_id,
+            button_permissions=[
+                UserButtonPermissionSchema(
+                    button_id="dashboard_view", has_permission=True
+                ),
+                UserButtonPermissionSchema(
+                    button_id="reports_export", has_permission=True
+                ),
+            ],
+        )
+        kept_id = (
+            db_session.query(UserButtonPermission.id)
+            .filter_by(user_id=user_id, button_id="dashboard_view")
+            .scalar()
+        )
+
+        # Act
+        changes = crud_menu.set_user_button_permissions(
+            db_session,
+            user_id=user_id,
+            button_permissions=[
+                UserButtonPermissionSchema(
+                    button_id="dashboard_view", has_permission=True
+                ),
+                UserButtonPermissionSchema(
+                    button_id="reports_export", has_permission=False
+                ),
+                UserButtonPermissionSchema(
+                    button_id="hidden_edit", has_permission=True
+                ),
+            ],
+        )
+
+        # Assert
+        assert changes.added == ["hidden_edit"]
+        assert changes.removed == []
+        assert changes.updated == ["reports_export"]
+        rows = {
+            row.button_id: (row.id, row.has_permission)
+            for row in crud_menu.get_user_button_permissions(db_session, user_id)
+        }
+        assert rows["dashboard_view"] == (kept_id, True)
+        assert rows["reports_export"][1] is False
+        assert rows["hidden_edit"][1] is True
+
+    def test_menu_permissions_diff_removes_missing(self, db_session: Session):
+        """
+        测试菜单权限差异写入
+        预期: 未出现在新列表中的菜单权限被删除
+        """
+        # Arrange
+        user = _create_user(db_session)
+        catalog = _create_catalog(db_session)
+        user_id = user.id
+        dashboard_id, hidden_id = catalog["dashboard"].id, catalog["hidden"].id
+        crud_menu.set_user_menu_permissions(
+            db_session,
+            user_id=user_id,
+            menu_permissions=[
+                UserMenuPermission(menu_item_id=dashboard_id),
+                UserMenuPermission(menu_item_id=hidden_id),
+            ],
+        )
+
+        # Act
+        changes = crud_menu.set_user_menu_permissions(
+            db_session,
+            user_id=user_id,
+            menu_permissions=[UserMenuPermission(menu_item_id=dashboard_id)],
+        )
+
+        # Assert
+        assert changes == crud_menu.PermissionChanges([], [hidden_id], [])
+        assert [
+            p.menu_item_id
+            for p in crud_menu.get_user_menu_permissions(db_session, user_id)
+        ] == [dashboard_id]
+
+    def test_unchanged_permissions_issue_no_writes(self, db_session: Session):
+        """
+        测试权限未变化
+        预期: 不执行任何写语句，变更集为空
+        """
+        # Arrange
+        user = _create_user(db_session)
+        catalog = _create_catalog(db_session)
+        user_id = user.id
+        menu_permissions = [UserMenuPermission(menu_item_id=catalog["dashboard"].id)]
+        crud_menu.set_user_menu_permissions(
+            db_session, user_id=user_id, menu_permissions=menu_permissions
+        )
+        statements, stop = _count_statements(db_session)
+
+        # Act
+        try:
+            changes = crud_menu.set_user_menu_permissions(
+                db_session, user_id=user_id, menu_permissions=menu_permissions
+            )
+        finally:
+            stop()
+
+        # Assert
+        assert not changes.changed
+        assert [s for s in statements if not s.lstrip().startswith("SELECT")] == []
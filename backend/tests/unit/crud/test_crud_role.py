@@ -0,0 +1,327 @@
+"""
+角色CRUD操作单元测试
+"""
+
+import pytest
+from sqlalchemy.orm import Session
+
+from core import bitmap
+from crud import crud_menu, crud_role
+from models.menu import ButtonPermission, MenuItem, UserMenuItem
+from models.role import RoleMenuItem, UserEffectivePermission
+from models.user import User
+from schemas.menu import UserButtonPermission, UserMenuPermission
+from schemas.role import RoleCreate, RolePermissions
+from core.security import get_password_hash
+
+
+def _create_users(db_session: Session, count: int) -> list:
+    users = [
+        User(
+            username=f"roleuser{i}",
+            email=f"roleuser{i}@example.com",
+            hashed_password=get_password_hash("testpassword"),
+        )
+        for i in range(count)
+    ]
+    db_session.add_all(users)
+    db_session.commit()
+    return [user.id for user in users]
+
+
+def _create_catalog(db_session: Session) -> dict:
+    """创建两个根菜单及各自的按钮"""
+    orders = MenuItem(title="Orders", order=1)
+    reports = MenuItem(title="Reports", order=2)
+    db_session.add_all([orders, reports])
+    db_session.commit()
+    db_session.add_all(
+        [
+            ButtonPermission(button_id="orders_view", menu_item_id=orders.id),
+            ButtonPermission(button_id="orders_delete", menu_item_id=orders.id),
+            ButtonPermission(button_id="reports_export", menu_item_id=reports.id),
+        ]
+    )
+    db_session.commit()
+    return {"orders": orders.id, "reports": reports.id}
+
+
+def _create_role(db_session: Session, name: str, menus, buttons) -> int:
+    role = crud_role.create_role(db_session, RoleCreate(name=name))
+    crud_role.set_role_permissions(
+        db_session,
+        role_id=role.id,
+        permissions=RolePermissions(menu_item_ids=menus, button_ids=buttons),
+    )
+    return role.id
+
+
+@pytest.mark.unit
+class TestRolePermissions:
+    """角色授权测试套件"""
+
+    def test_user_inherits_role_grants(self, db_session: Session):
+        """
+        测试用户继承角色授权
+        预期: 最终权限为所有角色授权的并集
+        """
+        # Arrange
+        [user_id] = _create_users(db_session, 1)
+        catalog = _create_catalog(db_session)
+        clerk = _create_role(db_session, "clerk", [catalog["orders"]], ["orders_view"])
+        analyst = _create_role(
+            db_session, "analyst", [catalog["reports"]], ["reports_export"]
+        )
+
+        # Act
+        crud_role.set_user_roles(db_session, user_id=user_id, role_ids=[clerk, analyst])
+
+        # Assert
+        assert crud_menu.check_user_button_permissions(
+            db_session,
+            user_id,
+            ["orders_view", "orders_delete", "reports_export"],
+            is_superuser=False,
+        ) == {"orders_view": True, "orders_delete": False, "reports_export": True}
+        assert [
+            m.title for m in crud_menu.get_user_accessible_menus(db_session, user_id)
+        ] == ["Orders", "Reports"]
+
+    def test_user_overrides_applied_after_roles(self, db_session: Session):
+        """
+        测试用户级覆盖
+        预期: has_permission=False 移除角色授予的按钮，True 追加额外按钮
+        """
+        # Arrange
+        [user_id] = _create_users(db_session, 1)
+        catalog = _create_catalog(db_session)
+        clerk = _create_role(
+            db_session, "clerk", [catalog["orders"]], ["orders_view", "orders_delete"]
+        )
+        crud_role.set_user_roles(db_session, user_id=user_id, role_ids=[clerk])
+
+        # Act
+        crud_menu.set_user_button_permissions(
+            db_session,
+            user_id=user_id,
+            button_permissions=[
+                UserButtonPermission(button_id="orders_delete", has_permission=False),
+                UserButtonPermission(button_id="reports_export", has_permission=True),
+            ],
+        )
+
+        # Assert
+        result = crud_menu.check_user_button_permissions(
+            db_session,
+            user_id,
+            ["orders_view", "orders_delete", "reports_export"],
+            is_superuser=False,
+        )
+        assert result == {
+            "orders_view": True,
+            "orders_delete": False,
+            "reports_export": True,
+        }
+
+    def test_role_change_recomputes_only_members(self, db_session: Session):
+        """
+        测试角色授权变更
+        预期: 只重算该角色成员的最终权限
+        """
+        # Arrange
+        member, outsider = _create_users(db_session, 2)
+        catalog = _create_catalog(db_session)
+        clerk = _create_role(db_session, "clerk", [catalog["orders"]], [])
+        crud_role.set_user_roles(db_session, user_id=member, role_ids=[clerk])
+        crud_menu.set_user_menu_permissions(
+            db_session,
+            user_id=outsider,
+            menu_permissions=[UserMenuPermission(menu_item_id=catalog["orders"])],
+        )
+        outsider_version = db_session.get(UserEffectivePermission, outsider).version
+
+        # Act
+        changes = crud_role.set_role_permissions(
+            db_session,
+            role_id=clerk,
+            permissions=RolePermissions(
+                menu_item_ids=[catalog["orders"]], button_ids=["orders_view"]
+            ),
+        )
+
+        # Assert
+        assert changes.affected_user_ids == [member]
+        assert changes.buttons.added == ["orders_view"]
+        db_session.expire_all()
+        orders_view = crud_menu.get_button_bit_indexes(db_session)["orders_view"]
+        assert db_session.get(
+            UserEffectivePermission, member
+        ).button_bitmap == bitmap.from_indexes([orders_view])
+        assert (
+            db_session.get(UserEffectivePermission, outsider).version
+            == outsider_version
+        )
+
+    def test_delete_role_revokes_member_grants(self, db_session: Session):
+        """
+        测试删除角色
+        预期: 成员失去该角色授予的权限
+        """
+        # Arrange
+        [user_id] = _create_users(db_session, 1)
+        catalog = _create_catalog(db_session)
+        clerk = _create_role(db_session, "clerk", [catalog["orders"]], ["orders_view"])
+        crud_role.set_user_roles(db_session, user_id=user_id, role_ids=[clerk])
+
+        # Act
+        deleted = crud_role.delete_role(db_session, role_id=clerk)
+
+        # Assert
+        assert deleted is True
+        _, permissions = crud_menu.get_effective_permissions(db_session, user_id)
+        assert permissions == crud_menu.EMPTY_PERMISSIONS
+
+    def test_delete_role_granted_menu(self, db_session: Session):
+        """
+        测试删除被角色授权的菜单
+        预期: 角色与用户对该菜单的授权一并删除，成员失去该菜单
+        """
+        # Arrange
+        [user_id] = _create_users(db_session, 1)
+        catalog = _create_catalog(db_session)
+        archive = MenuItem(title="Archive", order=3)
+        db_session.add(archive)
+        db_session.commit()
+        archive_id = archive.id
+        clerk = _create_role(
+            db_session, "clerk", [catalog["orders"], archive_id], ["orders_view"]
+        )
+        crud_role.set_user_roles(db_session, user_id=user_id, role_ids=[clerk])
+        crud_menu.set_user_menu_permissions(
+            db_session,
+            user_id=user_id,
+            menu_permissions=[UserMenuPermission(menu_item_id=archive_id)],
+        )
+
+        # Act
+        deleted = crud_menu.delete_menu_item(db_session, archive_id)
+
+        # Assert
+        assert deleted is True
+        assert (
+            db_session.query(RoleMenuItem).filter_by(menu_item_id=archive_id).count()
+            == 0
+        )
+        assert (
+            db_session.query(UserMenuItem).filter_by(menu_item_id=archive_id).count()
+            == 0
+        )
+        assert crud_role.get_role_permissions(db_session, clerk).menu_item_ids == [
+            catalog["orders"]
+        ]
+        assert crud_menu.get_users_with_menu(db_session, catalog["orders"]) == [
+            user_id
+        ]
+        _, permissions = crud_menu.get_effective_permissions(db_session, user_id)
+        assert bitmap.to_indexes(permissions.menu_bitmap) == [
+            db_session.get(MenuItem, catalog["orders"]).bit_index
+        ]
+
+    def test_role_grant_visible_through_button_cache(
+        self, db_session: Session, fake_redis
+    ):
+        """
+        测试角色授权变更后的按钮缓存
+        预期: 已缓存的按钮集合被覆盖为新的最终权限
+        """
+        # Arrange
+        [user_id] = _create_users(db_session, 1)
+        catalog = _create_catalog(db_session)
+        clerk = _create_role(db_session, "clerk", [catalog["orders"]], [])
+        crud_role.set_user_roles(db_session, user_id=user_id, role_ids=[clerk])
+        assert not crud_menu.check_user_button_permission(
+            db_session, user_id, "orders_view", is_superuser=False
+        )
+
+        # Act
+        crud_role.set_role_permissions(
+            db_session,
+            role_id=clerk,
+            permissions=RolePermissions(
+                menu_item_ids=[catalog["orders"]], button_ids=["orders_view"]
+            ),
+        )
+
+        # Assert
+        assert crud_menu.check_user_button_permission(
+            db_session, user_id, "orders_view", is_superuser=False
+        )
+
+    def test_rebuild_materializes_all_users(self, db_session: Session):
+        """
+        测试回填最终权限
+        预期: 直接写入的用户权限行被物化
+        """
+        # Arrange
+        user_ids = _create_users(db_session, 3)
+
+        # Act
+        count = crud_menu.rebuild_effective_permissions(db_session)
+
+        # Assert
+        assert count == 3
+        assert db_session.query(UserEffectivePermission).count() == len(user_ids)
+
+
+@pytest.mark.unit
+class TestRoleGrantValidation:
+    """角色授权ID校验测试套件"""
+
+    def test_unknown_role_rejected(self, db_session: Session):
+        """
+        测试为用户设置不存在的角色
+        预期: 抛出ValueError，已有角色保持不变
+        """
+        # Arrange
+        [user_id] = _create_users(db_session, 1)
+        role_id = _create_role(db_session, "viewer", [], [])
+        crud_role.set_user_roles(db_session, user_id=user_id, role_ids=[role_id])
+
+        # Act & Assert
+        with pytest.raises(ValueError, match="999"):
+            crud_role.set_user_roles(
+                db_session, user_id=user_id, role_ids=[role_id, 999]
+            )
+        db_session.rollback()
+        assert [r.id for r in crud_role.get_user_roles(db_session, user_id)] == [
+            role_id
+        ]
+
+    def test_unknown_menu_or_button_rejected(self, db_session: Session):
+        """
+        测试为角色授予不存在的菜单或按钮
+        预期: 抛出ValueError，角色授权保持不变
+        """
+        # Arrange
+        catalog = _create_catalog(db_session)
+        role_id = _create_role(db_session, "editor", [catalog["orders"]], [])
+
+        # Act & Assert
+        with pytest.raises(ValueError, match="menu item ids: 999"):
+            crud_role.set_role_permissions(
+                db_session,
+                role_id=role_id,
+                permissions=RolePermissions(menu_item_ids=[999], button_ids=[]),
+            )
+        with pytest.raises(ValueError, match="button ids: missing_button"):
+            crud_role.set_role_permissions(
+                db_session,
+                role_id=role_id,
+                permissions=RolePermissions(
+                    menu_item_ids=[], button_ids=["orders_view", "missing_button"]
+                ),
+            )
+        db_session.rollback()
+        permissions = crud_role.get_role_permissions(db_session, role_id)
+        assert permissions.menu_item_ids == [catalog["orders"]]
+        assert permissions.button_ids == []
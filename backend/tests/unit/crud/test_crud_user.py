@@ -4,7 +4,8 @@
 
 import pytest
 from sqlalchemy.orm import Session
-from crud import crud_user
+from core import cache
+from crud import crud_menu, crud_user
 from schemas.user import UserCreate, UserUpdate
 from models.user import User
 from core.security import verify_password
@@ -304,3 +305,151 @@ class TestCRUDUser:
         assert hashed_password != password
         assert verify_password(password, hashed_password) is True
         assert verify_password("wrongpassword", hashed_password) is False
+
+
+@pytest.mark.unit
+class TestPrincipalCache:
+    """用户身份缓存测试套件"""
+
+    def test_load_principal_populates_cache(
+        self, db_session: Session, test_user: User, fake_redis
+    ):
+        """
+        测试加载身份
+        预期: 进程内缓存与Redis中都写入身份信息
+        """
+        # Act
+        principal = crud_user.load_principal(db_session, test_user.id)
+        crud_user.clear_local_principals()
+        cached = crud_user.get_cached_principal(test_user.id)
+
+        # Assert
+        assert principal.email == test_user.email
+        assert cached.id == test_user.id
+        assert cached.is_active is True
+        assert cached.is_superuser is False
+
+    def test_missing_user_has_no_principal(self, db_session: Session, fake_redis):
+        """
+        测试不存在的用户
+        预期: 返回None
+        """
+        # Act & Assert
+        assert crud_user.load_principal(db_session, 999) is None
+        assert crud_user.get_cached_principal(999) is None
+
+    def test_deactivate_invalidates_principal(
+        self, db_session: Session, test_user: User, fake_redis
+    ):
+        """
+        测试停用用户
+        预期: 缓存的身份被清除，重新加载后为非活跃
+        """
+        # Arrange
+        crud_user.load_principal(db_session, test_user.id)
+
+        # Act
+        crud_user.user.deactivate(db_session, db_obj=test_user)
+
+        # Assert
+        assert crud_user.get_cached_principal(test_user.id) is None
+        assert crud_user.load_principal(db_session, test_user.id).is_active is False
+
+    def test_load_racing_invalidation_is_not_cached(
+        self, db_session: Session, test_user: User, fake_redis, monkeypatch
+    ):
+        """
+        测试加载与失效交错
+        预期: 读到旧数据后用户被停用并失效，旧身份不会写回任一级缓存
+        """
+        # Arrange
+        principal_from_row = crud_user.principal_from_row
+
+        def read_then_deactivate(row):
+            # 已读到停用前的行，此时管理员提交停用并失效缓存
+            principal = principal_from_row(row)
+            test_user.is_active = False
+            db_session.commit()
+            crud_user.invalidate_principal(test_user.id)
+            return principal
+
+        monkeypatch.setattr(crud_user, "principal_from_row", read_then_deactivate)
+
+        # Act
+        stale = crud_user.load_principal(db_session, test_user.id)
+        monkeypatch.setattr(crud_user, "principal_from_row", principal_from_row)
+
+        # Assert
+        assert stale.is_active is True
+        assert crud_user.get_local_principal(test_user.id) is None
+        assert crud_user.get_cached_principal(test_user.id) is None
+        assert crud_user.load_principal(db_session, test_user.id).is_active is False
+        crud_user.clear_local_principals()
+        assert crud_user.get_cached_principal(test_user.id).is_active is False
+
+    def test_invalidation_reaches_other_workers(
+        self, db_session: Session, test_user: User, fake_redis
+    ):
+        """
+        测试多进程下的身份失效
+        预期: 失效消息发布到订阅频道，其他进程收到后删除本地缓存的身份
+        """
+        # Arrange
+        pubsub = fake_redis.pubsub(ignore_subscribe_messages=True)
+        pubsub.subscribe(cache.CACHE_INVALIDATION_CHANNEL)
+        crud_user.remember_principal(crud_user.Principal(7, "b@example.com", True, True))
+
+        # Act
+        crud_user.invalidate_principal(test_user.id)
+        message = None
+        for _ in range(10):
+            message = message or pubsub.get_message(timeout=0.5)
+        # 模拟另一个进程：本地仍缓存着旧身份时收到消息
+        crud_user.remember_principal(crud_user.Principal.from_user(test_user))
+        cache.handle_invalidation_message(message["data"])
+
+        # Assert
+        assert crud_user.get_local_principal(test_user.id) is None
+        assert crud_user.get_local_principal(7) is not None
+        pubsub.close()
+
+    def test_demotion_drops_permission_caches(
+        self, db_session: Session, test_user: User, fake_redis
+    ):
+        """
+        测试取消超级用户
+        预期: 缓存的菜单树被清除，权限版本推进，新的权限摘要不再是超级用户
+        """
+        # Arrange
+        test_user.is_superuser = True
+        db_session.commit()
+        old_claims = crud_menu.get_permission_claims(db_session, test_user.id)
+        tree_key = crud_menu.MENU_TREE_KEY.format(user_id=test_user.id)
+        version_key = crud_menu.PERMISSION_VERSION_KEY.format(user_id=test_user.id)
+        fake_redis.set(tree_key, b"[]")
+
+        # Act
+        crud_user.user.update(
+            db_session,
+            db_obj=test_user,
+            obj_in=UserUpdate(email=test_user.email, is_superuser=False),
+        )
+
+        # Assert
+        assert fake_redis.exists(tree_key) == 0
+        assert int(fake_redis.get(version_key)) > old_claims.version
+        claims = crud_menu.get_permission_claims(db_session, test_user.id)
+        assert claims.is_superuser is False
+        assert claims.version > old_claims.version
+
+    def test_principal_uses_slots(self):
+        """
+        测试身份对象
+        预期: 不允许设置额外属性
+        """
+        # Arrange
+        principal = crud_user.Principal(1, "a@example.com", True, False)
+
+        # Act & Assert
+        with pytest.raises(AttributeError):
+            principal.username = "a"
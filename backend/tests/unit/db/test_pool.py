@@ -0,0 +1,180 @@
+"""
+数据库连接池单元测试
+"""
+
+import pytest
+from sqlalchemy import create_engine, exc
+
+from db import pool
+from db.pool import configure_engine, engine_options, pool_report
+
+
+@pytest.fixture
+def make_engine(tmp_path, monkeypatch):
+    """按当前连接池配置创建临时SQLite引擎"""
+    engines = []
+
+    def make(**overrides):
+        for name, value in overrides.items():
+            monkeypatch.setattr(pool.settings, name, value)
+        url = f"sqlite:///{tmp_path / 'pool.db'}"
+        engine = configure_engine(create_engine(url, **engine_options(url)))
+        engines.append(engine)
+        return engine
+
+    yield make
+    for engine in engines:
+        engine.dispose()
+
+
+@pytest.mark.unit
+class TestPoolConfiguration:
+    """连接池配置测试套件"""
+
+    def test_settings_applied(self, make_engine):
+        """
+        测试连接池参数
+        预期: 大小、溢出、超时、回收与预检策略取自配置
+        """
+        # Act
+        engine = make_engine(
+            DATABASE_POOL_SIZE=3,
+            DATABASE_MAX_OVERFLOW=2,
+            DATABASE_POOL_TIMEOUT=7.0,
+            DATABASE_POOL_RECYCLE=600,
+            DATABASE_POOL_PRE_PING="always",
+        )
+
+        # Assert
+        assert engine.pool.size() == 3
+        assert engine.pool._max_overflow == 2
+        assert engine.pool.timeout() == 7.0
+        assert engine.pool._recycle == 600
+        assert engine.pool._pre_ping is True
+
+    def test_memory_sqlite_keeps_default_pool(self):
+        """
+        测试内存SQLite
+        预期: 不传入队列连接池参数，报告退化为状态字符串
+        """
+        engine = create_engine("sqlite://", **engine_options("sqlite://"))
+
+        assert "pool_size" not in engine_options("sqlite://")
+        assert "status" in pool_report(engine)
+
+
+@pytest.mark.unit
+class TestPoolStats:
+    """连接池统计测试套件"""
+
+    def test_checkouts_and_overflow_reported(self, make_engine):
+        """
+        测试检出统计
+        预期: 报告检出数、溢出数与检出耗时
+        """
+        # Arrange
+        engine = make_engine(DATABASE_POOL_SIZE=1, DATABASE_MAX_OVERFLOW=1)
+
+        # Act
+        first = engine.connect()
+        second = engine.connect()
+        busy = pool_report(engine)
+        first.close()
+        second.close()
+
+        # Assert
+        assert (busy["checked_out"], busy["overflow"]) == (2, 1)
+        report = pool_report(engine)
+        assert report["checked_out"] == 0
+        assert report["checkouts"] == 2
+        assert report["checkout_latency"]["count"] == 2
+        assert report["checkout_histogram"]["le_inf"] == 2
+
+    def test_timeout_counted(self, make_engine):
+        """
+        测试连接池耗尽
+        预期: 等待超时抛出 TimeoutError 并计数
+        """
+        # Arrange
+        engine = make_engine(
+            DATABASE_POOL_SIZE=1, DATABASE_MAX_OVERFLOW=0, DATABASE_POOL_TIMEOUT=0.05
+        )
+        held = engine.connect()
+
+        # Act
+        with pytest.raises(exc.TimeoutError):
+            engine.connect()
+        held.close()
+
+        # Assert
+        report = pool_report(engine)
+        assert report["timeouts"] == 1
+        assert report["wait"]["max_ms"] >= 50
+
+    def test_stats_survive_dispose(self, make_engine):
+        """
+        测试连接池重建
+        预期: dispose 之后统计保留
+        """
+        engine = make_engine()
+        engine.connect().close()
+
+        engine.dispose()
+
+        assert pool_report(engine)["checkouts"] == 1
+
+
+@pytest.mark.unit
+class TestIdlePrePing:
+    """空闲预检策略测试套件"""
+
+    def _count_pings(self, engine, monkeypatch, fail: bool = False):
+        pings = []
+
+        def do_ping(dbapi_connection):
+            pings.append(dbapi_connection)
+            if fail and len(pings) == 1:
+                raise RuntimeError("server closed the connection")
+            return True
+
+        monkeypatch.setattr(engine.dialect, "do_ping", do_ping)
+        return pings
+
+    def test_recently_used_connection_not_pinged(self, make_engine, monkeypatch):
+        """
+        测试刚归还的连接
+        预期: 空闲时间未超过阈值，不额外往返
+        """
+        # Arrange
+        engine = make_engine(
+            DATABASE_POOL_PRE_PING="idle", DATABASE_POOL_PING_IDLE_SECONDS=60.0
+        )
+        pings = self._count_pings(engine, monkeypatch)
+
+        # Act
+        engine.connect().close()
+        engine.connect().close()
+
+        # Assert
+        assert pings == []
+
+    def test_idle_connection_pinged_and_replaced(self, make_engine, monkeypatch):
+        """
+        测试空闲超时且已断开的连接
+        预期: 预检失败后丢弃该连接，检出一个新连接
+        """
+        # Arrange
+        engine = make_engine(
+            DATABASE_POOL_PRE_PING="idle", DATABASE_POOL_PING_IDLE_SECONDS=0.0
+        )
+        pings = self._count_pings(engine, monkeypatch, fail=True)
+        with engine.connect() as conn:
+            stale = conn.connection.dbapi_connection
+
+        # Act
+        with engine.connect() as conn:
+            fresh = conn.connection.dbapi_connection
+
+        # Assert
+        assert pings == [stale]
+        assert fresh is not stale
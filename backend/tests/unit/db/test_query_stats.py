@@ -0,0 +1,88 @@
+"""
+SQL语句统计单元测试
+"""
+
+import pytest
+from sqlalchemy import select
+from sqlalchemy.orm import Session
+
+from db import query_stats
+from models.menu import MenuItem
+
+
+def _create_tree(db_session: Session, children: int) -> None:
+    root = MenuItem(title="Root")
+    db_session.add(root)
+    db_session.commit()
+    db_session.add_all(
+        [MenuItem(title=f"Child {i}", parent_id=root.id) for i in range(children)]
+    )
+    db_session.commit()
+    db_session.expire_all()
+
+
+@pytest.mark.unit
+class TestStatementShape:
+    """语句形状测试套件"""
+
+    def test_placeholder_lists_collapsed(self):
+        """
+        测试不同长度的IN列表与多行VALUES
+        预期: 归为同一形状
+        """
+        assert query_stats.statement_shape(
+            "SELECT * FROM t WHERE id IN (?, ?, ?)"
+        ) == query_stats.statement_shape("SELECT *\n FROM t WHERE id IN (?)")
+        assert query_stats.statement_shape(
+            "INSERT INTO t (a, b) VALUES (%(a_m0)s, %(b_m0)s), (%(a_m1)s, %(b_m1)s)"
+        ) == "INSERT INTO t (a, b) VALUES (?)"
+
+
+@pytest.mark.unit
+class TestTrack:
+    """语句统计测试套件"""
+
+    def test_counts_statements_and_repeats(self, db_session: Session):
+        """
+        测试逐个懒加载子节点
+        预期: 统计到重复执行的同一形状
+        """
+        # Arrange
+        _create_tree(db_session, children=3)
+
+        # Act
+        with query_stats.track() as stats:
+            for item in db_session.scalars(select(MenuItem)).all():
+                item.children
+
+        # Assert
+        assert stats.count == 5
+        assert stats.max_repeats == 4
+        assert list(stats.repeated().values()) == [4]
+        assert stats.server_timing().endswith('desc="5 queries"')
+
+    def test_nested_tracking(self, db_session: Session):
+        """
+        测试嵌套统计
+        预期: 外层同时统计内层执行的语句
+        """
+        with query_stats.track() as outer:
+            db_session.scalars(select(MenuItem)).all()
+            with query_stats.track() as inner:
+                db_session.scalars(select(MenuItem)).all()
+
+        assert (outer.count, inner.count) == (2, 1)
+
+    def test_budget_fails_on_n_plus_one(self, db_session: Session, query_budget):
+        """
+        测试语句预算夹具
+        预期: 重复次数超出预算时测试失败
+        """
+        # Arrange
+        _create_tree(db_session, children=3)
+
+        # Act & Assert
+        with pytest.raises(pytest.fail.Exception, match="repeated 4 times"):
+            with query_budget(10, max_repeats=1):
+                for item in db_session.scalars(select(MenuItem)).all():
+                    item.children
@@ -0,0 +1,190 @@
+"""
+只读副本路由单元测试
+"""
+
+import pytest
+import redis
+from sqlalchemy import text
+
+from db import replicas
+from db.session import SessionLocal
+
+
+@pytest.fixture
+def router(tmp_path, monkeypatch):
+    """两个SQLite副本的路由器，替换全局路由器"""
+    router = replicas.ReplicaRouter(
+        [f"sqlite:///{tmp_path / 'replica_a.db'}", f"sqlite:///{tmp_path / 'replica_b.db'}"]
+    )
+    monkeypatch.setattr(replicas, "replica_router", router)
+    yield router
+    for replica in router.replicas:
+        replica.engine.dispose()
+
+
+@pytest.mark.unit
+class TestReplicaRouter:
+    """副本选择测试套件"""
+
+    def test_round_robin(self, router):
+        """
+        测试轮询
+        预期: 依次交替使用各副本
+        """
+        a, b = router.replicas
+
+        chosen = [router.choose() for _ in range(4)]
+
+        assert chosen == [a, b, a, b]
+        assert (a.reads, b.reads, router.primary_reads) == (2, 2, 0)
+
+    def test_unavailable_replica_skipped(self, router, monkeypatch):
+        """
+        测试延迟超限的副本
+        预期: 被跳过；全部不可用时回退到主库
+        """
+        # Arrange
+        a, b = router.replicas
+        monkeypatch.setattr(replicas.settings, "REPLICA_MAX_LAG_SECONDS", 5.0)
+        a.lag, a.available = 12.0, False
+
+        # Act & Assert
+        assert [router.choose() for _ in range(2)] == [b, b]
+        b.available = False
+        assert router.choose() is None
+        assert router.primary_reads == 1
+
+    def test_probe_failure_marks_unavailable(self, tmp_path):
+        """
+        测试无法连接的副本
+        预期: 探测后不可用，恢复后重新可用
+        """
+        # Arrange
+        replica = replicas.Replica(f"sqlite:///{tmp_path / 'missing' / 'replica.db'}")
+
+        # Act
+        replica.probe()
+
+        # Assert
+        assert replica.available is False
+        (tmp_path / "missing").mkdir()
+        replica.probe()
+        assert replica.available is True
+        assert replica.lag == 0.0
+        replica.engine.dispose()
+
+    def test_primary_session_when_requested(self, router):
+        """
+        测试读己之写窗口内的会话
+        预期: 绑定主库引擎，不计入副本读取
+        """
+        db = router.session(primary=True)
+        try:
+            assert db.get_bind() is SessionLocal().get_bind()
+        finally:
+            db.close()
+        assert [replica.reads for replica in router.replicas] == [0, 0]
+
+
+@pytest.mark.unit
+class TestReadYourWrites:
+    """读己之写窗口测试套件"""
+
+    def test_window_scoped_to_writer(self, router, fake_redis):
+        """
+        测试写入标记
+        预期: 只有被标记的范围视为最近写入，且带有过期时间
+        """
+        # Act
+        replicas.mark_recent_write(replicas.user_scope(1))
+
+        # Assert
+        assert replicas.wrote_recently(replicas.user_scope(1)) is True
+        assert replicas.wrote_recently(replicas.user_scope(2)) is False
+        assert replicas.wrote_recently(
+            replicas.CATALOG_SCOPE, replicas.user_scope(1)
+        ) is True
+        ttl = fake_redis.ttl(replicas.RECENT_WRITE_KEY.format(scope="user:1"))
+        assert 0 < ttl <= replicas.settings.READ_YOUR_WRITES_SECONDS
+
+    def test_no_replicas_skips_redis(self, fake_redis):
+        """
+        测试未配置副本
+        预期: 不写入标记，也不认为有最近写入
+        """
+        replicas.mark_recent_write(replicas.user_scope(1))
+
+        assert fake_redis.keys("replica:*") == []
+        assert replicas.wrote_recently(replicas.user_scope(1)) is False
+
+    def test_redis_unavailable_reads_primary(self, router, fake_redis, monkeypatch):
+        """
+        测试Redis不可用
+        预期: 无法确认窗口时按最近写入处理，读取主库
+        """
+
+        def fail(*args, **kwargs):
+            raise redis.ConnectionError("down")
+
+        monkeypatch.setattr(fake_redis, "exists", fail)
+
+        assert replicas.wrote_recently(replicas.user_scope(1)) is True
+
+
+@pytest.mark.unit
+class TestAsyncReadSession:
+    """异步只读会话路由测试套件"""
+
+    @pytest.mark.asyncio
+    async def test_route_chosen_on_first_query(self, router, fake_redis, monkeypatch):
+        """
+        测试延迟路由
+        预期: 创建会话时不检查读己之写窗口，首次查询时检查一次并选择副本
+        """
+        # Arrange
+        checks = []
+        wrote_recently_async = replicas.wrote_recently_async
+
+        async def counting(*scopes):
+            checks.append(scopes)
+            return await wrote_recently_async(*scopes)
+
+        monkeypatch.setattr(replicas, "wrote_recently_async", counting)
+        db = router.async_session(replicas.user_scope(1))
+        assert checks == []
+
+        # Act
+        try:
+            await db.execute(text("SELECT 1"))
+            await db.execute(text("SELECT 1"))
+            bind = db.sync_session.bind
+        finally:
+            await db.close()
+            await router.dispose()
+
+        # Assert
+        assert checks == [("user:1",)]
+        assert bind is router.replicas[0].async_engine.sync_engine
+        assert router.replicas[0].reads == 1
+
+    @pytest.mark.asyncio
+    async def test_recent_write_routes_to_primary(self, router, fake_redis):
+        """
+        测试读己之写窗口内的异步会话
+        预期: 首次查询时绑定主库
+        """
+        # Arrange
+        replicas.mark_recent_write(replicas.user_scope(1))
+        db = router.async_session(replicas.user_scope(1))
+
+        # Act
+        try:
+            await db.execute(text("SELECT 1"))
+            bind = db.sync_session.bind
+        finally:
+            await db.close()
+            await replicas.async_engine.dispose()
+
+        # Assert
+        assert bind is replicas.async_engine.sync_engine
+        assert [replica.reads for replica in router.replicas] == [0, 0]
@@ -0,0 +1,116 @@
+"""
+延迟数据库会话单元测试
+"""
+
+import threading
+
+import pytest
+from sqlalchemy import select
+from sqlalchemy.orm import Session
+
+from db import query_stats
+from db.session import LazySession, SessionLocal, engine, release_lazy_session
+from models.menu import MenuItem
+
+
+@pytest.mark.unit
+class TestLazySession:
+    """延迟会话测试套件"""
+
+    def test_unused_session_not_created(self, db_session: Session):
+        """
+        测试未使用的会话
+        预期: 不创建会话，不检出连接
+        """
+        # Arrange
+        db = LazySession(SessionLocal)
+
+        # Act
+        with query_stats.track() as stats:
+            db.release()
+            db.close()
+
+        # Assert
+        assert db.created is False
+        assert stats.checkouts == 0
+
+    def test_release_returns_connection_keeps_objects(self, db_session: Session):
+        """
+        测试只读事务的提前释放
+        预期: 连接归还连接池，已加载的对象不过期、访问时不再查询
+        """
+        # Arrange
+        db_session.add(MenuItem(title="Root"))
+        db_session.commit()
+        db = LazySession(SessionLocal)
+        item = db.scalars(select(MenuItem)).one()
+        assert engine.pool.checkedout() == 1
+
+        # Act
+        db.release()
+
+        # Assert
+        assert engine.pool.checkedout() == 0
+        with query_stats.track() as stats:
+            assert item.title == "Root"
+        assert stats.count == 0
+        db.close()
+
+    def test_release_skipped_after_flush(self, db_session: Session):
+        """
+        测试事务中已有未提交的写入
+        预期: 不提前提交，关闭时写入被回滚
+        """
+        # Arrange
+        db = LazySession(SessionLocal)
+        db.add(MenuItem(title="Draft"))
+        db.flush()
+
+        # Act
+        db.release()
+        db.close()
+
+        # Assert
+        assert db_session.scalars(select(MenuItem)).all() == []
+        assert engine.pool.checkedout() == 0
+
+    def test_checkouts_counted(self, db_session: Session):
+        """
+        测试连接检出统计
+        预期: 每个事务检出一次连接
+        """
+        db = LazySession(SessionLocal)
+
+        with query_stats.track() as stats:
+            db.scalars(select(MenuItem)).all()
+            db.release()
+            db.scalars(select(MenuItem)).all()
+        db.close()
+
+        assert stats.checkouts == 2
+
+    @pytest.mark.asyncio
+    async def test_release_off_event_loop(self, db_session: Session, monkeypatch):
+        """
+        测试在异步端点中释放同步会话
+        预期: 提交在工作线程中执行，不阻塞事件循环
+        """
+        # Arrange
+        threads = []
+        release = LazySession.release
+
+        def tracking_release(self):
+            threads.append(threading.current_thread())
+            release(self)
+
+        monkeypatch.setattr(LazySession, "release", tracking_release)
+        db = LazySession(SessionLocal)
+        db.scalars(select(MenuItem)).all()
+
+        # Act
+        await release_lazy_session(db)
+
+        # Assert
+        assert threads and threads[0] is not threading.current_thread()
+        assert engine.pool.checkedout() == 0
+        db.close()
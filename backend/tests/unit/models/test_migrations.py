@@ -0,0 +1,286 @@
+"""
+数据库迁移与索引单元测试
+"""
+
+from pathlib import Path
+
+import pytest
+from alembic import command
+from alembic.autogenerate import compare_metadata
+from alembic.config import Config
+from alembic.migration import MigrationContext
+from sqlalchemy import (
+    Column,
+    ForeignKey,
+    Integer,
+    MetaData,
+    Table,
+    UniqueConstraint,
+    create_engine,
+    text,
+)
+
+from sqlalchemy.orm import Session
+
+import models  # noqa: F401
+from core import bitmap
+from db.base import Base
+from db.indexes import find_unindexed_foreign_keys
+
+ALEMBIC_DIR = Path(__file__).resolve().parents[3] / "alembic"
+
+# 迁移链出现之前由 create_all 建出的表结构
+LEGACY_SCHEMA = [
+    """CREATE TABLE users (
+        id INTEGER NOT NULL PRIMARY KEY,
+        username VARCHAR NOT NULL,
+        email VARCHAR NOT NULL,
+        full_name VARCHAR,
+        hashed_password VARCHAR NOT NULL,
+        is_active BOOLEAN,
+        is_superuser BOOLEAN
+    )""",
+    "CREATE INDEX ix_users_full_name ON users (full_name)",
+    "CREATE INDEX ix_users_id ON users (id)",
+    "CREATE UNIQUE INDEX ix_users_username ON users (username)",
+    "CREATE UNIQUE INDEX ix_users_email ON users (email)",
+    """CREATE TABLE menu_items (
+        id INTEGER NOT NULL PRIMARY KEY,
+        title VARCHAR(50) NOT NULL,
+        icon VARCHAR(30),
+        route VARCHAR(100),
+        parent_id INTEGER REFERENCES menu_items (id),
+        "order" INTEGER NOT NULL,
+        is_active BOOLEAN NOT NULL,
+        created_at DATETIME NOT NULL
+    )""",
+    "CREATE INDEX ix_menu_items_id ON menu_items (id)",
+    """CREATE TABLE expenses (
+        id INTEGER NOT NULL PRIMARY KEY,
+        description VARCHAR,
+        amount FLOAT NOT NULL,
+        date DATETIME,
+        owner_id INTEGER REFERENCES users (id)
+    )""",
+    "CREATE INDEX ix_expenses_description ON expenses (description)",
+    "CREATE INDEX ix_expenses_id ON expenses (id)",
+    """CREATE TABLE user_menu_items (
+        id INTEGER NOT NULL PRIMARY KEY,
+        user_id INTEGER NOT NULL REFERENCES users (id),
+        menu_item_id INTEGER NOT NULL REFERENCES menu_items (id),
+        has_permission BOOLEAN NOT NULL
+    )""",
+    "CREATE INDEX ix_user_menu_items_id ON user_menu_items (id)",
+    """CREATE TABLE button_permissions (
+        id INTEGER NOT NULL PRIMARY KEY,
+        button_id VARCHAR(50) NOT NULL UNIQUE,
+        description VARCHAR(100),
+        menu_item_id INTEGER NOT NULL REFERENCES menu_items (id)
+    )""",
+    "CREATE INDEX ix_button_permissions_id ON button_permissions (id)",
+    """CREATE TABLE user_button_permissions (
+        id INTEGER NOT NULL PRIMARY KEY,
+        user_id INTEGER NOT NULL REFERENCES users (id),
+        button_id VARCHAR(50) NOT NULL REFERENCES button_permissions (button_id),
+        has_permission BOOLEAN NOT NULL
+    )""",
+    "CREATE INDEX ix_user_button_permissions_id ON user_button_permissions (id)",
+]
+
+LEGACY_DATA = [
+    "INSERT INTO users VALUES (1, 'alice', 'alice@example.com', NULL, 'x', 1, 0)",
+    "INSERT INTO menu_items VALUES (1, '系统', NULL, NULL, NULL, 1, 1, '2024-01-01')",
+    "INSERT INTO menu_items VALUES (2, '用户', NULL, '/users', 1, 1, 1, '2024-01-01')",
+    "INSERT INTO menu_items VALUES (3, '角色', NULL, '/roles', 2, 1, 1, '2024-01-01')",
+    "INSERT INTO button_permissions VALUES (1, 'user:create', NULL, 2)",
+    "INSERT INTO button_permissions VALUES (2, 'user:delete', NULL, 2)",
+    "INSERT INTO user_menu_items VALUES (1, 1, 2, 0)",
+    "INSERT INTO user_menu_items VALUES (2, 1, 2, 1)",
+    "INSERT INTO user_button_permissions VALUES (1, 1, 'user:delete', 1)",
+    "INSERT INTO expenses VALUES (1, '午餐', 30.0, '2024-03-01 12:00:00', 1)",
+    "INSERT INTO expenses VALUES (2, '午餐', 20.0, '2024-03-01 19:00:00', 1)",
+    "INSERT INTO expenses VALUES (3, NULL, 5.5, '2024-03-02 08:00:00', 1)",
+    "INSERT INTO expenses VALUES (4, '无日期', 9.0, NULL, 1)",
+]
+
+
+def alembic_config(url: str) -> Config:
+    config = Config()
+    config.set_main_option("script_location", str(ALEMBIC_DIR))
+    config.set_main_option("sqlalchemy.url", url)
+    return config
+
+
+@pytest.fixture
+def migrated_engine(tmp_path):
+    """执行全部迁移后的临时SQLite数据库"""
+    url = f"sqlite:///{tmp_path / 'migrated.db'}"
+    config = alembic_config(url)
+    command.upgrade(config, "head")
+    engine = create_engine(url)
+    yield engine, config
+    engine.dispose()
+
+
+@pytest.fixture
+def legacy_engine(tmp_path):
+    """迁移链出现之前建立、已有数据的临时SQLite数据库，标记为0003后升级到最新"""
+    url = f"sqlite:///{tmp_path / 'legacy.db'}"
+    engine = create_engine(url)
+    with engine.begin() as connection:
+        for statement in LEGACY_SCHEMA + LEGACY_DATA:
+            connection.execute(text(statement))
+    config = alembic_config(url)
+    command.stamp(config, "0003")
+    command.upgrade(config, "head")
+    yield engine
+    engine.dispose()
+
+
+@pytest.mark.unit
+class TestMigrations:
+    """迁移链测试套件"""
+
+    def test_head_matches_models(self, migrated_engine):
+        """
+        测试迁移结果与模型一致
+        预期: 自动比对没有任何差异
+        """
+        # Arrange
+        engine, _ = migrated_engine
+
+        # Act
+        with engine.connect() as connection:
+            context = MigrationContext.configure(connection)
+            diff = compare_metadata(context, Base.metadata)
+
+        # Assert
+        assert diff == []
+
+    def test_every_foreign_key_indexed(self, migrated_engine):
+        """
+        测试外键索引
+        预期: 迁移后的每个外键都有可用的索引
+        """
+        engine, _ = migrated_engine
+
+        assert find_unindexed_foreign_keys(engine) == []
+
+    def test_downgrade_to_base(self, migrated_engine):
+        """
+        测试完整回退
+        预期: 只剩下 alembic_version 表
+        """
+        # Arrange
+        engine, config = migrated_engine
+
+        # Act
+        command.downgrade(config, "base")
+
+        # Assert
+        with engine.connect() as connection:
+            tables = engine.dialect.get_table_names(connection)
+        assert tables == ["alembic_version"]
+
+
+@pytest.mark.unit
+class TestLegacyDatabaseUpgrade:
+    """旧数据库升级测试套件"""
+
+    def test_schema_matches_models(self, legacy_engine):
+        """
+        测试旧数据库升级后的表结构
+        预期: 与模型一致，外键均有索引
+        """
+        with legacy_engine.connect() as connection:
+            context = MigrationContext.configure(connection)
+            diff = compare_metadata(context, Base.metadata)
+
+        assert diff == []
+        assert find_unindexed_foreign_keys(legacy_engine) == []
+
+    def test_menu_columns_backfilled(self, legacy_engine):
+        """
+        测试菜单列回填
+        预期: 物化路径由 parent_id 计算，位序号按ID从0连续分配
+        """
+        with legacy_engine.connect() as connection:
+            menus = connection.execute(
+                text("SELECT id, path, bit_index FROM menu_items ORDER BY id")
+            ).all()
+            buttons = connection.execute(
+                text("SELECT button_id, bit_index FROM button_permissions ORDER BY id")
+            ).all()
+
+        assert menus == [(1, "/", 0), (2, "/1/", 1), (3, "/1/2/", 2)]
+        assert buttons == [("user:create", 0), ("user:delete", 1)]
+
+    def test_effective_permissions_materialized(self, legacy_engine):
+        """
+        测试最终权限物化
+        预期: 重复授权只保留最新一条，用户的最终权限与授权表一致
+        """
+        from crud import crud_menu
+
+        with legacy_engine.connect() as connection:
+            grants = connection.execute(
+                text("SELECT id, has_permission FROM user_menu_items")
+            ).all()
+        with Session(legacy_engine) as db:
+            is_superuser, permissions = crud_menu.get_effective_permissions(db, 1)
+            materialized = db.execute(crud_menu.user_permissions_stmt(1)).first()
+
+        assert grants == [(2, 1)]
+        assert is_superuser is False
+        assert materialized.menu_bitmap is not None
+        assert bitmap.has_bit(permissions.menu_bitmap, 1)
+        assert not bitmap.has_bit(permissions.menu_bitmap, 0)
+        assert bitmap.has_bit(permissions.button_bitmap, 1)
+        assert not bitmap.has_bit(permissions.button_bitmap, 0)
+
+
+    def test_expense_rollups_backfilled(self, legacy_engine):
+        """
+        测试已有费用的汇总回填
+        预期: 升级前的费用计入汇总，没有日期的费用被跳过
+        """
+        from crud import crud_expense
+
+        with Session(legacy_engine) as db:
+            summary = crud_expense.get_expense_summary(db, 1, "day")
+
+        assert [(b.key, b.total, b.count) for b in summary] == [
+            ("2024-03-01", 50.0, 2),
+            ("2024-03-02", 5.5, 1),
+        ]
+
+
+@pytest.mark.unit
+class TestFindUnindexedForeignKeys:
+    """外键索引检查测试套件"""
+
+    def test_flags_foreign_key_without_leading_index(self):
+        """
+        测试外键不是任何索引的前导列
+        预期: 被列出；作为前导列的外键不被列出
+        """
+        # Arrange
+        metadata = MetaData()
+        Table("parents", metadata, Column("id", Integer, primary_key=True))
+        children = Table(
+            "children",
+            metadata,
+            Column("id", Integer, primary_key=True),
+            Column("indexed_parent_id", ForeignKey("parents.id"), index=True),
+            Column("other_parent_id", ForeignKey("parents.id")),
+        )
+        # other_parent_id 只是第二列，不能服务于外键查询
+        children.append_constraint(UniqueConstraint("id", "other_parent_id"))
+        engine = create_engine("sqlite://")
+        metadata.create_all(engine)
+
+        # Act
+        unindexed = find_unindexed_foreign_keys(engine)
+
+        # Assert
+        assert unindexed == ["children(other_parent_id) -> parents"]